@@ -7,24 +7,118 @@ Created on Mon Dec  4 13:53:20 2023
 
 project3_module.py
 
-This module contains 6 functions utilized in project3_script. The first removes large artifact spikes, replacing the values
-by interpolation using the values from before and after the spike. The second plots a time domain signal and labels the plot.
-Function three convolves a signal and impulse response to return a filtered signal. While the fourth determines where heart beats
-are using Scipy's find_peaks function and a threshold value to return the indicies where beats occur. The fifth function determines
-the heart rate variability using the beat indicies and finding the inter-beat intervals to returning the standard deviation. The
-final function completes the fourier transform of a signal and masks low and high-frequency bands, then plots the signal with the
-bands labeled. It also determines the mean power of the bands and returns the ratio of the low to high frequency power.
+This module contains the functions utilized in project3_script. The first removes large artifact spikes, replacing each run of spike
+values by linear interpolation between the values from before and after the run. The second plots a time domain signal and labels
+the plot, drawing long signals from a min/max pyramid. Function three convolves a signal and impulse response, or the key of a
+filter designed once by a FilterRegistry, to return a filtered signal, picking direct, FFT or overlap-add convolution, and a
+StreamingFilter class does the same for a signal that arrives in chunks. Recordings can be kept as uint16 ADC counts that a
+ScaledSignal only scales to volts when read, and spike removal and filtering can run in float32. While the fourth determines where
+heart beats are using Scipy's find_peaks function and a threshold value to return the indicies where beats occur, with a
+StreamingBeatDetector class for chunked signals. The fifth function determines the heart rate variability using the beat indicies
+and finding the inter-beat intervals to returning the standard deviation, and rolling_hrv gives it over sliding windows from running
+sums. The sixth function completes the fourier transform of a signal and masks low and high-frequency bands, then plots the signal
+with the bands labeled. It also determines the mean power of the bands and returns the ratio of the low to high frequency power, and
+can skip the plot. A BandPowerSpectrum class keeps the running sum of the power spectrum so the power of any band can be looked up
+without rescanning it, and a batch function gives the heart rate variability and band powers of many recordings at once without
+plotting, while rolling_lf_hf_ratio gives the ratio over sliding windows with one FFT per block of windows. The last part runs the
+whole pipeline on a recording without plotting and maps it over a directory of recordings with a pool of processes.
 """
 import numpy as np
-from matplotlib import pyplot as plt
-import scipy
+import os
+import concurrent.futures
+import collections
+import hashlib
+import signal_pyramid_module as pyr
+
+# filter_data switches from one whole-signal FFT to overlap-add once the signal is this many times longer than the filter
+FFT_OVERLAP_ADD_RATIO = 10
+
+# one row of the table returned by run_batch
+BATCH_RESULT_DTYPE = np.dtype([('recording', 'U256'), ('beats', object), ('ibi', object), ('hrv', float),
+                               ('lf_hf_ratio', float), ('error', object)])
+
+# directory FilterRegistry saves the filters it designs in
+FILTER_CACHE_DIR = 'filter_cache'
+
+# design parameters of a scipy.signal.firwin filter, used as the key of a FilterRegistry
+FilterKey = collections.namedtuple('FilterKey', ['numtaps', 'cutoff', 'fs', 'window', 'pass_zero'], defaults = ['hamming', True])
+
+# the Arduino recordings are 10 bit ADC counts, stored as uint16 and scaled to volts with VOLTS_PER_COUNT
+VOLTS_PER_COUNT = 5/1023
+COUNT_DTYPE = np.uint16
 
 #%% part 1
-def remove_spikes(data_dict, fs, threshold):
+def load_counts(file_path, dtype = COUNT_DTYPE):
+    '''
+    Loads an Arduino recording as raw ADC counts. A 10 bit count fits in a uint16, which
+    takes a quarter of the memory of the float64 array np.loadtxt gives by default, and
+    holds every count exactly. The file is read as floats so counts written as 512.0 load 
+    too, and every value must be a whole number that fits in dtype.
+
+    Parameters
+    ----------
+    file_path : string
+        Path of the text file holding the recording in ADC counts.
+    dtype : numpy dtype, optional
+        The integer type the counts are stored as. The default is COUNT_DTYPE.
+
+    Returns
+    -------
+    counts : 1D array of integers size (n,) where n is the number of samples in the recording
+        The recording in ADC counts.
+
+    '''
+    values = np.loadtxt(file_path, ndmin = 1)
+    # check the counts before the cast, which would otherwise truncate fractions and wrap values out of range
+    count_range = np.iinfo(dtype)
+    if not np.all(np.isfinite(values) & (values == np.round(values))):
+        raise ValueError(f'{file_path} holds values that are not whole ADC counts')
+    if len(values) > 0 and (np.min(values) < count_range.min or np.max(values) > count_range.max):
+        raise ValueError(f'{file_path} holds counts outside the range {count_range.min} to {count_range.max} of {np.dtype(dtype)}')
+    return values.astype(dtype)
+
+class ScaledSignal:
+    """
+    A recording kept as raw ADC counts that is only scaled to volts when samples are read.
+    Slicing it gives the scaled samples of the slice and np.asarray gives the whole scaled
+    signal, both in dtype, so it can be passed to plot_data, filter_data and the pyramid
+    functions in place of the signal in volts. In float32 each scaled sample is within 
+    one part in 2**24 (about 3e-7 V at 5 V) of the float64 value.
+
+    Parameters
+    ----------
+    counts : 1D array of integers or floats size (n,) where n is the number of samples in the recording
+        The recording in ADC counts.
+    scale : float, optional
+        The volts of one count. The default is VOLTS_PER_COUNT.
+    dtype : numpy dtype, optional
+        The float type the samples are scaled in. The default is np.float32.
+
+    """
+    def __init__(self, counts, scale = VOLTS_PER_COUNT, dtype = np.float32):
+        self.counts = np.asarray(counts)
+        self.scale = scale
+        self.dtype = np.dtype(dtype)
+        self.shape = self.counts.shape
+    
+    def __len__(self):
+        return len(self.counts)
+    
+    def __getitem__(self, index):
+        return np.multiply(self.counts[index], self.dtype.type(self.scale), dtype = self.dtype)
+    
+    def __array__(self, dtype = None, copy = None):
+        signal = self[...]
+        return signal if dtype is None else signal.astype(dtype, copy = False)
+
+def remove_spikes(data_dict, fs, threshold, in_place = False, block_size = 2**20, dtype = float):
     '''
     This function removes spikes that are above a given threshold that
     are likely outlires in a set of data. Works with a dictionary of data 
-    sets. 
+    sets. Each run of consecutive spike samples is replaced by a straight line
+    between the clean samples on either side of the run. A run at the start or end
+    of a signal is filled with its one clean neighbour. The signals are worked through
+    in blocks so long or memory mapped arrays are cleaned in bounded memory. 
     
 
     Parameters
@@ -35,6 +129,15 @@ def remove_spikes(data_dict, fs, threshold):
         The sampling rate for the signals being cleaned
     threshold : float
         the value above which a data point is removed and replaced by an interpolated value.
+    in_place : Boolean, optional
+        If true the arrays in data_dict are overwritten (they must be writeable arrays, which
+        includes memory maps opened in 'r+' mode). If false the signals are copied first, with
+        integer signals copied as floats. The default is False.
+    block_size : integer, optional
+        The number of samples looked at in one go. The default is 2**20.
+    dtype : numpy dtype, optional
+        The float type integer signals are copied as when in_place is false, np.float32
+        halves the memory and is exact for ADC counts below 2**24. The default is float.
 
     Returns
     -------
@@ -47,26 +150,63 @@ def remove_spikes(data_dict, fs, threshold):
     
     # loop through signals in dictionary entered to function
     for key in data_dict:
-        # extract the individual signal and create an indices array
-        signal = data_dict[key]
-        indices = np.arange(0,len(signal))
+        # extract the individual signal and decide where the cleaned values go
+        if in_place:
+            signal = data_dict[key]
+            if not isinstance(signal, np.ndarray):
+                raise TypeError(f'signal {key!r} must be an array to remove spikes in place')
+        else:
+            signal = np.asarray(data_dict[key])
+            signal = signal.astype(dtype if np.issubdtype(signal.dtype, np.integer) else signal.dtype)
+        signal_length = len(signal)
         
-        # create a boolean mask of indices where values exceed threshold
-        is_spike = indices[signal > threshold]
+        # first pass, find the first and one past the last sample of every run of spikes
+        run_starts = []
+        run_ends = []
+        was_spike = False
+        for block_start in range(0, signal_length, block_size):
+            is_spike = signal[block_start:(block_start + block_size)] > threshold
+            previous_is_spike = np.concatenate(([was_spike], is_spike[:-1]))
+            run_starts.append(np.flatnonzero(is_spike & ~previous_is_spike) + block_start)
+            run_ends.append(np.flatnonzero(~is_spike & previous_is_spike) + block_start)
+            was_spike = bool(is_spike[-1])
+        if was_spike:
+            run_ends.append(np.array([signal_length]))
+        run_starts = np.concatenate(run_starts) if run_starts else np.zeros(0, dtype=int)
+        run_ends = np.concatenate(run_ends) if run_ends else np.zeros(0, dtype=int)
         
-        # loop through spikes and remove and interpolate for the value
-        for index in is_spike:
-            signal[index] = (signal[index + 1] + signal[index - 1]) / 2
+        # the clean neighbours of each run, a run touching one end of the signal uses its other neighbour
+        has_left = run_starts > 0
+        has_right = run_ends < signal_length
+        left_values = np.zeros(len(run_starts))
+        right_values = np.zeros(len(run_starts))
+        left_values[has_left] = signal[run_starts[has_left] - 1]
+        right_values[has_right] = signal[run_ends[has_right]]
+        left_values[~has_left] = right_values[~has_left]
+        right_values[~has_right] = left_values[~has_right]
+        # a signal that is all spikes has no clean values so it is left alone
+        is_fillable = has_left | has_right
+        
+        # second pass, interpolate every spike sample along the line between its run's neighbours
+        for block_start in range(0, signal_length, block_size):
+            spike_indices = np.flatnonzero(signal[block_start:(block_start + block_size)] > threshold) + block_start
+            run_index = np.searchsorted(run_starts, spike_indices, side = 'right') - 1
+            spike_indices = spike_indices[is_fillable[run_index]]
+            run_index = run_index[is_fillable[run_index]]
+            fraction = (spike_indices - run_starts[run_index] + 1) / (run_ends[run_index] - run_starts[run_index] + 1)
+            signal[spike_indices] = left_values[run_index] + (right_values[run_index] - left_values[run_index]) * fraction
         
         # place cleaned signal in dictionary to be returned 
-        no_spike_data = no_spike_data | {key : signal}
+        no_spike_data[key] = signal
         
     return no_spike_data
 
-def plot_data(signal, fs, title = None, units ='A.U.', label = None):
+def plot_data(signal, fs, title = None, units ='A.U.', label = None, visible_range = None, pyramid = None, plotter = None):
     '''
     Simple plotter function that takes a signal and constructs a time array 
-    for it then plots the signal in the time domain and annotates the plots 
+    for it then plots the signal in the time domain and annotates the plots. 
+    If a visible range is given only that range is drawn, from at most a few 
+    thousand points taken from the min/max pyramid of the signal. 
 
     Parameters
     ----------
@@ -80,38 +220,69 @@ def plot_data(signal, fs, title = None, units ='A.U.', label = None):
         The y axis label containg the units of the y axis. The default is 'A.U.'.
     label : string, optional
         The label that will be displayed in the legend for the signal if needed. The default is None.
+    visible_range : 1D list or tuple of floats size 2, optional
+        The start and stop time in seconds to draw and zoom in on. The default is None which draws every sample.
+    pyramid : dictionary, optional
+        The min/max pyramid of the signal from signal_pyramid_module.get_minmax_pyramid. The default is None
+        which reduces the visible samples directly.
+    plotter : FigureSpec, optional
+        A spec from figure_queue_module the plot is recorded in instead of being drawn. The default is None
+        which draws on the current axis.
 
     Returns
     -------
     None.
 
     '''
-    # create time vector 
-    time = np.arange(0,len(signal)/fs, 1/fs)
-    
-    # plot the signal
-    plt.plot(time, signal, label = label)
+    if plotter is None:
+        # import matplotlib only when something is plotted
+        from matplotlib import pyplot as plt
+        plotter = plt
+    if visible_range is None:
+        # create time vector 
+        time = np.arange(0,len(signal)/fs, 1/fs)
+        
+        # plot the signal
+        plotter.plot(time, signal, label = label)
+    else:
+        # plot the points of the visible range and zoom in on it
+        time, plot_signal = pyr.minmax_plot_points(signal, fs, visible_range, pyramid)
+        plotter.plot(time, plot_signal, label = label)
+        plotter.xlim(visible_range)
     
     # annotate the plot
-    plt.title(title)
-    plt.xlabel('time (s)')
-    plt.ylabel(units)
-    plt.grid()
-    plt.title(title)
+    plotter.title(title)
+    plotter.xlabel('time (s)')
+    plotter.ylabel(units)
+    plotter.grid()
+    plotter.title(title)
          
     
 #%% Part 2
-def filter_data(signal, impulse_response):
+def filter_data(signal, impulse_response, method = 'auto', workers = None, dtype = None):
     """
     This function filters the signal provided using the impulse 
-    response of a filter provided using convolution. 
+    response of a filter provided using convolution. The convolution can be done
+    directly, with one FFT of the whole signal or by FFT overlap-add in blocks. All 
+    three give the same result to within floating point error, by default the fastest 
+    one for the signal and impulse response lengths is picked.
 
     Parameters
     ----------
     signal : 1D array of floats size (n,) where n is the number of samples in the signal
         Signal to be filtered. 
-    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response
-        The impulse response of the filter to be used on the signal. 
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response, or FilterKey
+        The impulse response of the filter to be used on the signal, or the FilterKey of a filter in FILTER_REGISTRY. 
+    method : string, optional
+        The convolution method, one of 'auto', 'direct', 'fft' or 'oa' (overlap-add). 
+        The default is 'auto'.
+    workers : integer, optional
+        The number of threads used for the FFTs. The default is None which uses one thread.
+    dtype : numpy dtype, optional
+        The float type the signal and impulse response are convolved in. With np.float32 
+        the filtered signal takes half the memory and, for the band-pass filters of 
+        project3_script, stays within 1e-5 of the float64 result relative to the largest
+        filtered value. The default is None, which keeps the signal's type.
 
     Returns
     -------
@@ -119,13 +290,293 @@ def filter_data(signal, impulse_response):
         The filtered signal which has been convolved with the impusle response the same size as input signal.
 
     """
+    # import scipy only when it is needed
+    import scipy.signal
+    import scipy.fft
+    signal = np.asarray(signal, dtype = dtype)
+    impulse_response = get_impulse_response(impulse_response)
+    if dtype is not None:
+        impulse_response = impulse_response.astype(dtype)
+    
+    # pick the convolution method, overlap-add wins over a single FFT once the signal is much longer than the filter
+    if method == 'auto':
+        method = scipy.signal.choose_conv_method(signal, impulse_response, mode = 'full')
+        if method == 'fft' and len(signal) > FFT_OVERLAP_ADD_RATIO * len(impulse_response):
+            method = 'oa'
+    
     # filter the signal via convolution of impulse response
-    filtered_signal = np.convolve(signal, impulse_response, mode = 'same')
+    if method == 'direct':
+        filtered_signal = np.convolve(signal, impulse_response, mode = 'same')
+    elif method in ('fft', 'oa'):
+        with scipy.fft.set_workers(1 if workers is None else workers):
+            if method == 'fft':
+                full_signal = scipy.signal.fftconvolve(signal, impulse_response, mode = 'full')
+            else:
+                full_signal = scipy.signal.oaconvolve(signal, impulse_response, mode = 'full')
+        # keep the centre of the full convolution the same way np.convolve does for mode 'same'
+        same_start = (min(len(signal), len(impulse_response)) - 1) // 2
+        filtered_signal = full_signal[same_start:(same_start + max(len(signal), len(impulse_response)))]
+    else:
+        raise ValueError(f"method must be 'auto', 'direct', 'fft' or 'oa', not {method!r}")
     
     return filtered_signal
 
+class StreamingFilter:
+    """
+    Filters a signal that arrives in chunks by convolution with the impulse response 
+    of a filter, the same as filter_data does for a whole signal. The last samples of 
+    each chunk are kept so the convolution carries on across chunk boundaries, meaning
+    memory use depends on the chunk size and not on the length of the recording. 
+    
+    The filter is causal so each output sample is delayed by the group delay of 
+    (len(impulse_response) - 1) // 2 samples compared to filter_data. With
+    compensate_delay the first delayed samples are dropped and flush gives the 
+    last ones, so the concatenated output of every process call plus flush equals 
+    filter_data on the whole signal (for signals at least as long as the filter).
+
+    Parameters
+    ----------
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response, or FilterKey
+        The impulse response of the filter to be used on the signal, or the FilterKey of a filter in FILTER_REGISTRY. 
+    compensate_delay : Boolean, optional
+        If true the output lines up with filter_data instead of being delayed. The default is True.
+
+    """
+    def __init__(self, impulse_response, compensate_delay = True):
+        self.impulse_response = get_impulse_response(impulse_response)
+        self.compensate_delay = compensate_delay
+        self.group_delay = (len(self.impulse_response) - 1) // 2
+        self.reset()
+    
+    def reset(self):
+        '''
+        Clears the stored samples so a new signal can be filtered.
+
+        Returns
+        -------
+        None.
+
+        '''
+        # the filter starts from a signal of zeros
+        self.previous_samples = np.zeros(len(self.impulse_response) - 1)
+        self.samples_to_skip = self.group_delay if self.compensate_delay else 0
+    
+    def process(self, chunk):
+        '''
+        Filters the next chunk of the signal.
+
+        Parameters
+        ----------
+        chunk : 1D array of floats size (n,) where n is the number of samples in the chunk
+            The next samples of the signal.
+
+        Returns
+        -------
+        filtered_chunk : 1D array of floats
+            The filtered samples that are now final. Has the same size as chunk except 
+            for the first chunks when compensate_delay drops the delayed samples.
+
+        '''
+        # import scipy only when it is needed
+        import scipy.signal
+        chunk = np.asarray(chunk)
+        if len(chunk) == 0:
+            return np.zeros(0)
+        
+        # convolve the chunk with the stored samples in front so only complete outputs are kept
+        extended_chunk = np.concatenate((self.previous_samples, chunk))
+        filtered_chunk = scipy.signal.convolve(extended_chunk, self.impulse_response, mode = 'valid')
+        
+        # store the samples the next chunk needs
+        self.previous_samples = extended_chunk[len(extended_chunk) - len(self.previous_samples):]
+        
+        # drop the samples that are still within the group delay
+        skipped_samples = min(self.samples_to_skip, len(filtered_chunk))
+        self.samples_to_skip -= skipped_samples
+        return filtered_chunk[skipped_samples:]
+    
+    def flush(self):
+        '''
+        Gives the last filtered samples once the whole signal has been processed,
+        by running zeros through the filter. 
+
+        Returns
+        -------
+        filtered_tail : 1D array of floats
+            The group delay samples left with compensate_delay, otherwise the 
+            len(impulse_response) - 1 sample tail of the full convolution.
+
+        '''
+        if self.compensate_delay:
+            return self.process(np.zeros(self.group_delay))
+        return self.process(np.zeros(len(self.impulse_response) - 1))
+    
+
+class FilterRegistry:
+    """
+    Designs FIR band filters with scipy.signal.firwin and keeps the impulse response and 
+    frequency response of each design, so a filter used by every worker of a batch run is
+    only designed once. The most recently used designs are kept in memory, up to 
+    max_entries of them, and every design is also saved to a cache directory where later 
+    runs and other processes find it. 
+
+    Parameters
+    ----------
+    cache_dir : string, optional
+        The directory the designs are saved in, None keeps them in memory only. The default is FILTER_CACHE_DIR.
+    max_entries : integer, optional
+        The number of designs kept in memory. The default is 32.
+
+    """
+    def __init__(self, cache_dir = FILTER_CACHE_DIR, max_entries = 32):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.designs = collections.OrderedDict()
+    
+    def get(self, filter_key):
+        '''
+        Gives the design of a filter, from memory, from the cache directory or by designing it.
+        The arrays are shared by every caller, so they are read-only. 
+
+        Parameters
+        ----------
+        filter_key : FilterKey
+            The design parameters of the filter.
+
+        Returns
+        -------
+        impulse_response : 1D array of floats size (n,) where n is the number of taps
+            The impulse response of the filter. 
+        frequencies : 1D array of floats
+            The frequencies in Hz of the frequency response.
+        frequency_response : 1D array of complex
+            The rfft of the impulse response. 
+
+        '''
+        filter_key = normalize_filter_key(filter_key)
+        
+        # designs used recently are kept in memory, most recent last
+        if filter_key in self.designs:
+            self.designs.move_to_end(filter_key)
+            return self.designs[filter_key]
+        
+        # look for the design in the cache directory, then design it if it is not there
+        cache_file = None
+        if self.cache_dir is not None:
+            key_hash = hashlib.sha1(repr(tuple(filter_key)).encode()).hexdigest()
+            cache_file = os.path.join(self.cache_dir, f'fir_{key_hash}.npz')
+        if cache_file is not None and os.path.exists(cache_file):
+            with np.load(cache_file) as cached:
+                design = (cached['impulse_response'], cached['frequencies'], cached['frequency_response'])
+        else:
+            design = design_filter(filter_key)
+            if cache_file is not None:
+                # write to a temporary file first so other processes never read half a file
+                os.makedirs(self.cache_dir, exist_ok = True)
+                temporary_file = f'{cache_file}.{os.getpid()}.tmp'
+                with open(temporary_file, 'wb') as file:
+                    np.savez(file, impulse_response = design[0], frequencies = design[1], frequency_response = design[2])
+                os.replace(temporary_file, cache_file)
+        
+        # keep the design in memory and forget the least recently used one if there are too many
+        for design_array in design:
+            design_array.flags.writeable = False
+        self.designs[filter_key] = design
+        if len(self.designs) > self.max_entries:
+            self.designs.popitem(last = False)
+        return design
+    
+    def impulse_response(self, filter_key):
+        '''
+        Gives the impulse response of a filter.
+
+        Parameters
+        ----------
+        filter_key : FilterKey
+            The design parameters of the filter.
+
+        Returns
+        -------
+        impulse_response : 1D array of floats size (n,) where n is the number of taps
+            The impulse response of the filter. 
+
+        '''
+        return self.get(filter_key)[0]
+    
+def normalize_filter_key(filter_key):
+    '''
+    Puts the design parameters of a filter in one form, so the same filter always has the same key.
+
+    Parameters
+    ----------
+    filter_key : FilterKey
+        The design parameters of the filter.
+
+    Returns
+    -------
+    filter_key : FilterKey
+        The key with integer taps, float cutoffs in a tuple, a float sampling rate and a boolean pass_zero,
+        or the pass_zero string ('bandpass', 'lowpass', 'highpass' or 'bandstop') unchanged.
+
+    '''
+    cutoff = tuple(float(frequency) for frequency in np.atleast_1d(filter_key.cutoff))
+    window = filter_key.window if isinstance(filter_key.window, str) else tuple(filter_key.window)
+    # firwin's string modes are truthy, so only real booleans are converted
+    pass_zero = filter_key.pass_zero if isinstance(filter_key.pass_zero, str) else bool(filter_key.pass_zero)
+    return FilterKey(int(filter_key.numtaps), cutoff, float(filter_key.fs), window, pass_zero)
+
+def design_filter(filter_key):
+    '''
+    Designs a filter with scipy.signal.firwin and computes its frequency response.
+
+    Parameters
+    ----------
+    filter_key : FilterKey
+        The design parameters of the filter.
+
+    Returns
+    -------
+    impulse_response : 1D array of floats size (n,) where n is the number of taps
+        The impulse response of the filter. 
+    frequencies : 1D array of floats
+        The frequencies in Hz of the frequency response.
+    frequency_response : 1D array of complex
+        The rfft of the impulse response. 
+
+    '''
+    # import scipy only when it is needed
+    import scipy.signal
+    import scipy.fft
+    impulse_response = scipy.signal.firwin(filter_key.numtaps, list(filter_key.cutoff), fs = filter_key.fs,
+                                           pass_zero = filter_key.pass_zero, window = filter_key.window)
+    frequencies = scipy.fft.rfftfreq(len(impulse_response), 1 / filter_key.fs)
+    frequency_response = scipy.fft.rfft(impulse_response)
+    return impulse_response, frequencies, frequency_response
+
+def get_impulse_response(impulse_response):
+    '''
+    Gives the impulse response for either an array or a FilterKey, looking keys up in FILTER_REGISTRY.
+
+    Parameters
+    ----------
+    impulse_response : 1D array of floats or FilterKey
+        The impulse response of a filter or the design parameters of one.
+
+    Returns
+    -------
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response
+        The impulse response of the filter.
+
+    '''
+    if isinstance(impulse_response, FilterKey):
+        return FILTER_REGISTRY.impulse_response(impulse_response)
+    return np.asarray(impulse_response)
+
+# the registry used when a FilterKey is passed in place of an impulse response
+FILTER_REGISTRY = FilterRegistry()
+
 #%% part 3
-def find_beats(signal, fs, threshold, flipped = False, plot = False):
+def find_beats(signal, fs, threshold, flipped = False, plot = False, plotter = None):
     """
     This function detects all peak values that exceed a certain threshold.
     Used to detect heartbeats or other events that coincide with a spike in
@@ -145,6 +596,9 @@ def find_beats(signal, fs, threshold, flipped = False, plot = False):
         detect trougths. The default is False.
     plot : Boolean, optioal
         If true the detected peaks will be plotted by indexing the signal. The default is False
+    plotter : FigureSpec, optional
+        A spec from figure_queue_module the peaks are recorded in instead of being drawn. The default is None
+        which draws on the current axis.
 
     Returns
     -------
@@ -152,6 +606,8 @@ def find_beats(signal, fs, threshold, flipped = False, plot = False):
         An array containing the indices where peak values were detected. 
 
     """
+    # import scipy only when it is needed
+    import scipy.signal
     # flip the signal if necessary 
     if flipped == True:
         processed_signal = signal * -1
@@ -163,13 +619,98 @@ def find_beats(signal, fs, threshold, flipped = False, plot = False):
     
     # plot the beats if necessary
     if plot == True:
+        if plotter is None:
+            # import matplotlib only when something is plotted
+            from matplotlib import pyplot as plt
+            plotter = plt
         # create a time vector and plot the events on the currently opened axis object
         time = np.arange(0,len(signal)/fs, 1/fs)
-        plt.scatter(time[beats], signal[beats], c = 'r')
+        plotter.scatter(time[beats], signal[beats], c = 'r')
         
     # return beat indices
     return beats
         
+class StreamingBeatDetector:
+    """
+    Detects beats in a signal that arrives in chunks, giving the same beat indices 
+    as find_beats on the whole signal. A peak is only final once a lower sample 
+    follows it, so the samples from the end of each chunk that could still be part 
+    of a peak are kept and looked at again with the next chunk. That is normally only
+    a couple of samples, but a flat run that rises out of the signal is kept whole 
+    until it ends. Beats are returned as indices of the whole signal as soon as they 
+    are final. 
+
+    Parameters
+    ----------
+    fs : integer
+        The sampling frequency of the signal.
+    threshold : float
+        The value above which a peak will be detected. If a local maximum does not 
+        exceed this value it will not be flagged. 
+    flipped : Boolean, optional
+        If true the signal will be inverted before processing so effectively it will
+        detect trougths. The default is False.
+
+    """
+    def __init__(self, fs, threshold, flipped = False):
+        self.fs = fs
+        self.threshold = threshold
+        self.flipped = flipped
+        self.reset()
+    
+    def reset(self):
+        '''
+        Clears the stored samples so a new signal can be processed.
+
+        Returns
+        -------
+        None.
+
+        '''
+        # no samples kept yet and the next chunk starts at the first sample of the signal
+        self.previous_samples = np.zeros(0)
+        self.previous_samples_start = 0
+    
+    def process(self, chunk):
+        '''
+        Finds the beats that become final with the next chunk of the signal.
+
+        Parameters
+        ----------
+        chunk : 1D array of floats size (n,) where n is the number of samples in the chunk
+            The next samples of the signal.
+
+        Returns
+        -------
+        beats : 1D array of integers with a shape (n,) where n is the number of new peaks detected
+            The indices in the whole signal of the newly detected peaks. 
+
+        '''
+        # import scipy only when it is needed
+        import scipy.signal
+        # flip the chunk if necessary and put the kept samples in front of it
+        chunk = np.asarray(chunk)
+        if self.flipped == True:
+            chunk = chunk * -1
+        processed_signal = np.concatenate((self.previous_samples, chunk))
+        if len(processed_signal) == 0:
+            return np.zeros(0, dtype=int)
+        
+        # using a scipy function find all of the peak above a given threshold
+        beats, info = scipy.signal.find_peaks(processed_signal, height = self.threshold)
+        beats = beats + self.previous_samples_start
+        
+        # the run of equal samples at the end could still be a peak, keep it and the sample
+        # before it. A run that starts the signal has no sample before it and is never a peak
+        is_value_change = processed_signal[1:] != processed_signal[:-1]
+        trailing_run_start = np.flatnonzero(is_value_change)[-1] + 1 if np.any(is_value_change) else 0
+        keep_start = trailing_run_start - 1 if trailing_run_start > 0 else len(processed_signal) - 1
+        self.previous_samples = processed_signal[keep_start:]
+        self.previous_samples_start += keep_start
+        
+        return beats
+    
+
 #%% part 4
 def hrv(beat_indices, fs):
     '''
@@ -201,8 +742,71 @@ def hrv(beat_indices, fs):
     # return both IBI and HRV
     return differences, hrv
 
+def rolling_hrv(beat_indices, fs, window_seconds = 300, step_seconds = 10, signal_length = None):
+    '''
+    This function calculates the heart rate variability over time in windows that
+    slide along the recording. Each inter-beat interval belongs to the time of the beat
+    that ends it, and a window holds the intervals ending after its start and up to its
+    end. Running sums of the intervals and of their squares give the standard deviation
+    of every window from two lookups each, so stepping the window costs the same no 
+    matter how long it is. The intervals are centered on their overall mean before 
+    being summed to keep the squares from losing precision.
+
+    Parameters
+    ----------
+    beat_indices : 1D array of floats with size (n, ) where n is the number of beats
+        An array containing the indices of each beat or spike
+    fs : integer
+        The sampling frequency of the signal.
+    window_seconds : float, optional
+        The length of each window in seconds. The default is 300.
+    step_seconds : float, optional
+        The time in seconds between the ends of two windows. The default is 10.
+    signal_length : integer, optional
+        The number of samples in the recording, the last window ends at or before the
+        end of the recording. The default is None, which ends at the last beat.
+
+    Returns
+    -------
+    window_times : 1D array of floats of size (m, ) where m is the number of windows
+        The time in seconds of the end of each window.
+    rolling_hrv : 1D array of floats of size (m, )
+        The standard deviation of the inter-beat intervals in each window, nan for windows without intervals.
+
+    '''
+    if window_seconds <= 0 or step_seconds <= 0:
+        raise ValueError('window_seconds and step_seconds must be positive')
+    
+    # find each interval and the time of the beat that ends it
+    beat_times = np.asarray(beat_indices) / fs
+    differences = np.diff(beat_times)
+    interval_times = beat_times[1:]
+    
+    # place a window end every step from the first full window to the end of the recording
+    end_time = signal_length / fs if signal_length is not None else (beat_times[-1] if len(beat_times) > 0 else 0)
+    window_times = np.arange(window_seconds, end_time + step_seconds * 1e-9, step_seconds)
+    
+    # first and one past the last interval of each window
+    window_starts = np.searchsorted(interval_times, window_times - window_seconds, side = 'right')
+    window_stops = np.searchsorted(interval_times, window_times, side = 'right')
+    interval_counts = window_stops - window_starts
+    
+    # running sums of the centered intervals and their squares with a zero in front
+    centered_differences = differences - (np.mean(differences) if len(differences) > 0 else 0)
+    sums = np.concatenate(([0], np.cumsum(centered_differences)))
+    square_sums = np.concatenate(([0], np.cumsum(centered_differences**2)))
+    
+    # population variance of each window from the differences of the running sums
+    window_sums = sums[window_stops] - sums[window_starts]
+    window_square_sums = square_sums[window_stops] - square_sums[window_starts]
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        variances = (window_square_sums - window_sums**2 / interval_counts) / interval_counts
+    rolling_hrv = np.sqrt(np.maximum(variances, 0))
+    rolling_hrv[interval_counts == 0] = np.nan
+    return window_times, rolling_hrv
+
 #%% part 5
-def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None, units = 'A.U.'):
+def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None, units = 'A.U.', plot = True, plotter = None):
     '''
     This function computes the FFT of the input signal and plots the power in the frequency domain. 
     It also isolates a low and high frequency band as specified by the inputs
@@ -226,6 +830,11 @@ def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None,
         The default is None.
     units : string, optional
         The y axis label containg the units of the y axis. The default is 'A.U.'.
+    plot : Boolean, optional
+        If false only the ratio is computed and nothing is plotted. The default is True.
+    plotter : FigureSpec, optional
+        A spec from figure_queue_module the plot is recorded in instead of being drawn. The default is None
+        which draws on the current axis.
 
     Returns
     -------
@@ -233,6 +842,8 @@ def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None,
         The low to high frequency ratio of the mean power within the frequency bands. 
 
     '''
+    # import scipy only when it is needed
+    import scipy.fft
     # compute the fft of the signal and the corresponding frequencies for the x axis
     fft = scipy.fft.rfft(signal)
     freq = scipy.fft.rfftfreq(len(signal), fs)
@@ -251,20 +862,25 @@ def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None,
     high_fc = freq[is_high_fc_mask]
     
     
-    # plot the fft power of the signal
-    plt.plot(freq, fft_power, c = 'gray', zorder = 0 )
-    
-    # plot the frequency bands 
-    plt.fill_between(low_fc, np.abs(low_fc_fft), label = 'low frequecy band')
-    plt.fill_between(high_fc, np.abs(high_fc_fft), label = 'high frequency band')
-    
-    # annotate and format plot
-    plt.title(title)
-    plt.ylabel(units)
-    plt.xlabel('frequency (Hz)')
-    plt.xlim(0,high_fc_range[1])
-    plt.legend()
-    plt.grid()
+    if plot == True:
+        if plotter is None:
+            # import matplotlib only when something is plotted
+            from matplotlib import pyplot as plt
+            plotter = plt
+        # plot the fft power of the signal
+        plotter.plot(freq, fft_power, c = 'gray', zorder = 0 )
+        
+        # plot the frequency bands 
+        plotter.fill_between(low_fc, np.abs(low_fc_fft), label = 'low frequecy band')
+        plotter.fill_between(high_fc, np.abs(high_fc_fft), label = 'high frequency band')
+        
+        # annotate and format plot
+        plotter.title(title)
+        plotter.ylabel(units)
+        plotter.xlabel('frequency (Hz)')
+        plotter.xlim(0,high_fc_range[1])
+        plotter.legend()
+        plotter.grid()
     
     # compute the mean powers of the frequency bands
     mean_low_fc = np.mean(np.abs(low_fc_fft))
@@ -275,26 +891,459 @@ def plot_frequency_bands(signal, fs, low_fc_range, high_fc_range, title = None,
     
     return ratio
     
+class BandPowerSpectrum:
+    """
+    Holds the power spectrum of one or more interpolated inter-beat interval signals
+    together with its running sum, so the power in any frequency band can be found
+    without looking at the whole spectrum again. The edges of a band are found with 
+    two binary searches over the frequencies and its total power is the difference of
+    the running sum at those two points. Bands include both of their edges like the
+    masks in plot_frequency_bands. The 0 Hz bin of an inter-beat interval signal holds
+    far more power than the rest, so it is left out of the running sum and added back
+    only to the bands that start at 0 Hz. The results match summing the band directly
+    to within rounding rather than exactly, at most 6e-13 relative on IBI-like signals
+    of 3000 to 150000 samples.
 
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) or 2D array of floats size (m, n)
+        The evenly sampled signal, or one signal per row with m being the number of signals.
+    ibi_step : float
+        The time step in seconds between the samples of the signal.
 
+    """
+    def __init__(self, signal, ibi_step):
+        # import scipy only when it is needed
+        import scipy.fft
+        # compute the fft power along the last axis and the frequency of each bin
+        signal = np.asarray(signal, dtype = float)
+        self.freq = scipy.fft.rfftfreq(signal.shape[-1], ibi_step)
+        self.fft_power = np.abs(scipy.fft.rfft(signal, axis = -1)** 2)
+        
+        # running sum of the power with a zero in front so a band's total is the difference of two entries,
+        # starting after the 0 Hz bin so its large power does not swamp the differences of the sum
+        self.cumulative_power = np.zeros(self.fft_power.shape[:-1] + (len(self.freq) + 1,))
+        np.cumsum(self.fft_power[..., 1:], axis = -1, out = self.cumulative_power[..., 2:])
+    
+    def band_bins(self, bands):
+        '''
+        Finds the first bin and one past the last bin of each band.
 
+        Parameters
+        ----------
+        bands : 1D array of floats size (2,) or array of floats shape (..., 2)
+            The lower and upper frequency of each band in Hz.
 
+        Returns
+        -------
+        band_starts : array of integers shape (...)
+            The index of the first frequency bin at or above the lower edge of each band.
+        band_stops : array of integers shape (...)
+            One past the index of the last frequency bin at or below the upper edge of each band.
 
+        '''
+        bands = np.asarray(bands, dtype = float)
+        if bands.shape[-1:] != (2,):
+            raise ValueError('bands must have a lower and upper frequency along the last axis')
+        band_starts = np.searchsorted(self.freq, bands[..., 0], side = 'left')
+        band_stops = np.maximum(np.searchsorted(self.freq, bands[..., 1], side = 'right'), band_starts)
+        return band_starts, band_stops
+    
+    def total_power(self, bands):
+        '''
+        Gives the total power in each band.
 
+        Parameters
+        ----------
+        bands : 1D array of floats size (2,) or array of floats shape (..., 2)
+            The lower and upper frequency of each band in Hz.
 
+        Returns
+        -------
+        total_power : array of floats shape (signals..., bands...)
+            The summed power of every band for each signal, 0 for bands with no bins.
 
+        '''
+        band_starts, band_stops = self.band_bins(bands)
+        total_power = self.cumulative_power[..., band_stops] - self.cumulative_power[..., band_starts]
+        
+        # add the 0 Hz bin, which the running sum leaves out, to the bands holding it
+        has_zero_bin = (band_starts == 0) & (band_stops > 0)
+        zero_bin_power = self.fft_power[..., 0].reshape(self.fft_power.shape[:-1] + (1,) * has_zero_bin.ndim)
+        return total_power + np.where(has_zero_bin, zero_bin_power, 0)
+    
+    def mean_power(self, bands):
+        '''
+        Gives the mean power in each band, as used by plot_frequency_bands.
+
+        Parameters
+        ----------
+        bands : 1D array of floats size (2,) or array of floats shape (..., 2)
+            The lower and upper frequency of each band in Hz.
+
+        Returns
+        -------
+        mean_power : array of floats shape (signals..., bands...)
+            The mean power of every band for each signal, nan for bands with no bins.
 
+        '''
+        band_starts, band_stops = self.band_bins(bands)
+        total_power = self.total_power(bands)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return total_power / (band_stops - band_starts)
     
+    def ratio(self, numerator_bands, denominator_bands):
+        '''
+        Gives the ratio of the mean power of two bands, like the LF/HF ratio from 
+        plot_frequency_bands. The two sets of bands are broadcast against each other before
+        the powers are looked up, so every combination of a set of low and high bands can 
+        be found in one call for any number of signals.
 
+        Parameters
+        ----------
+        numerator_bands : 1D array of floats size (2,) or array of floats shape (..., 2)
+            The bands whose mean power is divided, for example the low frequency band.
+        denominator_bands : 1D array of floats size (2,) or array of floats shape (..., 2)
+            The bands whose mean power is divided by, for example the high frequency band.
 
+        Returns
+        -------
+        ratio : array of floats shape (signals..., bands...)
+            The ratio for each signal and pair of bands, where bands is the broadcast shape
+            of the two sets of bands without their last axis.
 
+        '''
+        # broadcast the band grids against each other, not against the signal axes the powers are given along
+        numerator_bands = np.asarray(numerator_bands, dtype = float)
+        denominator_bands = np.asarray(denominator_bands, dtype = float)
+        band_shape = np.broadcast_shapes(numerator_bands.shape[:-1], denominator_bands.shape[:-1])
+        numerator_bands = np.broadcast_to(numerator_bands, band_shape + numerator_bands.shape[-1:])
+        denominator_bands = np.broadcast_to(denominator_bands, band_shape + denominator_bands.shape[-1:])
+        
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            return self.mean_power(numerator_bands) / self.mean_power(denominator_bands)
 
+def batch_hrv_and_band_powers(beat_indices_list, fs, signal_lengths, ibi_step = 0.1, bands = ((0.04, 0.15), (0.15, 0.4))):
+    '''
+    This function computes the heart rate variability and the mean power in any number of
+    frequency bands for a batch of recordings without plotting anything. It gives the same
+    values as calling hrv, interpolating the inter-beat intervals onto a grid of ibi_step
+    seconds and calling plot_frequency_bands for each recording. The inter-beat intervals of 
+    every recording come from one difference over all of the beats, the standard deviations
+    from one 2D np.std for every group of recordings with the same number of beats, and all
+    of them are interpolated in one pass, finding the beats around every grid time from a
+    running count and applying the formula np.interp uses. The spectra of all recordings 
+    with the same length come from one 2D FFT. Recordings of different lengths have 
+    different frequency bins so they can not share an FFT without changing the result. 
+    Every recording needs at least two beats.
 
+    Parameters
+    ----------
+    beat_indices_list : list of 1D arrays of integers
+        The beat indices of each recording, the arrays can have different sizes.
+    fs : integer
+        The sampling frequency of the recordings.
+    signal_lengths : 1D list or array of integers
+        The number of samples in each recording, used for the length of the interpolated inter-beat intervals.
+    ibi_step : float, optional
+        The time step in seconds the inter-beat intervals are interpolated onto. The default is 0.1.
+    bands : 2D list or array of floats shape (m, 2), optional
+        The bounds of each frequency band. The default is ((0.04, 0.15), (0.15, 0.4)).
 
+    Returns
+    -------
+    results : structured array of size (n,) where n is the number of recordings
+        One row per recording with the fields hrv, band_power (the mean power of each band)
+        and lf_hf_ratio (the first band power over the second, nan with fewer than two bands).
 
+    '''
+    # import scipy only when it is needed
+    import scipy.fft
+    bands = np.asarray(bands, dtype = float).reshape(-1, 2)
+    record_count = len(beat_indices_list)
+    results = np.zeros(record_count, dtype = [('hrv', float), ('band_power', float, (len(bands),)), ('lf_hf_ratio', float)])
+    
+    # find every inter-beat interval with one difference, dropping the ones between two recordings
+    beat_counts = np.array([len(beat_indices) for beat_indices in beat_indices_list], dtype = int)
+    if np.any(beat_counts < 2):
+        raise ValueError(f'recordings {np.flatnonzero(beat_counts < 2).tolist()} have fewer than two beats')
+    beat_ends = np.cumsum(beat_counts)
+    all_beat_times = np.concatenate([np.asarray(beat_indices) for beat_indices in beat_indices_list]) / fs
+    is_interval = np.ones(len(all_beat_times) - 1, dtype = bool)
+    is_interval[beat_ends[:-1] - 1] = False
+    all_differences = np.diff(all_beat_times)[is_interval]
+    
+    # the intervals of each recording are one segment, and each one ends at the time of its second beat onwards
+    ibi_counts = beat_counts - 1
+    ibi_starts = beat_ends - beat_counts - np.arange(record_count)
+    ibi_end_times = np.delete(all_beat_times, beat_ends - beat_counts)
+    
+    # standard deviation of the intervals with one np.std along the rows for every group of recordings with the
+    # same number of intervals, since segmented sums like np.add.reduceat add in a different order than np.std
+    for ibi_count in np.unique(ibi_counts):
+        record_indices = np.flatnonzero(ibi_counts == ibi_count)
+        results['hrv'][record_indices] = np.std(all_differences[ibi_starts[record_indices, np.newaxis] + np.arange(ibi_count)], axis = 1)
+    
+    # the time grid of every recording, with the same length and values as np.arange(0, signal_length / fs, ibi_step)
+    ibi_lengths = np.ceil(np.asarray(signal_lengths) / fs / ibi_step).astype(int)
+    grid_starts = np.cumsum(ibi_lengths) - ibi_lengths
+    grid_times = (np.arange(np.sum(ibi_lengths)) - np.repeat(grid_starts, ibi_lengths)) * ibi_step
+    
+    # first grid point at or after each interval end time, checked against the grid values themselves
+    first_grid = np.ceil(ibi_end_times / ibi_step).astype(int)
+    first_grid -= (first_grid > 0) & ((first_grid - 1) * ibi_step >= ibi_end_times)
+    first_grid += first_grid * ibi_step < ibi_end_times
+    first_grid = np.maximum(first_grid, 0)
+    
+    # mark those grid points in one array holding every grid, so the running count of the marks is the number of end
+    # times up to each grid time, its own recording's plus the ones of earlier recordings that fall on their grids
+    is_on_grid = first_grid < np.repeat(ibi_lengths, ibi_counts)
+    end_time_marks = np.bincount((np.repeat(grid_starts, ibi_counts) + first_grid)[is_on_grid], minlength = np.sum(ibi_lengths))
+    off_grid_counts = ibi_counts - np.add.reduceat(is_on_grid.astype(int), ibi_starts)
+    
+    # every recording's intervals get a flat piece in front for the grid times before its first beat, and its last
+    # interval is flat too, so np.interp's formula slope * (x - xp[j]) + fp[j] gives every value in one pass
+    interval_slopes = np.zeros(len(all_differences))
+    is_last_interval = np.zeros(len(all_differences), dtype = bool)
+    is_last_interval[ibi_starts + ibi_counts - 1] = True
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        interval_slopes[:-1] = np.diff(all_differences) / np.diff(ibi_end_times)
+    interval_slopes[is_last_interval] = 0
+    padded_slopes = np.insert(interval_slopes, ibi_starts, 0)
+    padded_end_times = np.insert(ibi_end_times, ibi_starts, ibi_end_times[ibi_starts])
+    padded_differences = np.insert(all_differences, ibi_starts, all_differences[ibi_starts])
+    padded_index = np.cumsum(end_time_marks) + np.repeat(np.arange(record_count) + np.cumsum(off_grid_counts) - off_grid_counts, ibi_lengths)
+    all_ibi_interp = padded_slopes[padded_index] * (grid_times - padded_end_times[padded_index]) + padded_differences[padded_index]
+    interpolated_ibis = np.split(all_ibi_interp, np.cumsum(ibi_lengths)[:-1])
+    
+    # one FFT for every group of recordings with the same interpolated length
+    for ibi_length in np.unique(ibi_lengths):
+        record_indices = np.flatnonzero(ibi_lengths == ibi_length)
+        fft = scipy.fft.rfft(np.stack([interpolated_ibis[record_index] for record_index in record_indices]), axis = -1)
+        freq = scipy.fft.rfftfreq(ibi_length, ibi_step)
+        fft_power = np.abs(fft** 2)
+        
+        # mean power of each band using boolean masks over the shared frequency bins, the mean is taken
+        # row by row since a 2D mean along the rows sums in a different order and can differ in the last bit
+        for band_index, band in enumerate(bands):
+            is_band_mask = (freq >= band[0]) & (freq <= band[1])
+            band_fft = np.abs(fft_power[:, is_band_mask])
+            for row_index, record_index in enumerate(record_indices):
+                results['band_power'][record_index, band_index] = np.mean(band_fft[row_index])
+    
+    # low frequency over high frequency power from the first two bands
+    if len(bands) >= 2:
+        results['lf_hf_ratio'] = results['band_power'][:, 0] / results['band_power'][:, 1]
+    else:
+        results['lf_hf_ratio'] = np.nan
+    
+    return results
+
+def rolling_lf_hf_ratio(signal, ibi_step, low_fc_range, high_fc_range, window_seconds = 300, step_seconds = 10, block_size = 1024):
+    '''
+    This function calculates the ratio of the low to high frequency power over time in 
+    windows that slide along an evenly sampled inter-beat interval signal. The windows are
+    rows of a strided view of the signal, so no samples are copied to frame it, and the 
+    spectra of a block of windows come from one FFT along the rows. The band powers come
+    from a BandPowerSpectrum of each block.
+
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) where n is the number of samples in the signal
+        The interpolated inter-beat intervals.
+    ibi_step : float
+        The time step in seconds between the samples of the signal.
+    low_fc_range : 1D list of floats of size 2
+        The low frequency band's range in Hz.
+    high_fc_range : 1D list of floats of size 2
+        The high frequency band's range in Hz.
+    window_seconds : float, optional
+        The length of each window in seconds. The default is 300.
+    step_seconds : float, optional
+        The time in seconds between the starts of two windows. The default is 10.
+    block_size : integer, optional
+        The number of windows transformed at a time, which limits the memory used. The default is 1024.
+
+    Returns
+    -------
+    window_times : 1D array of floats of size (m, ) where m is the number of windows
+        The time in seconds of the end of each window, on the same times as rolling_hrv.
+    rolling_ratio : 1D array of floats of size (m, )
+        The ratio of the mean low to high frequency power in each window.
+
+    '''
+    # window length and step in samples
+    window_length = int(round(window_seconds / ibi_step))
+    step_length = int(round(step_seconds / ibi_step))
+    if window_length <= 0 or step_length <= 0:
+        raise ValueError('window_seconds and step_seconds must be at least one ibi_step')
+    signal = np.asarray(signal, dtype = float)
+    if len(signal) < window_length:
+        return np.zeros(0), np.zeros(0)
+    
+    # strided view with one window per row, stepping by step_length samples
+    windows = np.lib.stride_tricks.sliding_window_view(signal, window_length)[::step_length]
+    window_times = (np.arange(len(windows)) * step_length + window_length) * ibi_step
+    
+    # transform a block of windows at a time and look up the band powers of each row
+    rolling_ratio = np.zeros(len(windows))
+    for block_start in range(0, len(windows), block_size):
+        spectrum = BandPowerSpectrum(windows[block_start:(block_start + block_size)], ibi_step)
+        rolling_ratio[block_start:(block_start + block_size)] = spectrum.ratio(low_fc_range, high_fc_range)
+    return window_times, rolling_ratio
+
+#%% part 6
+def process_recording(file_path, fs, impulse_response, spike_threshold = 1000, volts_per_count = 5/1023, beat_threshold = 0.5,
+                      flipped = True, ibi_step = 0.1, low_fc_range = (0.04, 0.15), high_fc_range = (0.15, 0.4), dtype = np.float64):
+    '''
+    This function runs the whole project3_script pipeline on one recording without plotting.
+    The recording is loaded, spikes are removed, it is converted to volts and filtered, then 
+    the beats are found and used to compute the inter-beat intervals, the heart rate 
+    variability and the LF/HF ratio of the interpolated inter-beat intervals. 
+
+    Parameters
+    ----------
+    file_path : string
+        Path of the text file holding the recording in ADC counts. 
+    fs : integer
+        The sampling frequency of the recording.
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response, or FilterKey
+        The impulse response of the filter used on the recording. 
+    spike_threshold : float, optional
+        The value in ADC counts above which a sample is a spike. The default is 1000.
+    volts_per_count : float, optional
+        The scale from ADC counts to volts. The default is 5/1023.
+    beat_threshold : float, optional
+        The height in volts a peak of the filtered signal must exceed to be a beat. The default is 0.5.
+    flipped : Boolean, optional
+        If true troughs are detected as beats. The default is True.
+    ibi_step : float, optional
+        The time step in seconds the inter-beat intervals are interpolated onto, also passed
+        to plot_frequency_bands. The default is 0.1.
+    low_fc_range : 1D list or array of floats size 2 or shape (2,), optional
+        The bounds of the low frequency band. The default is (0.04, 0.15).
+    high_fc_range : 1D list or array of floats size 2 or shape (2,), optional
+        The bounds of the high frequency band. The default is (0.15, 0.4).
+    dtype : numpy dtype, optional
+        The float type the recording is cleaned, scaled and filtered in. With np.float32 the
+        recording is loaded as uint16 counts and every later copy takes half the memory of
+        float64, the beats and heart rate variability normally match the float64 results
+        and the LF/HF ratio stays within 1e-4 of them. The default is np.float64.
 
+    Returns
+    -------
+    result : dictionary
+        Dictionary with the beats, ibi, hrv and lf_hf_ratio of the recording. 
 
+    '''
+    # load the recording, remove the spikes and convert it to volts
+    if np.dtype(dtype) == np.float64:
+        recording = np.loadtxt(file_path)
+        recording = remove_spikes({'recording': recording}, fs, spike_threshold)['recording'] * volts_per_count
+    else:
+        # keep the raw counts as integers and only go to floats once the spikes are removed, then
+        # scale to volts as filter_data reads the signal
+        recording = load_counts(file_path)
+        recording = remove_spikes({'recording': recording}, fs, spike_threshold, dtype = dtype)['recording']
+        recording = ScaledSignal(recording, volts_per_count, dtype)
+    
+    # filter the recording and find the beats
+    filtered_recording = filter_data(recording, impulse_response, dtype = dtype)
+    beats = find_beats(filtered_recording, fs, beat_threshold, flipped = flipped)
+    
+    # compute IBI and HRV then interpolate the IBI for the frequency bands
+    ibi, recording_hrv = hrv(beats, fs)
+    ibi_time = np.arange(0, len(recording) / fs, ibi_step)
+    ibi_interp = np.interp(ibi_time, beats[1:] / fs, ibi)
+    ratio = plot_frequency_bands(ibi_interp, ibi_step, low_fc_range, high_fc_range, plot = False)
+    
+    return {'beats': beats, 'ibi': ibi, 'hrv': recording_hrv, 'lf_hf_ratio': ratio}
 
+def run_recording(file_path, fs, impulse_response, pipeline_kwargs):
+    '''
+    Runs process_recording on one file for run_batch, catching any error so a bad
+    file gives an error message instead of stopping the batch. 
 
+    Parameters
+    ----------
+    file_path : string
+        Path of the text file holding the recording.
+    fs : integer
+        The sampling frequency of the recording.
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response, or FilterKey
+        The impulse response of the filter used on the recording. 
+    pipeline_kwargs : dictionary
+        Extra keyword arguments passed to process_recording.
 
+    Returns
+    -------
+    result : dictionary
+        The result of process_recording plus an error entry, which is an empty string
+        unless the recording failed. 
 
+    '''
+    try:
+        result = process_recording(file_path, fs, impulse_response, **pipeline_kwargs)
+        result['error'] = ''
+    except Exception as error:
+        result = {'beats': np.zeros(0, dtype=int), 'ibi': np.zeros(0), 'hrv': np.nan, 'lf_hf_ratio': np.nan,
+                  'error': f'{type(error).__name__}: {error}'}
+    return result
+
+def run_batch(path, fs, impulse_response, max_workers = None, **pipeline_kwargs):
+    '''
+    Runs process_recording over every .txt recording in a directory using a pool of
+    processes, one per core by default. A recording that fails is kept in the table with
+    its error message and does not stop the rest of the batch, and a worker process that 
+    dies only fails the recordings it leaves unfinished. Scripts calling this 
+    function need an if __name__ == '__main__' guard so the worker processes can start.
+
+    Parameters
+    ----------
+    path : string
+        The directory holding the recordings as text files.
+    fs : integer
+        The sampling frequency of the recordings.
+    impulse_response : 1D array of floats size (n,) where n is the number of samples in the impulse response, or FilterKey
+        The impulse response of the filter used on the recordings. 
+    max_workers : integer, optional
+        The number of worker processes. The default is None, which uses every core.
+    **pipeline_kwargs
+        Extra keyword arguments passed to process_recording.
+
+    Returns
+    -------
+    results : structured array of size (n,) where n is the number of recordings
+        One row per recording, sorted by name, with the fields recording, beats, ibi, 
+        hrv, lf_hf_ratio and error.
+
+    '''
+    # gather the recordings in the directory
+    files = sorted(file for file in os.listdir(path) if file.endswith('.txt'))
+    file_paths = [os.path.join(path, file) for file in files]
+    
+    # make the table with one row per recording, a row keeps no beats until its recording is done
+    results = np.zeros(len(files), dtype = BATCH_RESULT_DTYPE)
+    results['recording'] = [os.path.splitext(file)[0] for file in files]
+    for result_index in range(len(files)):
+        results['beats'][result_index] = np.zeros(0, dtype=int)
+        results['ibi'][result_index] = np.zeros(0)
+    results['hrv'] = np.nan
+    results['lf_hf_ratio'] = np.nan
+    
+    # run the pipeline over the recordings with a pool of processes and fill in each row as it finishes
+    with concurrent.futures.ProcessPoolExecutor(max_workers = max_workers) as executor:
+        futures = {executor.submit(run_recording, file_path, fs, impulse_response, pipeline_kwargs): result_index
+                   for result_index, file_path in enumerate(file_paths)}
+        for future in concurrent.futures.as_completed(futures):
+            result_index = futures[future]
+            try:
+                recording_result = future.result()
+            except Exception as error:
+                # a worker that died (BrokenProcessPool) fails the recordings it leaves unfinished, not the whole batch
+                results['error'][result_index] = f'{type(error).__name__}: {error}'
+                continue
+            for field in ('beats', 'ibi', 'hrv', 'lf_hf_ratio', 'error'):
+                results[field][result_index] = recording_result[field]
+    
+    return results
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark_script
+
+This script times how the main project functions scale with the length of a recording. Synthetic ECG recordings from
+synthetic_ecg_module are made from a few seconds up to 24 hours long, and extract_trials, remove_spikes, filter_data, find_beats,
+hrv and plot_frequency_bands (without plotting) are run on each. The fastest of a few runs is kept for every function and size
+and everything is written to a JSON file along with the git commit and package versions, so the results of two commits can be
+compared. Run it with --max-hours to stop at a shorter recording and --output to pick the results file.
+"""
+#%% import packages
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+import project1_module as p1m
+import Project3_module as p3m
+import synthetic_ecg_module as sem
+
+# recording lengths in seconds and settings of the synthetic recordings
+DURATIONS_SECONDS = [10, 60, 600, 3600, 6 * 3600, 24 * 3600]
+FS = 360
+BEAT_MIX = {'N': 0.9, 'V': 0.1}
+SPIKE_RATE = 0.01
+REPEATS = 3
+
+# filter and thresholds used by the timed functions
+FILTER_KEY = p3m.FilterKey(501, (5, 40), FS, window = 'hann', pass_zero = False)
+SPIKE_THRESHOLD = 5
+BEAT_THRESHOLD = 0.5
+IBI_STEP = 0.1
+
+def time_function(function, *args, **kwargs):
+    '''
+    Runs a function REPEATS times and gives the fastest time.
+
+    Parameters
+    ----------
+    function : function
+        The function to time.
+    *args, **kwargs
+        The arguments the function is called with.
+
+    Returns
+    -------
+    seconds : float
+        The fastest run time in seconds.
+    result : any
+        What the function returned on its last run.
+
+    '''
+    seconds = np.inf
+    for repeat in range(REPEATS):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = min(seconds, time.perf_counter() - start)
+    return seconds, result
+
+def git_commit():
+    '''
+    Gives the commit the benchmark was run on, or None outside of a git repository.
+
+    Returns
+    -------
+    commit : string or None
+        The hash of the commit the script is in.
+
+    '''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = os.path.dirname(os.path.abspath(__file__)), capture_output = True,
+                              text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#%% part 1
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Time the project functions on synthetic recordings of increasing length.')
+    parser.add_argument('--max-hours', type = float, default = 24, help = 'longest recording to time in hours')
+    parser.add_argument('--output', default = 'benchmark_results.json', help = 'file the results are written to')
+    arguments = parser.parse_args()
+
+    impulse_response = p3m.get_impulse_response(FILTER_KEY)
+    results = []
+    for duration_seconds in [duration for duration in DURATIONS_SECONDS if duration <= arguments.max_hours * 3600]:
+        data = sem.generate_ecg(FS, duration_seconds, beat_mix = BEAT_MIX, spike_rate = SPIKE_RATE, seed = 0)
+        signal_voltage = data['ecg_voltage']
+        sample_count = len(signal_voltage)
+
+        # time each function, feeding each one the output of the stage before it like the project scripts do
+        timings = {}
+        trial_starts = data['label_samples'] - FS // 2
+        timings['extract_trials'], trials = time_function(p1m.extract_trials, signal_voltage, trial_starts, FS, edge_policy = 'drop')
+        timings['remove_spikes'], no_spike_data = time_function(p3m.remove_spikes, {'ecg': signal_voltage}, FS, SPIKE_THRESHOLD)
+        timings['filter_data'], filtered_signal = time_function(p3m.filter_data, no_spike_data['ecg'], impulse_response)
+        timings['find_beats'], beats = time_function(p3m.find_beats, filtered_signal, FS, BEAT_THRESHOLD)
+        timings['hrv'], (ibi, signal_hrv) = time_function(p3m.hrv, beats, FS)
+        ibi_interp = np.interp(np.arange(0, sample_count / FS, IBI_STEP), beats[1:] / FS, ibi)
+        timings['plot_frequency_bands'], ratio = time_function(p3m.plot_frequency_bands, ibi_interp, IBI_STEP, [0.04, 0.15],
+                                                                [0.15, 0.4], plot = False)
+
+        # store and report the timings of this size
+        for function_name, seconds in timings.items():
+            results.append({'function': function_name, 'duration_seconds': duration_seconds, 'samples': sample_count,
+                            'seconds': seconds, 'samples_per_second': sample_count / seconds if seconds > 0 else None})
+            print(f'{function_name:>22} {duration_seconds:>7} s of signal: {seconds * 1000:10.2f} ms')
+
+    # write everything needed to compare runs between commits
+    report = {'commit': git_commit(), 'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+              'fs': FS, 'repeats': REPEATS, 'results': results}
+    with open(arguments.output, 'w') as out_file:
+        json.dump(report, out_file, indent = 2)
+    print(f'Results written to {arguments.output}')
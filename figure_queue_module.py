@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+figure_queue_module.py
+
+This module takes the drawing and saving of figures off the path of the computations. Instead of drawing with pyplot, a plotting
+function records its pyplot calls (the data and the styling) in a FigureSpec and submits it to a FigureQueue. The queue draws and
+saves the figures in a pool of separate processes with the non-interactive Agg backend, so the analysis carries on straight away
+and only waits for the images at the end of the run. Specs made in worker processes, which can not reach the queue, are collected
+in a FigureList and submitted by the main process. Scripts using a FigureQueue need an if __name__ == '__main__' guard so the
+worker processes can start.
+"""
+import concurrent.futures
+
+# drawing is a small share of a run, so a couple of workers keep up without taking cores from the computations
+FIGURE_WORKERS = 2
+
+#%% part 1
+class FigureSpec:
+    """
+    Records pyplot calls so the figure can be drawn later, in another process. Any pyplot
+    function can be called on a spec, for example spec.plot(time, signal, c = 'k') or
+    spec.title('ECG'), and is replayed in the same order by draw. The arguments are
+    pickled to reach the worker, so the data of a spec should already be reduced to
+    what is drawn.
+
+    Parameters
+    ----------
+    **figure_kwargs
+        The keyword arguments of plt.figure, for example dpi = 200.
+
+    """
+    def __init__(self, **figure_kwargs):
+        self.figure_kwargs = figure_kwargs
+        self.calls = []
+
+    def __getattr__(self, name):
+        # private names are left to pickle and copy, which look them up before the attributes are set
+        if name.startswith('_'):
+            raise AttributeError(name)
+        def record_call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return record_call
+
+    def draw(self):
+        '''
+        Draws the figure by replaying the recorded calls on a new pyplot figure.
+
+        Returns
+        -------
+        figure : matplotlib Figure
+            The figure drawn.
+
+        '''
+        # import matplotlib only when something is plotted
+        import matplotlib.pyplot as plt
+        figure = plt.figure(**self.figure_kwargs)
+        for name, args, kwargs in self.calls:
+            getattr(plt, name)(*args, **kwargs)
+        return figure
+
+class FigureList(list):
+    """
+    Collects specs instead of drawing them, for plotting functions run in a worker
+    process. It is returned to the main process, which passes it to FigureQueue.submit_all.
+
+    """
+    def submit(self, spec, out_filename, **savefig_kwargs):
+        '''
+        Adds a spec to the list.
+
+        Parameters
+        ----------
+        spec : FigureSpec
+            The figure to save.
+        out_filename : string
+            The file path the figure is saved to.
+        **savefig_kwargs
+            The keyword arguments of plt.savefig.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.append((spec, out_filename, savefig_kwargs))
+
+def render_figure(spec, out_filename, savefig_kwargs = None):
+    '''
+    Draws a spec with the Agg backend, saves it and closes it. This is what the workers of a
+    FigureQueue run.
+
+    Parameters
+    ----------
+    spec : FigureSpec
+        The figure to draw.
+    out_filename : string
+        The file path the figure is saved to.
+    savefig_kwargs : dictionary, optional
+        The keyword arguments of plt.savefig. The default is None.
+
+    Returns
+    -------
+    out_filename : string
+        The file path the figure was saved to.
+
+    '''
+    # draw off screen, the workers have no display and nothing is shown
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    figure = spec.draw()
+    try:
+        figure.savefig(out_filename, **(savefig_kwargs or {}))
+    finally:
+        plt.close(figure)
+    return out_filename
+
+#%% part 2
+class FigureQueue:
+    """
+    Draws and saves figures in a pool of processes while the calling process carries on.
+    The pool is started by the first submit. It can be used as a context manager, which
+    waits for every figure and stops the pool on exit.
+
+    Parameters
+    ----------
+    max_workers : integer, optional
+        The number of worker processes. The default is FIGURE_WORKERS. None uses every core.
+
+    """
+    def __init__(self, max_workers = FIGURE_WORKERS):
+        self.max_workers = max_workers
+        self.executor = None
+        self.futures = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, spec, out_filename, **savefig_kwargs):
+        '''
+        Sends a figure to be drawn and saved in the background.
+
+        Parameters
+        ----------
+        spec : FigureSpec
+            The figure to save.
+        out_filename : string
+            The file path the figure is saved to.
+        **savefig_kwargs
+            The keyword arguments of plt.savefig.
+
+        Returns
+        -------
+        future : Future
+            Gives the file path once the figure is saved, or raises the error of the worker.
+
+        '''
+        if self.executor is None:
+            self.executor = concurrent.futures.ProcessPoolExecutor(max_workers = self.max_workers)
+        future = self.executor.submit(render_figure, spec, out_filename, savefig_kwargs)
+        self.futures[future] = out_filename
+        return future
+
+    def submit_all(self, figure_list):
+        '''
+        Sends every figure of a FigureList to be drawn and saved in the background.
+
+        Parameters
+        ----------
+        figure_list : FigureList
+            The figures collected in a worker process.
+
+        Returns
+        -------
+        futures : list of Futures
+            The future of each figure, in the order of the list.
+
+        '''
+        return [self.submit(spec, out_filename, **savefig_kwargs) for spec, out_filename, savefig_kwargs in figure_list]
+
+    def wait(self):
+        '''
+        Waits for every figure submitted so far to be saved.
+
+        Returns
+        -------
+        failed_figures : dictionary
+            The error message of each figure that could not be saved, by file path.
+
+        '''
+        failed_figures = {}
+        for future in concurrent.futures.as_completed(list(self.futures)):
+            try:
+                future.result()
+            except Exception as error:
+                failed_figures[self.futures[future]] = f'{type(error).__name__}: {error}'
+        self.futures = {}
+        return failed_figures
+
+    def close(self):
+        '''
+        Waits for every figure and stops the worker processes.
+
+        Returns
+        -------
+        failed_figures : dictionary
+            The error message of each figure that could not be saved, by file path.
+
+        '''
+        failed_figures = self.wait()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        return failed_figures
+
+#%% part 3
+def start_figure(figure_queue = None, **figure_kwargs):
+    '''
+    Starts a figure for a plotting function that can either draw straight away or build a spec.
+
+    Parameters
+    ----------
+    figure_queue : FigureQueue or FigureList, optional
+        Where the figure will be submitted. The default is None, which draws with pyplot.
+    **figure_kwargs
+        The keyword arguments of plt.figure, for example dpi = 200.
+
+    Returns
+    -------
+    plotter : pyplot module or FigureSpec
+        The object the pyplot calls of the figure are made on.
+
+    '''
+    if figure_queue is not None:
+        return FigureSpec(**figure_kwargs)
+    # import matplotlib only when something is plotted
+    import matplotlib.pyplot as plt
+    plt.figure(**figure_kwargs)
+    return plt
+
+def save_figure(plotter, out_filename, figure_queue = None, **savefig_kwargs):
+    '''
+    Saves a figure started with start_figure, by submitting its spec to the queue or by
+    saving the current pyplot figure.
+
+    Parameters
+    ----------
+    plotter : pyplot module or FigureSpec
+        The object the pyplot calls of the figure were made on.
+    out_filename : string
+        The file path the figure is saved to.
+    figure_queue : FigureQueue or FigureList, optional
+        Where the spec is submitted. The default is None, which saves the current pyplot figure.
+    **savefig_kwargs
+        The keyword arguments of plt.savefig.
+
+    Returns
+    -------
+    None.
+
+    '''
+    if figure_queue is not None:
+        figure_queue.submit(plotter, out_filename, **savefig_kwargs)
+    else:
+        plotter.savefig(out_filename, **savefig_kwargs)
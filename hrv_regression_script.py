@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+hrv_regression_script
+
+This script checks that batch_hrv_and_band_powers from Project3_module gives exactly the same values as the per recording path
+of calling hrv, interpolating the inter-beat intervals with np.interp and calling plot_frequency_bands without plotting. Random
+beat indices are made for recordings of a few different lengths, including recordings with very few beats, and every heart rate
+variability and LF/HF ratio has to match bit for bit. Each band power is checked directly against the mean of the masked rfft power
+of the interpolated inter-beat intervals, the way plot_frequency_bands computes it. The recordings of equal length are then put in one BandPowerSpectrum and a grid of
+low bands is swept against a grid of high bands, and every LF/HF ratio has to match the masked means of its own recording to
+within rounding. The script exits with an error code if any value differs.
+"""
+#%% import packages
+import sys
+import numpy as np
+import scipy.fft
+import Project3_module as p3m
+
+# settings of the random recordings
+FS = 500
+IBI_STEP = 0.1
+SIGNAL_LENGTHS = [150000, 150000, 180000, 97000, 150000, 2000]
+BANDS = [[0.04, 0.15], [0.15, 0.4], [0.0, 0.04], [0.4, 1.0]]
+SEED = 3000
+
+# low and high band edges of the sweep, the low bands along the first axis and the high bands along the second
+SWEEP_LOW_BANDS = [[[0.0, 0.15]], [[0.04, 0.15]], [[0.05, 0.12]]]
+SWEEP_HIGH_BANDS = [[0.15, 0.4], [0.2, 0.5]]
+# relative error allowed between the running sum of BandPowerSpectrum and summing each band directly
+SWEEP_TOLERANCE = 1e-12
+
+#%% part 1
+if __name__ == '__main__':
+    rng = np.random.default_rng(SEED)
+
+    # random beats spaced 0.6 to 1.2 seconds apart, the last recording only has three beats
+    beat_indices_list = []
+    for signal_length in SIGNAL_LENGTHS:
+        beat_indices = np.cumsum(rng.integers(int(0.6 * FS), int(1.2 * FS), signal_length // int(0.6 * FS)))
+        beat_indices_list.append(beat_indices[beat_indices < signal_length])
+    beat_indices_list[-1] = beat_indices_list[-1][:3]
+
+    results = p3m.batch_hrv_and_band_powers(beat_indices_list, FS, SIGNAL_LENGTHS, IBI_STEP, BANDS)
+
+    is_passing = True
+    interpolated_ibis = []
+    for record_index, beat_indices in enumerate(beat_indices_list):
+        # per recording values the way project3_script computes them
+        ibi, hrv = p3m.hrv(beat_indices, FS)
+        ibi_time = np.arange(0, SIGNAL_LENGTHS[record_index] / FS, IBI_STEP)
+        interpolated_ibi = np.interp(ibi_time, beat_indices[1:] / FS, ibi)
+        interpolated_ibis.append(interpolated_ibi)
+        ratio = p3m.plot_frequency_bands(interpolated_ibi, IBI_STEP, BANDS[0], BANDS[1], plot = False)
+        # plot_frequency_bands only returns the ratio, so the mean power of each band is computed the same way here
+        freq = scipy.fft.rfftfreq(len(interpolated_ibi), IBI_STEP)
+        fft_power = np.abs(scipy.fft.rfft(interpolated_ibi)** 2)
+        band_power = [np.mean(fft_power[(freq >= band[0]) & (freq <= band[1])]) for band in BANDS]
+
+        # compare bit for bit
+        is_record_passing = (np.array_equal(hrv, results['hrv'][record_index]) and
+                             np.array_equal(ratio, results['lf_hf_ratio'][record_index], equal_nan = True) and
+                             np.array_equal(band_power, results['band_power'][record_index], equal_nan = True))
+        is_passing = is_passing and is_record_passing
+        status = 'ok' if is_record_passing else 'FAIL'
+        print(f'recording {record_index}: hrv {results["hrv"][record_index]:.6f} s, LF/HF {results["lf_hf_ratio"][record_index]:.6f} [{status}]')
+
+#%% part 2
+if __name__ == '__main__':
+    # sweep the bands over every recording of the most common length at once
+    sweep_length = max(set(SIGNAL_LENGTHS), key = SIGNAL_LENGTHS.count)
+    sweep_indices = [record_index for record_index, signal_length in enumerate(SIGNAL_LENGTHS) if signal_length == sweep_length]
+    spectrum = p3m.BandPowerSpectrum(np.stack([interpolated_ibis[record_index] for record_index in sweep_indices]), IBI_STEP)
+    sweep_ratios = spectrum.ratio(SWEEP_LOW_BANDS, SWEEP_HIGH_BANDS)
+    
+    # ratio of the masked mean powers for each recording and pair of bands
+    freq = scipy.fft.rfftfreq(len(interpolated_ibis[sweep_indices[0]]), IBI_STEP)
+    expected_ratios = np.zeros((len(sweep_indices), len(SWEEP_LOW_BANDS), len(SWEEP_HIGH_BANDS)))
+    for sweep_index, record_index in enumerate(sweep_indices):
+        fft_power = np.abs(scipy.fft.rfft(interpolated_ibis[record_index])** 2)
+        for low_index, (low_band,) in enumerate(SWEEP_LOW_BANDS):
+            for high_index, high_band in enumerate(SWEEP_HIGH_BANDS):
+                expected_ratios[sweep_index, low_index, high_index] = (np.mean(fft_power[(freq >= low_band[0]) & (freq <= low_band[1])]) /
+                                                                       np.mean(fft_power[(freq >= high_band[0]) & (freq <= high_band[1])]))
+    
+    # compare to within rounding
+    is_sweep_passing = (sweep_ratios.shape == expected_ratios.shape and
+                        np.allclose(sweep_ratios, expected_ratios, rtol = SWEEP_TOLERANCE, atol = 0))
+    is_passing = is_passing and is_sweep_passing
+    status = 'ok' if is_sweep_passing else 'FAIL'
+    print(f'band sweep over {len(sweep_indices)} recordings: ratios shape {sweep_ratios.shape} [{status}]')
+
+    if not is_passing:
+        sys.exit(1)
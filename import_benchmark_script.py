@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+import_benchmark_script
+
+This script checks that the compute-only imports of the project modules stay fast. Each module is imported in a fresh Python
+process a few times and the fastest import time is compared with a time budget. It also checks that importing a module does not
+pull in matplotlib or scipy, which should only be imported once a plotting or scipy backed function is called. The script exits
+with an error code if any module is over budget or imports a heavy package, so it can be used as a check before a batch run.
+"""
+#%% import packages
+import subprocess
+import sys
+import json
+
+# modules to check and the time budget in seconds for importing each of them (numpy included)
+MODULES = ['project1_module', 'Project3_module', 'lab1_module']
+IMPORT_BUDGET_SECONDS = 0.5
+HEAVY_PACKAGES = ['matplotlib', 'scipy']
+REPEATS = 5
+
+# code run in a fresh process to time one import and list the heavy packages it loaded
+TIMING_CODE = '''
+import sys, time, json
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'heavy': [name for name in {heavy} if name in sys.modules]}}))
+'''
+
+#%% part 1
+if __name__ == '__main__':
+    is_passing = True
+    for module in MODULES:
+        # time the import in fresh processes and keep the fastest
+        timings = []
+        for repeat in range(REPEATS):
+            output = subprocess.run([sys.executable, '-c', TIMING_CODE.format(module = module, heavy = HEAVY_PACKAGES)],
+                                    capture_output = True, text = True, check = True).stdout
+            timings.append(json.loads(output))
+        seconds = min(timing['seconds'] for timing in timings)
+        heavy = timings[0]['heavy']
+        
+        # compare with the budget and report
+        is_module_passing = seconds <= IMPORT_BUDGET_SECONDS and len(heavy) == 0
+        is_passing = is_passing and is_module_passing
+        status = 'ok' if is_module_passing else 'FAIL'
+        print(f'{module}: {seconds * 1000:.1f} ms (budget {IMPORT_BUDGET_SECONDS * 1000:.0f} ms), heavy imports: {heavy or "none"} [{status}]')
+    
+    if not is_passing:
+        sys.exit(1)
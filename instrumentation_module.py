@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+instrumentation_module.py
+
+This module times the public functions of project1_module and Project3_module so a slow run can be traced to the stage causing
+it. A PipelineInstrumentation swaps each public function of the modules for a wrapper that records the wall time, the number of
+samples passed in, the samples per second and, optionally, the bytes allocated during the call. Because the functions look each
+other up in their module when called, stages run inside other functions (such as filter_data inside process_recording) are timed
+too. Blocks of a script that are not module functions, like loading a file or saving a figure, can be timed with stage. Nothing
+is wrapped until the instrumentation is enabled and the original functions are put back when it is disabled, so there is no cost
+at all when it is off. Calls made in other processes, like the workers of run_batch, are not recorded.
+"""
+import numpy as np
+import functools
+import importlib
+import inspect
+import json
+import time
+import tracemalloc
+import contextlib
+
+# modules whose public functions are instrumented by default
+INSTRUMENTED_MODULES = ('project1_module', 'Project3_module')
+
+def count_samples(value):
+    '''
+    Counts the samples in an argument of an instrumented function.
+
+    Parameters
+    ----------
+    value : any
+        An array, list or dictionary of signals. Other values, including tuples such as a
+        FilterKey, have no samples.
+
+    Returns
+    -------
+    sample_count : integer
+        The number of samples, summed over the signals of a dictionary.
+
+    '''
+    if isinstance(value, dict):
+        return sum(count_samples(signal) for signal in value.values())
+    if isinstance(value, np.ndarray):
+        return value.size
+    if isinstance(value, list):
+        return len(value)
+    return 0
+
+#%% part 1
+class PipelineInstrumentation:
+    """
+    Records a timing for every call of the public functions of some modules while it is
+    enabled. It can be used as a context manager, which enables it on entry and disables
+    it on exit. Each record has the function name, how deep it was called inside other
+    instrumented calls, the wall time, the samples in its first argument and the samples
+    per second. With track_memory the peak bytes allocated during the call are recorded
+    as well, using tracemalloc, which makes the calls noticeably slower.
+
+    Parameters
+    ----------
+    module_names : list of strings, optional
+        The modules to instrument. The default is INSTRUMENTED_MODULES.
+    track_memory : Boolean, optional
+        If true the bytes allocated in each call are recorded. The default is False.
+
+    """
+    def __init__(self, module_names = INSTRUMENTED_MODULES, track_memory = False):
+        self.module_names = list(module_names)
+        self.track_memory = track_memory
+        self.original_functions = []
+        self.records = []
+        self.call_stack = []
+        self.started_tracemalloc = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+    def enable(self):
+        '''
+        Replaces the public functions of the modules with timed wrappers.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if len(self.original_functions) > 0:
+            return
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        for module_name in self.module_names:
+            module = importlib.import_module(module_name)
+            # only functions defined in the module itself and not starting with an underscore
+            for function_name, function in inspect.getmembers(module, inspect.isfunction):
+                if function.__module__ == module.__name__ and not function_name.startswith('_'):
+                    self.original_functions.append((module, function_name, function))
+                    setattr(module, function_name, self.wrap(function, f'{module_name}.{function_name}'))
+
+    def disable(self):
+        '''
+        Puts the original functions back so they run without any added cost.
+
+        Returns
+        -------
+        None.
+
+        '''
+        for module, function_name, function in self.original_functions:
+            setattr(module, function_name, function)
+        self.original_functions = []
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def reset(self):
+        '''
+        Clears the records so a new run can be measured.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.records = []
+
+    def wrap(self, function, name):
+        '''
+        Makes the timed wrapper of a function.
+
+        Parameters
+        ----------
+        function : function
+            The function to wrap.
+        name : string
+            The name the calls are recorded under.
+
+        Returns
+        -------
+        wrapper : function
+            Calls the function and records a timing of it.
+
+        '''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            sample_count = count_samples(args[0]) if len(args) > 0 else 0
+            with self.stage(name, sample_count):
+                return function(*args, **kwargs)
+        return wrapper
+
+    @contextlib.contextmanager
+    def stage(self, name, sample_count = 0):
+        '''
+        Times a block of code as one call, for example loading a file or saving a figure.
+
+        Parameters
+        ----------
+        name : string
+            The name the block is recorded under.
+        sample_count : integer, optional
+            The number of samples the block works on. The default is 0.
+
+        Yields
+        ------
+        None.
+
+        '''
+        # the peak memory so far belongs to the enclosing call, start a new peak for this one
+        is_tracking = self.track_memory and tracemalloc.is_tracing()
+        frame = {'start_bytes': 0, 'peak_bytes': 0}
+        if is_tracking:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            if len(self.call_stack) > 0:
+                self.call_stack[-1]['peak_bytes'] = max(self.call_stack[-1]['peak_bytes'], peak_bytes)
+            frame['start_bytes'] = current_bytes
+            tracemalloc.reset_peak()
+        depth = len(self.call_stack)
+        self.call_stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.call_stack.pop()
+            record = {'function': name, 'depth': depth, 'seconds': seconds, 'samples': sample_count,
+                      'samples_per_second': sample_count / seconds if sample_count > 0 and seconds > 0 else None}
+            if is_tracking:
+                # pass this call's peak on to the enclosing call
+                peak_bytes = max(frame['peak_bytes'], tracemalloc.get_traced_memory()[1])
+                record['bytes_allocated'] = peak_bytes - frame['start_bytes']
+                if len(self.call_stack) > 0:
+                    self.call_stack[-1]['peak_bytes'] = max(self.call_stack[-1]['peak_bytes'], peak_bytes)
+                tracemalloc.reset_peak()
+            self.records.append(record)
+
+    def summary(self):
+        '''
+        Adds up the records of each function.
+
+        Returns
+        -------
+        summary : dictionary
+            For each function name, the number of calls, the total, mean and longest time in
+            seconds, the total samples, the samples per second over all of the calls and, with
+            track_memory, the largest bytes allocated in one call.
+
+        '''
+        summary = {}
+        for record in self.records:
+            function_summary = summary.setdefault(record['function'], {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'samples': 0})
+            function_summary['calls'] += 1
+            function_summary['total_seconds'] += record['seconds']
+            function_summary['max_seconds'] = max(function_summary['max_seconds'], record['seconds'])
+            function_summary['samples'] += record['samples']
+            if 'bytes_allocated' in record:
+                function_summary['max_bytes_allocated'] = max(function_summary.get('max_bytes_allocated', 0), record['bytes_allocated'])
+        for function_summary in summary.values():
+            function_summary['mean_seconds'] = function_summary['total_seconds'] / function_summary['calls']
+            function_summary['samples_per_second'] = (function_summary['samples'] / function_summary['total_seconds']
+                                                      if function_summary['samples'] > 0 and function_summary['total_seconds'] > 0 else None)
+        return summary
+
+    def to_json(self, out_filename, include_records = False):
+        '''
+        Saves the summary, and optionally every record, to a JSON file.
+
+        Parameters
+        ----------
+        out_filename : string
+            The file path the summary is saved to.
+        include_records : Boolean, optional
+            If true every call is saved as well as the summary. The default is False.
+
+        Returns
+        -------
+        None.
+
+        '''
+        report = {'summary': self.summary()}
+        if include_records:
+            report['records'] = self.records
+        with open(out_filename, 'w') as out_file:
+            json.dump(report, out_file, indent = 2)
@@ -5,36 +5,233 @@ Created on Wed Sep 13 17:03:32 2023
 @author: bentn
 """
 import numpy as np
-import matplotlib.pyplot as plt
-def plot_histogram(features, labels):
+import os
+
+# native type of each column of the maternal health risk data set, text columns are stored as categories
+MATERNAL_HEALTH_DTYPES = {'Age': int, 'SystolicBP': int, 'DiastolicBP': int, 'BS': float, 'BodyTemp': float,
+                          'HeartRate': int, 'RiskLevel': 'U32'}
+
+# risk levels in the order they are numbered by risk_level_codes, and the bins of the age histograms
+RISK_LEVELS = ['high risk', 'mid risk', 'low risk']
+AGE_BINS = np.arange(9.5,68.5, 1)
+
+def load_table(data_path, column_dtypes = MATERNAL_HEALTH_DTYPES, use_cache = True):
+    '''
+    This function loads a CSV file with a header row into one array per column, parsing
+    every column straight to its own type in a single pass over the file. Text columns
+    are stored as categories, an integer code per row plus the sorted list of values. 
+    The columns are saved to a binary cache next to the CSV file (the same name ending 
+    in _columns.npz) which is loaded instead of the CSV as long as the CSV has the same
+    size and modification time as when the cache was written.
+
+    Parameters
+    ----------
+    data_path : string
+        Path of the CSV file.
+    column_dtypes : dictionary, optional
+        The type of each column by header name, columns not in it are read as floats. 
+        The default is MATERNAL_HEALTH_DTYPES.
+    use_cache : Boolean, optional
+        If false the CSV is always parsed and no cache is written. The default is True.
+
+    Returns
+    -------
+    column_headers : list of strings
+        The name of each column.
+    columns : dictionary
+        The array of each column by name, holding the codes of text columns.
+    categories : dictionary
+        The sorted values of each text column by name, categories[name][columns[name]] 
+        gives the text of every row.
+
+    '''
+    cache_path = os.path.splitext(data_path)[0] + '_columns.npz'
+    source_stat = os.stat(data_path)
+    
+    # reuse the cache if the CSV has not changed since it was written
+    if use_cache and os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if int(cache['source_size']) == source_stat.st_size and int(cache['source_mtime_ns']) == source_stat.st_mtime_ns:
+                column_headers = [str(name) for name in cache['column_headers']]
+                columns = {name: cache[f'column_{index}'] for index, name in enumerate(column_headers)}
+                categories = {name: cache[f'categories_{index}'] for index, name in enumerate(column_headers) 
+                              if f'categories_{index}' in cache}
+                return column_headers, columns, categories
+    
+    # read the header, utf-8-sig drops the byte order mark some programs put before the first name
+    with open(data_path, encoding='utf-8-sig') as data_file:
+        column_headers = [name.strip() for name in data_file.readline().split(',')]
+    
+    # parse every row into a record with the type of each column
+    row_dtype = [(f'column_{index}', column_dtypes.get(name, float)) for index, name in enumerate(column_headers)]
+    rows = np.loadtxt(data_path, dtype=row_dtype, delimiter=',', skiprows=1, encoding='utf-8-sig', ndmin=1)
+    
+    # split the records into columns, turning text columns into codes and categories
+    columns = {}
+    categories = {}
+    for index, name in enumerate(column_headers):
+        column = rows[f'column_{index}']
+        if column.dtype.kind == 'U':
+            categories[name], codes = np.unique(column, return_inverse=True)
+            columns[name] = codes.astype(np.min_scalar_type(max(len(categories[name]) - 1, 0)))
+        else:
+            columns[name] = np.ascontiguousarray(column)
+    
+    # write the cache to a temporary file first so a partly written cache is never loaded
+    if use_cache:
+        cache_arrays = {f'column_{index}': columns[name] for index, name in enumerate(column_headers)}
+        cache_arrays.update({f'categories_{index}': categories[name] for index, name in enumerate(column_headers) if name in categories})
+        temporary_path = cache_path + '.tmp.npz'
+        np.savez(temporary_path, column_headers=np.array(column_headers), source_size=source_stat.st_size,
+                 source_mtime_ns=source_stat.st_mtime_ns, **cache_arrays)
+        os.replace(temporary_path, cache_path)
+    return column_headers, columns, categories
+
+def risk_level_codes(labels, categories = None, levels = RISK_LEVELS):
+    '''
+    This function gives the position in levels of every label, comparing each distinct 
+    label with the levels once instead of comparing every row with every level.
+
+    Parameters
+    ----------
+    labels : 1D array of strings, or of integer codes when categories is given
+        The label of each row.
+    categories : 1D array of strings, optional
+        The text of each code in labels, as returned by load_table. The default is None,
+        which means labels holds the text itself.
+    levels : list of strings, optional
+        The groups in the order they are numbered. The default is RISK_LEVELS.
+
+    Returns
+    -------
+    group_codes : 1D array of integers
+        The index in levels of each row's label, -1 for labels not in levels.
+
+    '''
+    if categories is None:
+        categories, labels = np.unique(np.asarray(labels), return_inverse=True)
+    # look up the level of each category, then of each row through its code
+    category_levels = np.array([levels.index(category) if category in levels else -1 for category in categories], dtype=int)
+    return category_levels[np.asarray(labels, dtype=int)].reshape(-1)
+
+def grouped_histogram(features, group_codes, bin_edges, group_count, split_codes = None, split_count = None):
+    '''
+    This function counts the rows of every group in every bin of every feature column, 
+    for every split of the rows, with one np.bincount over a combined key made from the
+    split, group, feature and bin of each value. Bins include their left edge and the 
+    last bin also includes its right edge, like plt.hist, and values outside of the 
+    edges or in a group or split below 0 are not counted.
+
+    Parameters
+    ----------
+    features : 1D array of numbers size (n,) or 2D array size (n, f)
+        The value of each row, or one column per feature.
+    group_codes : 1D array of integers size (n,)
+        The group of each row, from 0 to group_count - 1.
+    bin_edges : 1D array of floats, or list of 1D arrays with one per feature
+        The bin edges shared by all features, or the edges of each feature.
+    group_count : integer
+        The number of groups.
+    split_codes : 1D array of integers size (n,), optional
+        The split of each row, for example 0 for the first half and 1 for the second.
+        The default is None, which counts all rows together.
+    split_count : integer, optional
+        The number of splits. The default is None, which uses the largest split code plus one.
+
+    Returns
+    -------
+    counts : array of integers shape (splits, groups, features, bins)
+        The count of each bin. The splits axis is left out without split_codes and the 
+        features axis is left out when features is 1D. Features with fewer bins than 
+        the others have zero counts in their extra bins.
+
+    '''
+    is_single_feature = np.ndim(features) == 1
+    has_splits = split_codes is not None
+    features = np.asarray(features).reshape(len(features), -1)
+    row_count, feature_count = features.shape
+    if isinstance(bin_edges, np.ndarray) or np.ndim(bin_edges[0]) == 0:
+        bin_edges = [bin_edges] * feature_count
+    if len(bin_edges) != feature_count:
+        raise ValueError('bin_edges must be one array of edges or one array per feature column')
+    bin_count = max(len(edges) - 1 for edges in bin_edges)
+    if not has_splits:
+        split_codes = np.zeros(row_count, dtype=int)
+        split_count = 1
+    elif split_count is None:
+        split_count = int(np.max(split_codes)) + 1 if row_count > 0 else 1
+    
+    # bin of each value, with values on the last edge put in the last bin
+    bin_indices = np.empty((row_count, feature_count), dtype=np.int64)
+    is_counted = np.empty((row_count, feature_count), dtype=bool)
+    for feature_index, edges in enumerate(bin_edges):
+        edges = np.asarray(edges)
+        column_bins = np.searchsorted(edges, features[:, feature_index], side='right') - 1
+        column_bins[features[:, feature_index] == edges[-1]] = len(edges) - 2
+        bin_indices[:, feature_index] = column_bins
+        is_counted[:, feature_index] = (column_bins >= 0) & (column_bins < len(edges) - 1)
+    
+    # combine the split, group, feature and bin into one key and count every key at once
+    row_keys = (np.asarray(split_codes, dtype=np.int64) * group_count + np.asarray(group_codes, dtype=np.int64)) * feature_count
+    is_counted &= ((np.asarray(split_codes) >= 0) & (np.asarray(group_codes) >= 0))[:, np.newaxis]
+    keys = (row_keys[:, np.newaxis] + np.arange(feature_count)) * bin_count + bin_indices
+    counts = np.bincount(keys[is_counted], minlength=split_count * group_count * feature_count * bin_count)
+    counts = counts.reshape(split_count, group_count, feature_count, bin_count)
+    
+    # drop the axes that were not asked for
+    if is_single_feature:
+        counts = counts[:, :, 0, :]
+    if not has_splits:
+        counts = counts[0]
+    return counts
+
+def plot_histogram_counts(group_counts, bin_edges = AGE_BINS):
     '''
-    This function creates a hist
+    This function draws the age histogram of the high and low risk groups from counts
+    that were already found by grouped_histogram.
 
     Parameters
     ----------
-    features : TYPE
-        DESCRIPTION.
-    labels : TYPE
-        DESCRIPTION.
+    group_counts : 2D array of integers shape (groups, bins)
+        The count of each bin for each group of RISK_LEVELS.
+    bin_edges : 1D array of floats, optional
+        The edges of the bins. The default is AGE_BINS.
 
     Returns
     -------
     None.
 
     '''
-    high_risk_patient_mask = labels == 'high risk'
-    mid_risk_patient_mask = labels == 'mid risk'
-    low_risk_patient_mask = labels == 'low risk'
-    high_risk = features[high_risk_patient_mask]
-    mid_risk = features[mid_risk_patient_mask]
-    low_risk = features[low_risk_patient_mask]
-    bins = np.arange(9.5,68.5, 1)
-    plt.hist(high_risk, bins=bins, alpha=.3, color='r', label='High Risk')
-    plt.hist(low_risk, bins=bins, alpha=.3, color='b', label='Low Risk')
+    # import matplotlib only when something is plotted
+    import matplotlib.pyplot as plt
+    bin_widths = np.diff(bin_edges)
+    plt.bar(bin_edges[:-1], group_counts[RISK_LEVELS.index('high risk')], width=bin_widths, align='edge', alpha=.3, color='r', label='High Risk')
+    plt.bar(bin_edges[:-1], group_counts[RISK_LEVELS.index('low risk')], width=bin_widths, align='edge', alpha=.3, color='b', label='Low Risk')
     plt.legend()
     plt.grid()
     plt.xticks(np.arange(10,75,5))
     plt.xlabel('Patient Ages')
     plt.ylabel('Number of Patients')
     plt.title('Age at time of delivery grouped\nby risk level')
-    plt.tight_layout()
\ No newline at end of file
+    plt.tight_layout()
+
+def plot_histogram(features, labels, categories = None):
+    '''
+    This function creates a histogram of the ages of the high and low risk patients.
+
+    Parameters
+    ----------
+    features : 1D array of integers
+        The age of each patient.
+    labels : 1D array of strings, or of integer codes when categories is given
+        The risk level of each patient.
+    categories : 1D array of strings, optional
+        The text of each code in labels, as returned by load_table. The default is None.
+
+    Returns
+    -------
+    None.
+
+    '''
+    group_counts = grouped_histogram(features, risk_level_codes(labels, categories), AGE_BINS, len(RISK_LEVELS))
+    plot_histogram_counts(group_counts, AGE_BINS)
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+precision_check_script
+
+This script checks the accuracy of the reduced precision mode of project1_module and Project3_module against the float64 results.
+A synthetic recording is made with synthetic_ecg_module, saved in 10 bit ADC counts like the Arduino recordings and run through
+process_recording in float64 and in float32 (uint16 counts, float32 cleaning and filtering). The filtered signals, beats, heart
+rate variability and LF/HF ratio are compared, as are the mean and standard deviation trials of compute_mean_and_std_trials with
+float32 trials. The script exits with an error code if any difference is larger than the bound documented in the modules.
+"""
+#%% import packages
+import os
+import sys
+import tempfile
+import numpy as np
+import project1_module as p1m
+import Project3_module as p3m
+import synthetic_ecg_module as sem
+
+# settings of the synthetic recordings, matching the project scripts
+FS_PROJECT3 = 500
+FS_PROJECT1 = 360
+DURATION_SECONDS = 600
+FILTER_KEY = p3m.FilterKey(501, (0.67, 40), FS_PROJECT3, window = 'hann', pass_zero = False)
+OFFSET_VOLTS = 2.5
+
+# the beats are found halfway up the generator's R wave from the baseline of the flipped, filtered recording, which is the ADC
+# offset times the gain of the filter at 0 Hz (with 501 taps the 0.67 Hz cutoff only partly removes the offset)
+R_WAVE_AMPLITUDE = max(wave_amplitude for wave_offset, wave_width, wave_amplitude in sem.BEAT_WAVES['N'])
+BEAT_THRESHOLD = -OFFSET_VOLTS * np.sum(p3m.get_impulse_response(FILTER_KEY)) + 0.5 * R_WAVE_AMPLITUDE
+
+# documented bounds of float32 against float64
+FILTER_RELATIVE_BOUND = 1e-5
+LF_HF_RELATIVE_BOUND = 1e-4
+HRV_RELATIVE_BOUND = 1e-6
+TRIAL_RELATIVE_BOUND = 1024 * 6e-8
+
+#%% part 1
+if __name__ == '__main__':
+    checks = {}
+
+    # Project 3: a recording in ADC counts flipped like the Arduino recordings, with spikes that end up at the top of the ADC range
+    data = sem.generate_ecg(FS_PROJECT3, DURATION_SECONDS, spike_rate = 0.05, spike_amplitude = -3, seed = 3)
+    counts = sem.to_adc_counts(-data['ecg_voltage'], offset_volts = OFFSET_VOLTS, max_count = 1023)
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        file_path = os.path.join(temporary_dir, 'synthetic.txt')
+        np.savetxt(file_path, counts, fmt = '%d')
+        result_64 = p3m.process_recording(file_path, FS_PROJECT3, FILTER_KEY, beat_threshold = BEAT_THRESHOLD)
+        result_32 = p3m.process_recording(file_path, FS_PROJECT3, FILTER_KEY, beat_threshold = BEAT_THRESHOLD, dtype = np.float32)
+
+        # the filtered signals themselves
+        recording_64 = p3m.remove_spikes({'recording': np.loadtxt(file_path)}, FS_PROJECT3, 1000)['recording'] * p3m.VOLTS_PER_COUNT
+        recording_32 = p3m.ScaledSignal(p3m.remove_spikes({'recording': p3m.load_counts(file_path)}, FS_PROJECT3, 1000,
+                                                          dtype = np.float32)['recording'])
+        filtered_64 = p3m.filter_data(recording_64, FILTER_KEY)
+        filtered_32 = p3m.filter_data(recording_32, FILTER_KEY, dtype = np.float32)
+    checks['filtered signal'] = (np.max(np.abs(filtered_32 - filtered_64)) / np.max(np.abs(filtered_64)), FILTER_RELATIVE_BOUND)
+    checks['beats'] = (0.0 if np.array_equal(result_32['beats'], result_64['beats']) else np.inf, 0)
+    checks['hrv'] = (abs(result_32['hrv'] - result_64['hrv']) / result_64['hrv'], HRV_RELATIVE_BOUND)
+    checks['lf/hf ratio'] = (abs(result_32['lf_hf_ratio'] - result_64['lf_hf_ratio']) / result_64['lf_hf_ratio'], LF_HF_RELATIVE_BOUND)
+
+    # Project 1: mean and standard deviation trials from float32 trials
+    data = sem.generate_ecg(FS_PROJECT1, DURATION_SECONDS, beat_mix = {'N': 0.9, 'V': 0.1}, seed = 1)
+    trial_results_64 = p1m.compute_mean_and_std_trials(data['ecg_voltage'], data['label_samples'], data['label_symbols'], 1, FS_PROJECT1)
+    trial_results_32 = p1m.compute_mean_and_std_trials(data['ecg_voltage'], data['label_samples'], data['label_symbols'], 1, FS_PROJECT1,
+                                                       dtype = np.float32)
+    signal_peak = np.max(np.abs(data['ecg_voltage']))
+    checks['mean trials'] = (np.max(np.abs(trial_results_32[2] - trial_results_64[2])) / signal_peak, TRIAL_RELATIVE_BOUND)
+    checks['std trials'] = (np.max(np.abs(trial_results_32[3] - trial_results_64[3])) / signal_peak, TRIAL_RELATIVE_BOUND)
+
+    # report every check against its bound
+    is_passing = True
+    for check_name, (difference, bound) in checks.items():
+        is_check_passing = difference <= bound
+        is_passing = is_passing and is_check_passing
+        print(f'{check_name}: relative difference {difference:.2e} (bound {bound:.0e}) [{"ok" if is_check_passing else "FAIL"}]')
+
+    if not is_passing:
+        sys.exit(1)
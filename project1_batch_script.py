@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+project1_batch_script
+
+This script runs the project1_script averaging over every recording .npz file in the ecg_recordings directory using every core.
+Each subject's recording is loaded, cut into trials around its annotations and averaged per symbol by the run_subjects function,
+and the means and standard deviations are appended to the multi-subject means store as each subject finishes. Figures are left
+off so the run is not slowed down by drawing them, pass make_figures = True to have them drawn and saved for every subject by a
+separate pool of processes while the averaging goes on. The time each subject took and any subjects that failed are reported and
+the report is saved.
+"""
+#%% import packages
+import numpy as np
+import project1_module as p1m
+
+#%% part 1
+if __name__ == '__main__':
+    # define the directory holding the recordings and the length of the trials
+    path = 'ecg_recordings'
+    trial_duration_seconds = 1
+    
+    # average every subject with a pool of processes, storing each one in the means store as it finishes
+    report = p1m.run_subjects(path, trial_duration_seconds = trial_duration_seconds, make_figures = False)
+    
+    # report the time of each subject and any subjects that failed
+    for row in report:
+        if row['error']:
+            print(f"{row['recording']}: failed after {row['seconds']:.2f} s ({row['error']})")
+        else:
+            print(f"{row['recording']}: subject {row['subject_id']}, {row['trial_count']} trials of {row['symbol_count']} symbols in {row['seconds']:.2f} s")
+    print(f"{np.sum(report['error'] == '')} of {len(report)} subjects stored in {p1m.MEANS_STORE_DIR}")
+    
+    # save the report
+    np.save('subject_report.npy', report, allow_pickle = True)
@@ -4,23 +4,140 @@ Ben Wilson, Thomas Bausman
 BME3000
 Project 1
 This file contains functions used in the processing and plotting of ecg data. 
-It contains 6 functions, to load the data, plot the raw data, plot the events,
-extract trials, plot the mean beats and save important data. 
+It contains functions to load the data (and convert .npz files into memory mappable 
+recording directories), index the annotations by symbol, plot the raw data, plot the 
+events, extract trials, compute and plot the mean beats and save important data, 
+with the means of many subjects kept together in one appendable store, and run 
+over a directory of recordings with a pool of processes. The figures of 
+plot_mean_and_std_trials can be sent to a figure_queue_module queue to be drawn 
+and saved in the background. 
 """
 # import modules 
 import numpy as np
-import matplotlib.pyplot as plt
 import random
+import os
+import shutil
+import zipfile
+import time
+import concurrent.futures
+import signal_pyramid_module as pyr
+import figure_queue_module as fqm
+
+# variables of a recording directory that are opened as memory maps by load_data
+RECORDING_MMAP_KEYS = ('ecg_voltage', 'label_samples', 'label_symbols', 'label_codes')
+
+# directory of the multi-subject means store, and the layout of its index and symbol rows
+MEANS_STORE_DIR = 'ecg_means_store'
+MEANS_STORE_INDEX_DTYPE = np.dtype([('subject_id', 'U64'), ('row_start', np.int64), ('row_count', np.int64)])
+MEANS_STORE_SYMBOL_DTYPE = np.dtype('U8')
+
+# one row per recording of a run_subjects report
+SUBJECT_REPORT_DTYPE = np.dtype([('recording', 'U256'), ('subject_id', 'U64'), ('seconds', float), ('symbol_count', int),
+                                 ('trial_count', int), ('error', object)])
+
 # %% Part 1
-def load_data(input_file):
+class AnnotationIndex:
+    """
+    Stores the annotations of a recording in categorical form, as a small integer code per 
+    annotation plus a sorted table of the symbols, and groups the annotation samples by 
+    symbol once. The samples of any symbol then come back as a slice instead of being found
+    by comparing every annotation with the symbol string. 
+
+    Parameters
+    ----------
+    label_samples : ndarray 
+        1D array of integers for the indices that a scorer made a notes at. 
+    label_codes : ndarray
+        1D array of integers the same size as label_samples with the position of each
+        annotation's symbol in symbol_table. 
+    symbol_table : ndarray
+        A sorted 1D array of strings with every annotation symbol. 
+
+    """
+    def __init__(self, label_samples, label_codes, symbol_table):
+        self.label_samples = label_samples
+        self.label_codes = np.asarray(label_codes)
+        self.symbol_table = np.asarray(symbol_table)
+        # sort the samples by symbol, keeping each symbol's samples in time order, and mark where each symbol starts
+        sample_order = np.argsort(self.label_codes, kind='stable')
+        self.grouped_samples = np.asarray(label_samples)[sample_order]
+        self.symbol_offsets = np.concatenate(([0], np.cumsum(np.bincount(self.label_codes, minlength=len(self.symbol_table)))))
+    
+    @classmethod
+    def from_symbols(cls, label_samples, label_symbols):
+        '''
+        Builds the index from the annotation symbol strings. 
+
+        Parameters
+        ----------
+        label_samples : ndarray 
+            1D array of integers for the indices that a scorer made a notes at. 
+        label_symbols : ndarray
+            A 1D array of strings containing the specified labels. 
+
+        Returns
+        -------
+        annotation_index : AnnotationIndex
+            The categorical form of the annotations. 
+
+        '''
+        symbol_table, label_codes = np.unique(label_symbols, return_inverse=True)
+        return cls(label_samples, label_codes.astype(np.min_scalar_type(max(len(symbol_table) - 1, 0))), symbol_table)
+    
+    def samples(self, symbol):
+        '''
+        Gives the samples annotated with one symbol. 
+
+        Parameters
+        ----------
+        symbol : str
+            The annotation symbol. 
+
+        Returns
+        -------
+        symbol_samples : ndarray
+            A 1D array of integers with the annotated samples in time order, empty if the 
+            symbol never appears. 
+
+        '''
+        code = np.searchsorted(self.symbol_table, symbol)
+        if code == len(self.symbol_table) or self.symbol_table[code] != symbol:
+            return self.grouped_samples[:0]
+        return self.grouped_samples[self.symbol_offsets[code]:self.symbol_offsets[code + 1]]
+    
+    def counts(self):
+        '''
+        Gives the number of annotations of every symbol in symbol_table. 
+
+        Returns
+        -------
+        symbol_counts : ndarray
+            A 1D array of integers the same size as symbol_table. 
+
+        '''
+        return np.diff(self.symbol_offsets)
+
+def load_data(input_file, mmap_mode='r', verbose=True, return_index=False):
     '''
-    This function loads data from a .npz file with the path passed as a 
-    parameter. 
+    This function loads data from a recording directory or a .npz file with the 
+    path passed as a parameter. A recording directory holds one uncompressed .npy 
+    file per variable (see convert_npz_to_recording) so the large arrays are 
+    opened as memory maps and only the pages that are sliced get read from disk. 
+    A .npz file is zipped so it can not be memory mapped and is read fully into memory. 
 
     Parameters
     ----------
-    file_name : str 
-        Reltative file path of .npz file storing data. 
+    input_file : str 
+        Relative path of the recording directory or .npz file storing data. 
+    mmap_mode : str or None, optional
+        Memory map mode passed to np.load for the signal and annotation arrays of a 
+        recording directory. None reads them fully into memory. The default is 'r'.
+    verbose : bool, optional
+        If True the names of the variables in the file are printed. The default is True.
+    return_index : bool, optional
+        If True an AnnotationIndex of the annotations is returned as well, read from the 
+        label_codes and symbol_table saved in a recording directory when they are there. 
+        The default is False.
 
     Returns
     -------
@@ -40,13 +157,24 @@ def load_data(input_file):
         taken from. 
     units : ndarray
         contains a string of the units for the ecg voltages. 
+    annotation_index : AnnotationIndex
+        The annotations in categorical form, only returned if return_index is True. 
 
     '''
-    # open data and load file
-    data = np.load(input_file)
-    print('Data in file:')
-    for file in data.files:
-        print(file + ',')
+    # open data and load file, memory mapping the large arrays of a recording directory
+    if os.path.isdir(input_file):
+        file_names = sorted(file[:-len('.npy')] for file in os.listdir(input_file) if file.endswith('.npy'))
+        data = {}
+        for file in file_names:
+            file_mmap_mode = mmap_mode if file in RECORDING_MMAP_KEYS else None
+            data[file] = np.load(os.path.join(input_file, file + '.npy'), mmap_mode=file_mmap_mode)
+    else:
+        data = np.load(input_file)
+        file_names = data.files
+    if verbose:
+        print('Data in file:')
+        for file in file_names:
+            print(file + ',')
     # store data to variables to be returned. 
     ecg_voltage = data['ecg_voltage']
     electrode = data['electrode']
@@ -56,25 +184,103 @@ def load_data(input_file):
     subject_id = data['subject_id']
     units = data['units']
     
-    # return extracted values
-    return ecg_voltage, frequency, labeled_samples_indices, labeled_symbols, subject_id, electrode, units
+    # return extracted values, with the categorical annotations if they were asked for
+    if not return_index:
+        return ecg_voltage, frequency, labeled_samples_indices, labeled_symbols, subject_id, electrode, units
+    if 'label_codes' in data and 'symbol_table' in data:
+        annotation_index = AnnotationIndex(labeled_samples_indices, data['label_codes'], data['symbol_table'])
+    else:
+        annotation_index = AnnotationIndex.from_symbols(labeled_samples_indices, labeled_symbols)
+    return ecg_voltage, frequency, labeled_samples_indices, labeled_symbols, subject_id, electrode, units, annotation_index
+
+def convert_npz_to_recording(input_file, recording_dir=None, overwrite=False):
+    '''
+    One time conversion of a .npz file into a recording directory that load_data 
+    can memory map. Every array in the archive is streamed out to its own uncompressed
+    .npy file so the recording never has to be held in memory during the conversion. 
+    The annotations are also saved in categorical form as label_codes and symbol_table. 
+    The files are written to a temporary directory next to recording_dir that is only 
+    renamed to recording_dir once it is complete, so a conversion that stops part way 
+    never leaves a broken recording behind. 
+
+    Parameters
+    ----------
+    input_file : str
+        Relative file path of .npz file storing data. 
+    recording_dir : str, optional
+        Directory the .npy files are written to. The default is None, which uses the 
+        .npz file path without its extension. 
+    overwrite : bool, optional
+        If False and the recording directory already exists nothing is converted. 
+        The default is False.
+
+    Returns
+    -------
+    recording_dir : str
+        Path of the recording directory to pass to load_data. 
+
+    '''
+    # name the directory after the archive if no name was given
+    if recording_dir is None:
+        recording_dir = os.path.splitext(input_file)[0]
+    if os.path.isdir(recording_dir) and not overwrite:
+        return recording_dir
+    
+    temporary_dir = f'{os.path.normpath(recording_dir)}.{os.getpid()}.tmp'
+    try:
+        # every member of a .npz archive is already a .npy file so copy each one out as it is
+        os.makedirs(temporary_dir)
+        with zipfile.ZipFile(input_file) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as source, open(os.path.join(temporary_dir, os.path.basename(member)), 'wb') as destination:
+                    shutil.copyfileobj(source, destination)
+        
+        # save the integer code of every annotation and the table of symbols the codes point into, reading the
+        # annotations fully so no memory map keeps the files open when the directory is renamed
+        annotation_index = AnnotationIndex.from_symbols(np.load(os.path.join(temporary_dir, 'label_samples.npy')),
+                                                        np.load(os.path.join(temporary_dir, 'label_symbols.npy')))
+        np.save(os.path.join(temporary_dir, 'label_codes.npy'), annotation_index.label_codes)
+        np.save(os.path.join(temporary_dir, 'symbol_table.npy'), annotation_index.symbol_table)
+        
+        # put the complete recording in place of any old one
+        if os.path.isdir(recording_dir):
+            shutil.rmtree(recording_dir)
+        os.replace(temporary_dir, recording_dir)
+    finally:
+        if os.path.isdir(temporary_dir):
+            shutil.rmtree(temporary_dir)
+    
+    return recording_dir
     
 # %% Part 2  
-def plot_raw_data(signal_voltage, signal_time, units= "V", title= ""):
+def plot_raw_data(signal_voltage, fs, units= "V", title= "", visible_range= None, pyramid= None, plotter= None, start_time= 0):
     '''
     Takes the unaltered ecg data and plots it with voltage on the y axis and 
-    time on the x axis. 
+    time on the x axis. If a visible range is given only that range is drawn, 
+    from at most a few thousand points taken from the min/max pyramid of the signal,
+    so no time value is made for the samples that are not drawn. 
 
     Parameters
     ----------
     signal_voltage : ndarray
         1D array containing floats of voltages for every sample time.
-    signal_time : ndarray 
-        A 1D array of floats that has been scaled to seconds instead of index values. 
+    fs : int
+        The frequency in Hz for sample rate as an integer.
     units : str, optional
         A string for the units of the y axis. The default is "V".
     title : str, optional
         A string to be the title of the plot. The default is "".
+    visible_range : tuple, optional
+        The (start, stop) time in seconds to draw and zoom in on. The default is None, 
+        which draws every sample.
+    pyramid : dict, optional
+        The min/max pyramid of signal_voltage from signal_pyramid_module.get_minmax_pyramid. 
+        The default is None, which reduces the visible samples directly.
+    plotter : FigureSpec, optional
+        A spec from figure_queue_module the plot is recorded in instead of being drawn. 
+        The default is None, which draws in figure 1.
+    start_time : float, optional
+        The time in seconds of the first sample. The default is 0.
 
     Returns
     -------
@@ -82,17 +288,27 @@ def plot_raw_data(signal_voltage, signal_time, units= "V", title= ""):
 
     '''
     # create figure and plot data 
-    plt.figure(1, dpi=200, clear=True)
-    plt.plot(signal_time, signal_voltage, c='k', label='Signal')
+    if plotter is None:
+        # import matplotlib only when something is plotted
+        import matplotlib.pyplot as plt
+        plt.figure(1, dpi=200, clear=True)
+        plotter = plt
+    if visible_range is None:
+        plotter.plot(np.arange(len(signal_voltage)) / fs + start_time, signal_voltage, c='k', label='Signal')
+    else:
+        # draw the visible range from the pyramid, with times measured from the first sample
+        plot_time, plot_voltage = pyr.minmax_plot_points(signal_voltage, fs, (visible_range[0] - start_time, visible_range[1] - start_time), pyramid)
+        plotter.plot(plot_time + start_time, plot_voltage, c='k', label='Signal')
+        plotter.xlim(visible_range)
     
     # annotate plot 
-    plt.title(title)
-    plt.xlabel('time (s)')
-    plt.ylabel(units)
-    plt.tight_layout()
+    plotter.title(title)
+    plotter.xlabel('time (s)')
+    plotter.ylabel(units)
+    plotter.tight_layout()
 
 # %% Part 3
-def plot_events(label_samples, label_symbols, signal_time, signal_voltage):
+def plot_events(label_samples, label_symbols, fs, signal_voltage, annotation_index=None, plotter=None, start_time=0):
     '''
     This function plots a dot at the location that was annotated by the expert scorer.  
 
@@ -102,32 +318,71 @@ def plot_events(label_samples, label_symbols, signal_time, signal_voltage):
         1D array of integers for the indices that a scorer made a notes at. 
     label_symbols : ndarray
         A 1D array of strings containing the specified labels. 
-    signal_time : ndarray
-        An array that goes up to the time in seconds of the recording with 
-        steps of 1/frequency
+    fs : int
+        The frequency in Hz for sample rate as an integer.
     signal_voltage : ndarray
         A 1D array of floats for the voltage values at each timepoint. 
+    annotation_index : AnnotationIndex, optional
+        The annotations in categorical form from load_data. The default is None, which 
+        builds it from label_samples and label_symbols.
+    plotter : FigureSpec, optional
+        A spec from figure_queue_module the events are recorded in instead of being drawn. 
+        The default is None, which draws on the current figure.
+    start_time : float, optional
+        The time in seconds of the first sample. The default is 0.
 
     Returns
     -------
     None.
 
     '''
-    # extract the different types of labels
-    annotation_types = np.unique(label_symbols)
+    if plotter is None:
+        # import matplotlib only when something is plotted
+        import matplotlib.pyplot as plt
+        plotter = plt
+    # group the labels by type
+    if annotation_index is None:
+        annotation_index = AnnotationIndex.from_symbols(label_samples, label_symbols)
     
     # Iterate through different annotation types and plot them on an existing plot of raw data 
-    for label in annotation_types:
-        # creates boolean mask 
-        is_label = label_symbols == label
-        plt.scatter(signal_time[label_samples[is_label]], signal_voltage[label_samples[is_label]], label= label)
-    plt.legend(loc='lower right')
+    for label in annotation_index.symbol_table:
+        label_type_samples = annotation_index.samples(label)
+        plotter.scatter(label_type_samples / fs + start_time, signal_voltage[label_type_samples], label= label)
+    plotter.legend(loc='lower right')
     
 # %% Part 4
-def extract_trials(signal_voltage, trial_start_samples, trial_sample_count):
+def is_trial_in_signal(trial_start_samples, trial_sample_count, signal_length):
+    '''
+    Finds the trials kept by the original pipeline, which leaves out a clip that starts
+    at the first sample or ends at the last sample of the signal as well as the clips that
+    run off either end. Callers that have to give the same means and standard deviations
+    as before filter the start samples with this rather than relying on the 'drop' edge 
+    policy of extract_trials, which keeps those two clips. 
+
+    Parameters
+    ----------
+    trial_start_samples : ndarray
+        A 1D array of integers that provide the starting index for each clip. 
+    trial_sample_count : int
+        A single value defining the number of values per clip. 
+    signal_length : int
+        The number of samples in the signal. 
+
+    Returns
+    -------
+    is_in_signal : ndarray
+        A 1D array of booleans, True for the clips the original pipeline keeps. 
+
+    '''
+    trial_start_samples = np.asarray(trial_start_samples).reshape(-1)
+    return np.logical_and(trial_start_samples > 0, (trial_start_samples + int(trial_sample_count)) < signal_length)
+
+def extract_trials(signal_voltage, trial_start_samples, trial_sample_count, edge_policy='error', fill_value=np.nan, copy=False, out=None, dtype=None):
     '''
     This function makes a 2D array with each row containing a 1 second clip 
-    from around a heart beat annotation. 
+    from around a heart beat annotation. The clips are cut out of a strided
+    sliding window view of the signal so no python loop over the trials is 
+    needed. 
 
     Parameters
     ----------
@@ -138,6 +393,24 @@ def extract_trials(signal_voltage, trial_start_samples, trial_sample_count):
     trial_sample_count : int
         A single value defining the number of values per clip typically the 
         sampling frequency times the time in seconds of the clip. 
+    edge_policy : str, optional
+        What to do with clips that run off either end of the signal. 'error' raises
+        a ValueError, 'drop' leaves those clips out and 'pad' keeps them and fills 
+        the missing samples with fill_value. A clip that starts at the first sample 
+        or ends at the last sample fits, so unlike the original pipeline 'drop' keeps 
+        it; filter the start samples with is_trial_in_signal for the original rule. 
+        The default is 'error'.
+    fill_value : float, optional
+        Value used for the missing samples when edge_policy is 'pad'. The default is np.nan.
+    copy : bool, optional
+        If True a new writeable array is always returned. If False the result is 
+        read-only and is a true view of signal_voltage whenever the start samples are
+        evenly spaced. The default is False.
+    out : ndarray, optional
+        A caller supplied (m x n) array the clips are written into. The default is None.
+    dtype : numpy dtype, optional
+        The type of the trials, for example np.float32 to copy float64 clips into half the 
+        memory. The default is None, which keeps the signal's type.
 
     Returns
     -------
@@ -145,23 +418,287 @@ def extract_trials(signal_voltage, trial_start_samples, trial_sample_count):
         A 2D array containing m samples of n measurements. (m x n array)
 
     '''
-    # create properly sized array 
-    trials = np.zeros((len(trial_start_samples), trial_sample_count))
+    # check the edge policy before doing any work
+    if edge_policy not in ('error', 'drop', 'pad'):
+        raise ValueError(f"edge_policy must be 'error', 'drop' or 'pad', not {edge_policy!r}")
+    
+    trial_sample_count = int(trial_sample_count)
+    trial_start_samples = np.asarray(trial_start_samples, dtype=np.intp).reshape(-1)
+    signal_length = len(signal_voltage)
+    
+    # find the clips that fit entirely inside the signal
+    is_in_range = (trial_start_samples >= 0) & (trial_start_samples + trial_sample_count <= signal_length)
+    if edge_policy == 'error' and not np.all(is_in_range):
+        raise ValueError(f'{np.count_nonzero(~is_in_range)} trials run off the ends of the signal')
+    if edge_policy == 'drop':
+        trial_start_samples = trial_start_samples[is_in_range]
+        is_in_range = np.ones(len(trial_start_samples), dtype=bool)
+    
+    # every possible window of the signal as a read-only view, one row per start sample
+    if signal_length >= trial_sample_count:
+        windows = np.lib.stride_tricks.sliding_window_view(signal_voltage, trial_sample_count)
+    else:
+        windows = np.empty((0, trial_sample_count), dtype=np.asarray(signal_voltage[:0]).dtype)
+    
+    # clips in another type than the signal have to be copied
+    is_same_dtype = dtype is None or np.dtype(dtype) == windows.dtype
+    
+    # evenly spaced clips can be described by strides alone so no samples are copied
+    if out is None and not copy and is_same_dtype and np.all(is_in_range) and len(trial_start_samples) > 1:
+        start_steps = np.diff(trial_start_samples)
+        if start_steps[0] > 0 and np.all(start_steps == start_steps[0]):
+            return np.lib.stride_tricks.as_strided(windows[trial_start_samples[0]:],
+                                                   shape=(len(trial_start_samples), trial_sample_count),
+                                                   strides=(windows.strides[0] * start_steps[0], windows.strides[1]),
+                                                   writeable=False)
     
-    # Iterates through trial start values and cuts out windows assigning each trial to a row
-    for trials_index, trial in enumerate(trial_start_samples):
-        trials[trials_index, :] = signal_voltage[trial: (trial + trial_sample_count)]
-    # returns trial arrays 
+    trial_shape = (len(trial_start_samples), trial_sample_count)
+    if out is None and is_same_dtype and np.all(is_in_range):
+        # every clip fits so gather them all straight out of the window view
+        trials = windows[trial_start_samples]
+    else:
+        # create properly sized array or check the one that was passed in
+        if out is None and dtype is not None:
+            trials = np.empty(trial_shape, dtype=dtype)
+        elif out is None:
+            trials = np.empty(trial_shape, dtype=np.result_type(windows.dtype, np.asarray(fill_value).dtype))
+        elif out.shape != trial_shape:
+            raise ValueError(f'out has shape {out.shape} but the trials need shape {trial_shape}')
+        else:
+            trials = out
+        
+        # copy the clips that fit a block of rows at a time so no full size temporary array is made
+        in_range_rows = np.flatnonzero(is_in_range)
+        for block_start in range(0, len(in_range_rows), 4096):
+            block_rows = in_range_rows[block_start:(block_start + 4096)]
+            trials[block_rows] = windows[trial_start_samples[block_rows]]
+        
+        # build the clips that hang off the ends from their sample indices and pad the missing values
+        if not np.all(is_in_range):
+            edge_indices = trial_start_samples[~is_in_range, np.newaxis] + np.arange(trial_sample_count)
+            is_valid_sample = (edge_indices >= 0) & (edge_indices < signal_length)
+            edge_trials = np.full(edge_indices.shape, fill_value, dtype=trials.dtype)
+            edge_trials[is_valid_sample] = signal_voltage[edge_indices[is_valid_sample]]
+            trials[~is_in_range] = edge_trials
+    
+    # hand back read-only trials unless a writeable copy or buffer was asked for
+    if out is None and not copy:
+        trials.flags.writeable = False
     return trials
   
 
 # %% Part 5  
-def plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, units= "V", title= ""):
+class TrialAccumulator:
+    """
+    Keeps a running count, mean and sum of squared differences from the mean for the 
+    trials of every annotation symbol, so the mean and standard deviation trials can be
+    found without holding all of the trials in memory. Trials are added in batches and 
+    combined with the pairwise update of Chan et al., which also merges the partial 
+    results of accumulators that saw different chunks of a recording or different workers.
+
+    Parameters
+    ----------
+    trial_sample_count : int
+        The number of samples in every trial. 
+    dtype : numpy dtype, optional
+        The float type each batch of trials is reduced in. The running values are always 
+        kept in float64, so with np.float32 only the sums within a batch are rounded to 
+        float32, keeping the mean and standard deviation within about batch size times 
+        6e-8 of the float64 values relative to the largest sample. The default is float.
+
+    """
+    def __init__(self, trial_sample_count, dtype=float):
+        self.trial_sample_count = int(trial_sample_count)
+        self.dtype = np.dtype(dtype)
+        # symbol -> [count, mean trial, sum of squared differences from the mean trial]
+        self.statistics = {}
+    
+    def add(self, symbol, trials):
+        '''
+        Adds a batch of trials of one annotation symbol. 
+
+        Parameters
+        ----------
+        symbol : str
+            The annotation symbol the trials belong to. 
+        trials : ndarray
+            A 2D array of m trials of trial_sample_count samples. (m x n array)
+
+        Returns
+        -------
+        None.
+
+        '''
+        trials = np.asarray(trials, dtype=self.dtype).reshape(-1, self.trial_sample_count)
+        batch_count = len(trials)
+        if batch_count == 0:
+            self.merge_statistics(symbol, 0, np.zeros(self.trial_sample_count), np.zeros(self.trial_sample_count))
+            return
+        # reduce the batch on its own then fold it into the running values
+        batch_mean = np.average(trials, axis=0)
+        batch_m2 = np.sum((trials - batch_mean) ** 2, axis=0)
+        self.merge_statistics(symbol, batch_count, batch_mean.astype(float), batch_m2.astype(float))
+    
+    def merge(self, other):
+        '''
+        Adds the trials seen by another accumulator to this one. 
+
+        Parameters
+        ----------
+        other : TrialAccumulator
+            An accumulator with the same trial_sample_count. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        if other.trial_sample_count != self.trial_sample_count:
+            raise ValueError(f'cannot merge trials of {other.trial_sample_count} samples into trials of {self.trial_sample_count} samples')
+        for symbol, (count, mean, m2) in other.statistics.items():
+            self.merge_statistics(symbol, count, mean, m2)
+    
+    def merge_statistics(self, symbol, count, mean, m2):
+        '''
+        Combines the count, mean and sum of squared differences of a group of trials with 
+        the running values of their symbol. 
+
+        Parameters
+        ----------
+        symbol : str
+            The annotation symbol the trials belong to. 
+        count : int
+            The number of trials in the group. 
+        mean : ndarray
+            The mean trial of the group. 
+        m2 : ndarray
+            The sum of squared differences from the mean trial of the group. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        symbol = str(symbol)
+        if symbol not in self.statistics:
+            self.statistics[symbol] = [0, np.zeros(self.trial_sample_count), np.zeros(self.trial_sample_count)]
+        running = self.statistics[symbol]
+        total_count = running[0] + count
+        if count == 0:
+            return
+        # shift the mean towards the group and add the spread between the two means
+        delta = mean - running[1]
+        running[1] = running[1] + delta * (count / total_count)
+        running[2] = running[2] + m2 + delta ** 2 * (running[0] * count / total_count)
+        running[0] = total_count
+    
+    def results(self):
+        '''
+        Gives the mean and standard deviation trial of every symbol seen so far. 
+
+        Returns
+        -------
+        symbols : ndarray 
+            The annotation symbols in sorted order. 
+        mean_trial_signal : ndarray
+            A 2D array with the mean signal clip in the rows for each type of symbol, nan for
+            symbols without trials. 
+        std_trial_signal : ndarray
+            A 2D array with the standard deviation of the clips in the rows for each type of symbol. 
+        trial_counts : ndarray
+            A 1D array of integers with the number of clips for each type of symbol. 
+
+        '''
+        symbols = np.array(sorted(self.statistics))
+        mean_trial_signal = np.full((len(symbols), self.trial_sample_count), np.nan)
+        std_trial_signal = np.full((len(symbols), self.trial_sample_count), np.nan)
+        trial_counts = np.zeros(len(symbols), dtype=int)
+        for symbol_index, symbol in enumerate(symbols):
+            count, mean, m2 = self.statistics[symbol]
+            trial_counts[symbol_index] = count
+            if count > 0:
+                mean_trial_signal[symbol_index, :] = mean
+                std_trial_signal[symbol_index, :] = np.sqrt(m2 / count)
+        return symbols, mean_trial_signal, std_trial_signal, trial_counts
+
+def compute_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, batch_size=1024, annotation_index=None,
+                                dtype=None):
+    '''
+    Computes the mean and standard deviation signal of the trials around every type of 
+    annotation without plotting anything. Trials that would run off either end of the
+    signal, or that start at its first sample or end at its last, are left out as 
+    is_trial_in_signal describes, which gives the same trials as the original pipeline. The trials are extracted and added to a TrialAccumulator a batch
+    at a time so the full matrix of trials is never held in memory. 
+
+    Parameters
+    ----------
+    signal_voltage : ndarray
+        A 1D array of floats for the voltage values at each timepoint.
+    label_samples : ndarray 
+        1D array of integers for the indices that a scorer made a notes at. 
+    label_symbols : ndarray
+        A 1D array of strings containing the specified labels. 
+    trial_duration_seconds : int
+        Desired time in seconds that each clip will be cut to. 
+    fs : int
+        The frequency in Hz for sample rate as an integer.
+    batch_size : int, optional
+        The number of annotations whose trials are extracted at once. The default is 1024.
+    annotation_index : AnnotationIndex, optional
+        The annotations in categorical form from load_data. The default is None, which 
+        builds it from label_samples and label_symbols.
+    dtype : numpy dtype, optional
+        The float type the trials are extracted and averaged in, see TrialAccumulator for
+        the accuracy of np.float32. The default is None, which extracts the trials in the 
+        signal's type and averages them in float64.
+
+    Returns
+    -------
+    symbols : ndarray 
+        List of the different annotation markers that appeared in the data set. 
+    trial_time : ndarray 
+        A 1D array of length trial_duration_seconds times fs with step size fs. 
+    mean_trial_signal : ndarray
+        A 2D array with the mean signal clip in the rows for each type of symbol. 
+    std_trial_signal : ndarray
+        A 2D array with the standard deviation of the clips in the rows for each type of symbol. 
+    trial_counts : ndarray
+        A 1D array of integers with the number of clips averaged for each type of symbol. 
+
+    '''
+    if annotation_index is None:
+        annotation_index = AnnotationIndex.from_symbols(label_samples, label_symbols)
+    
+    trial_time = np.arange(0, trial_duration_seconds, 1/fs)
+    
+    trial_sample_count = int(trial_duration_seconds * fs)
+    
+    shift_from_annotation = int((trial_sample_count) / 2)
+    
+    # extract the trials of each annotation type a batch at a time and fold them into running means and stds 
+    accumulator = TrialAccumulator(trial_sample_count, float if dtype is None else dtype)
+    for annotation in annotation_index.symbol_table:
+        annotated_indices = annotation_index.samples(annotation) - shift_from_annotation
+        annotated_indices = annotated_indices[is_trial_in_signal(annotated_indices, trial_sample_count, len(signal_voltage))]
+        accumulator.add(annotation, np.zeros((0, trial_sample_count)))
+        for batch_start in range(0, len(annotated_indices), batch_size):
+            trials = extract_trials(signal_voltage, annotated_indices[batch_start:(batch_start + batch_size)], trial_sample_count, dtype=dtype)
+            accumulator.add(annotation, trials)
+    
+    symbols, mean_trial_signal, std_trial_signal, trial_counts = accumulator.results()
+    return symbols, trial_time, mean_trial_signal, std_trial_signal, trial_counts
+
+def plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, units= "V", title= "",
+                             subject_id= "", electrode= "", zoom_range= None, pyramid= None, annotation_index= None, figure_dir= "", figure_queue= None,
+                             trial_results= None):
     '''
     Wrapper function that compiles all previous functions except for the load data function. 
     Creates a raw data plot, adds even annotation markers, zooms in on example segment, extracts
     trials for all kinds of annotations and then calculates the average signal for each type of annotation.
     Eventually creates a plot of mean signal with standard deviation around it for all annotation types. 
+    The calculations are done by compute_mean_and_std_trials, which can be called on its own
+    when no figures are needed. With a figure_queue the figures are only recorded as specs 
+    and submitted, so the function returns without waiting for them to be drawn and saved. 
 
     Parameters
     ----------
@@ -179,6 +716,27 @@ def plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial
         A string for the units of the y axis. The default is "V".
     title : TYPE, optional
         A string to be the title of the plot. The default is "".
+    subject_id : str, optional
+        The subject ID used in the titles and file names of the saved figures. The default is "".
+    electrode : str, optional
+        The electrode used in the title of the random example figure. The default is "".
+    zoom_range : tuple, optional
+        The (start, stop) time in seconds of the zoomed in window. The default is None, 
+        which zooms in on the first 2.6 seconds.
+    pyramid : dict, optional
+        The min/max pyramid of signal_voltage used to draw the raw data plots. The default is None.
+    annotation_index : AnnotationIndex, optional
+        The annotations in categorical form from load_data. The default is None, which 
+        builds it from label_samples and label_symbols.
+    figure_dir : str, optional
+        The directory the figures are saved in. The default is "", the working directory.
+    figure_queue : FigureQueue or FigureList, optional
+        The queue from figure_queue_module the figures are submitted to. The default is None, 
+        which draws and saves them with pyplot before returning.
+    trial_results : tuple, optional
+        What compute_mean_and_std_trials returned for these arguments, so a caller that 
+        already has the means does not compute them twice. The default is None, which 
+        computes them.
 
     Returns
     -------
@@ -190,65 +748,69 @@ def plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial
         A 2D array with the mean signal clip in the rows for each type of symbol. 
 
     '''
-    time = np.arange(0, len(signal_voltage) / fs, 1/fs)
-    adapted_title = 'Raw ' + title
-    plot_raw_data(signal_voltage, time, units, adapted_title)
-    plt.savefig(f'Unprocessed ECG Signal Subject e0103.png')
-    plt.title('Zoomed In Section of Raw ' + title)
-    plot_events(label_samples, label_symbols, time, signal_voltage)
-    plt.xlim((1909.5, 1912.1))
-    plt.tight_layout()
-    plt.savefig(f'Zoomed In Window ECG Signal Subject e0103.png')
-    annotation_types = np.unique(label_symbols)
-    
-    annotations_grouped = {}
+    if annotation_index is None:
+        annotation_index = AnnotationIndex.from_symbols(label_samples, label_symbols)
+    if trial_results is None:
+        trial_results = compute_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, annotation_index=annotation_index)
+    symbols, trial_time, mean_trial_signal, std_trial_signal, trial_counts = trial_results
+    if zoom_range is None:
+        zoom_range = (0, 2.6)
     
-    time_clips = np.arange(0, trial_duration_seconds, 1/fs)
+    adapted_title = 'Raw ' + title
+    # each figure is drawn with pyplot, or recorded as a spec and submitted when there is a figure queue
+    plotter = fqm.start_figure(figure_queue, num=1, dpi=200, clear=True)
+    plot_raw_data(signal_voltage, fs, units, adapted_title, visible_range= (0, len(signal_voltage) / fs), pyramid= pyramid, plotter= plotter)
+    fqm.save_figure(plotter, os.path.join(figure_dir, f'Unprocessed ECG Signal Subject {subject_id}.png'), figure_queue)
+    plotter = fqm.start_figure(figure_queue, num=1, dpi=200, clear=True)
+    plot_raw_data(signal_voltage, fs, units, 'Zoomed In Section of Raw ' + title, visible_range= zoom_range, pyramid= pyramid, plotter= plotter)
+    plot_events(label_samples, label_symbols, fs, signal_voltage, annotation_index, plotter= plotter)
+    plotter.xlim(zoom_range)
+    plotter.tight_layout()
+    fqm.save_figure(plotter, os.path.join(figure_dir, f'Zoomed In Window ECG Signal Subject {subject_id}.png'), figure_queue)
     
-    trial_sample_count = trial_duration_seconds * fs
+    trial_sample_count = len(trial_time)
     
     shift_from_annotation = int((trial_sample_count) / 2)
     
-    plt.figure(dpi=200)
-    for annotation in annotation_types:
-        is_annotation = label_symbols == annotation
-        annotated_indices = label_samples[is_annotation] - shift_from_annotation
-        is_in_range = np.logical_and(annotated_indices > 0, (annotated_indices + trial_sample_count) < len(signal_voltage))
-        annotations_grouped[f'{annotation}'] = extract_trials(signal_voltage, annotated_indices[is_in_range], trial_sample_count)
+    plotter = fqm.start_figure(figure_queue, dpi=200)
+    for symbol_index, annotation in enumerate(symbols):
+        if trial_counts[symbol_index] == 0:
+            continue
+        # pick one random annotation of this type and cut out only its trial
+        annotated_indices = annotation_index.samples(annotation) - shift_from_annotation
+        annotated_indices = annotated_indices[is_trial_in_signal(annotated_indices, trial_sample_count, len(signal_voltage))]
+        example_trial = extract_trials(signal_voltage, annotated_indices[random.randrange(len(annotated_indices))], trial_sample_count)[0]
         
-        plt.plot(time_clips, annotations_grouped[f'{annotation}'][random.randint(0, len(annotations_grouped[f'{annotation}'])),:], label= annotation)
-        plt.title(f'Sample Heart Beats from all Annotation Types\n Subject e0103, Electrode V4')
-        plt.xlabel('time (s)')
-        plt.ylabel(units)
-        plt.grid()
-        plt.legend()
-        plt.tight_layout()  
-    plt.savefig(f'Random Example of ECG Heart Beats Subject e0103.png')
-    
-    mean_trial_signal = np.zeros((len(annotation_types), (trial_duration_seconds * fs)))
-    plt.figure(dpi=200)
-    for annotation_index, annotation in enumerate(annotation_types):
-        column_avg = np.average(annotations_grouped[f'{annotation}'], axis=0)
-        mean_trial_signal[annotation_index, :] = column_avg
-        column_std = np.std(annotations_grouped[f'{annotation}'], axis=0)
-        plt.plot(time_clips, column_avg, label= f'{annotation}')
-        plt.fill_between(time_clips, column_avg-column_std, column_avg+column_std, label= f'STD of {annotation}', alpha=.4)
-        plt.title('Mean ' + title)
-        plt.xlabel('time (s)')
-        plt.ylabel(units)
-        plt.grid()
-        plt.tight_layout()
-        plt.legend()
-    
-    plt.savefig(f'Mean ECG Heart Beats Subject e0103.png')
-    symbols = annotation_types
-    trial_time = time_clips
+        plotter.plot(trial_time, example_trial, label= annotation)
+        plotter.title(f'Sample Heart Beats from all Annotation Types\n Subject {subject_id}, Electrode {electrode}')
+        plotter.xlabel('time (s)')
+        plotter.ylabel(units)
+        plotter.grid()
+        plotter.legend()
+        plotter.tight_layout()  
+    fqm.save_figure(plotter, os.path.join(figure_dir, f'Random Example of ECG Heart Beats Subject {subject_id}.png'), figure_queue)
+    
+    plotter = fqm.start_figure(figure_queue, dpi=200)
+    for symbol_index, annotation in enumerate(symbols):
+        column_avg = mean_trial_signal[symbol_index, :]
+        column_std = std_trial_signal[symbol_index, :]
+        plotter.plot(trial_time, column_avg, label= f'{annotation}')
+        plotter.fill_between(trial_time, column_avg-column_std, column_avg+column_std, label= f'STD of {annotation}', alpha=.4)
+        plotter.title('Mean ' + title)
+        plotter.xlabel('time (s)')
+        plotter.ylabel(units)
+        plotter.grid()
+        plotter.tight_layout()
+        plotter.legend()
+    
+    fqm.save_figure(plotter, os.path.join(figure_dir, f'Mean ECG Heart Beats Subject {subject_id}.png'), figure_queue)
     return symbols, trial_time, mean_trial_signal
        
 # %% Part 6
-def save_means(symbols, trial_time, mean_trial_signal, out_filename='ecg_means.npz'):
+def save_means(symbols, trial_time, mean_trial_signal, out_filename='ecg_means.npz', symbol_table=None):
     """
-    Function to save data from the pipeline. 
+    Function to save data from the pipeline. The symbols are also saved in categorical
+    form, as the position of each row's symbol in a symbol table. 
 
     Parameters
     ----------
@@ -260,14 +822,382 @@ def save_means(symbols, trial_time, mean_trial_signal, out_filename='ecg_means.n
         Array of mean signal from each annotation type. 
     out_filename : str, optional
         String for the file name to which all data will be saved. The default is 'ecg_means.npz'.
+    symbol_table : ndarray, optional
+        Sorted array of strings the symbol codes point into, such as the symbol_table of the
+        recording's AnnotationIndex. The default is None, which uses the sorted symbols.
 
     Returns
     -------
     None.
 
     """
+    # find the code of each row's symbol
+    if symbol_table is None:
+        symbol_table = np.unique(symbols)
+    symbol_table = np.asarray(symbol_table)
+    symbol_codes = np.searchsorted(symbol_table, symbols).astype(np.min_scalar_type(max(len(symbol_table) - 1, 0)))
+    
     # save files
-    np.savez(out_filename, symbols= symbols, trial_time= trial_time, mean_trial_signal= mean_trial_signal)
+    np.savez(out_filename, symbols= symbols, trial_time= trial_time, mean_trial_signal= mean_trial_signal,
+             symbol_table= symbol_table, symbol_codes= symbol_codes)
+
+class MeansStore:
+    """
+    Keeps the mean and standard deviation trials of many subjects in one directory. 
+    Each row holds one symbol of one subject, and the rows are appended to flat binary
+    files (means, stds, counts and symbols) so adding a subject never rewrites the 
+    subjects before it. A small index gives the first row and number of rows of every
+    subject, and the rows are read through memory maps so only the rows that are used 
+    are loaded. Rows written by an append that did not finish are not in the index and
+    are cut off by the next append.
+
+    Parameters
+    ----------
+    store_dir : str, optional
+        The directory of the store, made by the first append. The default is MEANS_STORE_DIR.
+
+    """
+    def __init__(self, store_dir=MEANS_STORE_DIR):
+        self.store_dir = store_dir
+        index_file = os.path.join(store_dir, 'index.npy')
+        if os.path.exists(index_file):
+            self.index = np.load(index_file)
+            self.trial_time = np.load(os.path.join(store_dir, 'trial_time.npy'))
+        else:
+            self.index = np.zeros(0, dtype=MEANS_STORE_INDEX_DTYPE)
+            self.trial_time = None
+        self.subject_rows = {str(subject_id): position for position, subject_id in enumerate(self.index['subject_id'])}
+    
+    def row_count(self):
+        '''
+        Gives the number of rows of all subjects in the store. 
+
+        Returns
+        -------
+        row_count : int
+            The number of rows. 
+
+        '''
+        return int(self.index['row_start'][-1] + self.index['row_count'][-1]) if len(self.index) > 0 else 0
+    
+    def subject_ids(self):
+        '''
+        Gives the subjects in the order they were appended. 
+
+        Returns
+        -------
+        subject_ids : ndarray
+            A 1D array of strings with the ID of every subject. 
+
+        '''
+        return self.index['subject_id'].copy()
+    
+    def read_rows(self, name, dtype, row_shape=()):
+        '''
+        Opens one of the row files as a read-only memory map. 
+
+        Parameters
+        ----------
+        name : str
+            The name of the file without its extension. 
+        dtype : numpy dtype
+            The type of the values in the file. 
+        row_shape : tuple, optional
+            The shape of each row. The default is (), one value per row.
+
+        Returns
+        -------
+        rows : ndarray
+            The rows of every subject in the index. 
+
+        '''
+        row_count = self.row_count()
+        if row_count == 0:
+            return np.zeros((0,) + row_shape, dtype=dtype)
+        return np.memmap(os.path.join(self.store_dir, name + '.dat'), dtype=dtype, mode='r', shape=(row_count,) + row_shape)
+    
+    def append(self, subject_id, symbols, trial_time, mean_trial_signal, std_trial_signal, trial_counts):
+        '''
+        Adds the results of one subject to the end of the store. 
+
+        Parameters
+        ----------
+        subject_id : str
+            The ID of the subject, which must not already be in the store. 
+        symbols : ndarray
+            Array of strings that stores annotation markings.
+        trial_time : ndarray
+            1D array of time values for each sample in the extracted trials, the same for every subject.
+        mean_trial_signal : ndarray
+            A 2D array with the mean signal clip in the rows for each type of symbol. 
+        std_trial_signal : ndarray
+            A 2D array with the standard deviation of the clips in the rows for each type of symbol. 
+        trial_counts : ndarray
+            A 1D array of integers with the number of clips averaged for each type of symbol. 
+
+        Returns
+        -------
+        None.
+
+        '''
+        subject_id = str(subject_id)
+        if subject_id in self.subject_rows:
+            raise ValueError(f'subject {subject_id!r} is already in the store')
+        trial_time = np.asarray(trial_time, dtype=float)
+        if self.trial_time is not None and not np.array_equal(trial_time, self.trial_time):
+            raise ValueError('trial_time must be the same for every subject in the store')
+        trial_sample_count = len(trial_time)
+        mean_trial_signal = np.asarray(mean_trial_signal, dtype=float).reshape(-1, trial_sample_count)
+        std_trial_signal = np.asarray(std_trial_signal, dtype=float).reshape(-1, trial_sample_count)
+        
+        # the first append sets the trial time of the store
+        os.makedirs(self.store_dir, exist_ok=True)
+        if self.trial_time is None:
+            np.save(os.path.join(self.store_dir, 'trial_time.npy'), trial_time)
+            self.trial_time = trial_time
+        
+        # add the rows to the end of each file, cutting off any rows of an append that did not finish
+        row_start = self.row_count()
+        new_rows = {'symbols': np.asarray(symbols, dtype=MEANS_STORE_SYMBOL_DTYPE), 'counts': np.asarray(trial_counts, dtype=np.int64),
+                    'means': mean_trial_signal, 'stds': std_trial_signal}
+        for name, rows in new_rows.items():
+            with open(os.path.join(self.store_dir, name + '.dat'), 'ab') as row_file:
+                row_file.truncate(row_start * rows.itemsize * int(np.prod(rows.shape[1:])))
+                row_file.write(np.ascontiguousarray(rows).tobytes())
+        
+        # the subject is only part of the store once the new index replaces the old one
+        new_entry = np.array([(subject_id, row_start, len(mean_trial_signal))], dtype=MEANS_STORE_INDEX_DTYPE)
+        index = np.concatenate([self.index, new_entry])
+        temporary_file = os.path.join(self.store_dir, f'index.{os.getpid()}.tmp.npy')
+        np.save(temporary_file, index)
+        os.replace(temporary_file, os.path.join(self.store_dir, 'index.npy'))
+        self.index = index
+        self.subject_rows[subject_id] = len(index) - 1
+    
+    def subject(self, subject_id):
+        '''
+        Reads the results of one subject. 
+
+        Parameters
+        ----------
+        subject_id : str
+            The ID of the subject. 
+
+        Returns
+        -------
+        symbols : ndarray 
+            The annotation symbols of the subject. 
+        trial_time : ndarray 
+            1D array of time values for each sample in the trials. 
+        mean_trial_signal : ndarray
+            A 2D array with the mean signal clip in the rows for each type of symbol, read from a memory map. 
+        std_trial_signal : ndarray
+            A 2D array with the standard deviation of the clips in the rows for each type of symbol, read from a memory map. 
+        trial_counts : ndarray
+            A 1D array of integers with the number of clips averaged for each type of symbol. 
+
+        '''
+        subject_id = str(subject_id)
+        if subject_id not in self.subject_rows:
+            raise KeyError(f'subject {subject_id!r} is not in the store')
+        entry = self.index[self.subject_rows[subject_id]]
+        rows = slice(int(entry['row_start']), int(entry['row_start'] + entry['row_count']))
+        trial_sample_count = len(self.trial_time)
+        return (np.array(self.read_rows('symbols', MEANS_STORE_SYMBOL_DTYPE)[rows]), self.trial_time,
+                self.read_rows('means', float, (trial_sample_count,))[rows], self.read_rows('stds', float, (trial_sample_count,))[rows],
+                np.array(self.read_rows('counts', np.int64)[rows]))
+    
+    def cohort_mean(self, symbol, block_size=4096):
+        '''
+        Combines the rows of one symbol from every subject into the mean and standard 
+        deviation trial of all of their trials together, weighting each subject by its 
+        number of trials. The rows are read from the memory maps a block at a time. 
+
+        Parameters
+        ----------
+        symbol : str
+            The annotation symbol. 
+        block_size : int, optional
+            The number of rows read at a time. The default is 4096.
+
+        Returns
+        -------
+        mean_trial_signal : ndarray
+            1D array with the mean trial of the symbol over all subjects, nan without trials. 
+        std_trial_signal : ndarray
+            1D array with the standard deviation of all of the trials of the symbol. 
+        trial_count : int
+            The number of trials of the symbol over all subjects. 
+        subject_count : int
+            The number of subjects with trials of the symbol. 
+
+        '''
+        trial_sample_count = 0 if self.trial_time is None else len(self.trial_time)
+        row_counts = np.asarray(self.read_rows('counts', np.int64))
+        symbol_rows = np.flatnonzero((np.asarray(self.read_rows('symbols', MEANS_STORE_SYMBOL_DTYPE)) == symbol) & (row_counts > 0))
+        trial_count = int(np.sum(row_counts[symbol_rows]))
+        if trial_count == 0:
+            return np.full(trial_sample_count, np.nan), np.full(trial_sample_count, np.nan), 0, 0
+        means = self.read_rows('means', float, (trial_sample_count,))
+        stds = self.read_rows('stds', float, (trial_sample_count,))
+        
+        # first pass, the count weighted mean of the subject means
+        weighted_sum = np.zeros(trial_sample_count)
+        for block_start in range(0, len(symbol_rows), block_size):
+            block_rows = symbol_rows[block_start:(block_start + block_size)]
+            weighted_sum += row_counts[block_rows] @ means[block_rows]
+        mean_trial_signal = weighted_sum / trial_count
+        
+        # second pass, the spread within each subject plus the spread of the subject means around the cohort mean
+        squared_sum = np.zeros(trial_sample_count)
+        for block_start in range(0, len(symbol_rows), block_size):
+            block_rows = symbol_rows[block_start:(block_start + block_size)]
+            squared_sum += row_counts[block_rows] @ (stds[block_rows] ** 2 + (means[block_rows] - mean_trial_signal) ** 2)
+        std_trial_signal = np.sqrt(squared_sum / trial_count)
+        return mean_trial_signal, std_trial_signal, trial_count, len(symbol_rows)
+
+# %% Part 7
+def process_subject(input_file, trial_duration_seconds=1, make_figures=False, figure_dir=''):
+    '''
+    Runs the loading, trial extraction and averaging of project1_script on one recording. 
+    The figures are only made when make_figures is True, and then only recorded as specs 
+    from figure_queue_module, since drawing them takes much longer than the averaging. 
+
+    Parameters
+    ----------
+    input_file : str
+        Path of the recording .npz file or recording directory. 
+    trial_duration_seconds : int, optional
+        Desired time in seconds that each clip will be cut to. The default is 1.
+    make_figures : bool, optional
+        If True the figures of plot_mean_and_std_trials are saved for the subject. The default is False.
+    figure_dir : str, optional
+        The directory the figures are saved in. The default is '', the working directory.
+
+    Returns
+    -------
+    result : dict
+        The subject_id, symbols, trial_time, mean_trial_signal, std_trial_signal and 
+        trial_counts of the subject, and its figures as a FigureList for a FigureQueue. 
+
+    '''
+    signal_voltage, fs, label_samples, label_symbols, subject_id, electrode, units, annotation_index = load_data(input_file, verbose=False, return_index=True)
+    fs = int(fs)
+    trial_results = compute_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, annotation_index=annotation_index)
+    symbols, trial_time, mean_trial_signal, std_trial_signal, trial_counts = trial_results
+    
+    # collect the figures, made from the same means, to be drawn by the figure queue of the main process
+    figures = fqm.FigureList()
+    if make_figures:
+        title = f"ECG Signals from Subject {subject_id}, Electrode {electrode}"
+        plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, units=str(units), title=title,
+                                 subject_id=subject_id, electrode=electrode, annotation_index=annotation_index, figure_dir=figure_dir,
+                                 figure_queue=figures, trial_results=trial_results)
+    return {'subject_id': str(subject_id), 'symbols': symbols, 'trial_time': trial_time, 'mean_trial_signal': mean_trial_signal,
+            'std_trial_signal': std_trial_signal, 'trial_counts': trial_counts, 'figures': figures}
+
+def run_subject(input_file, subject_kwargs):
+    '''
+    Runs process_subject on one recording for run_subjects, timing it and catching any
+    error so a bad recording gives an error message instead of stopping the others. 
+
+    Parameters
+    ----------
+    input_file : str
+        Path of the recording .npz file or recording directory. 
+    subject_kwargs : dict
+        Keyword arguments passed to process_subject. 
+
+    Returns
+    -------
+    result : dict
+        The result of process_subject plus the seconds it took and an error entry, which 
+        is an empty string unless the recording failed. 
+
+    '''
+    start = time.perf_counter()
+    try:
+        result = process_subject(input_file, **subject_kwargs)
+        result['error'] = ''
+    except Exception as error:
+        result = {'subject_id': '', 'error': f'{type(error).__name__}: {error}'}
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+def run_subjects(path, store_dir=MEANS_STORE_DIR, max_workers=None, figure_workers=fqm.FIGURE_WORKERS, **subject_kwargs):
+    '''
+    Runs process_subject over every .npz recording in a directory using a pool of 
+    processes, one per core by default. Each subject's results are appended to a 
+    MeansStore as soon as its worker finishes, so nothing is lost if the run stops part
+    way and the results never all have to be held in memory. A subject that fails, or 
+    is already in the store, is reported with its error and does not stop the others.
+    With make_figures=True the figures of each subject are drawn and saved by a separate
+    FigureQueue while the averaging goes on, and are waited for at the end. 
+    Scripts calling this function need an if __name__ == '__main__' guard so the worker
+    processes can start. 
+
+    Parameters
+    ----------
+    path : str
+        The directory holding the recording .npz files. 
+    store_dir : str, optional
+        The directory of the MeansStore the results are appended to. The default is MEANS_STORE_DIR.
+    max_workers : int, optional
+        The number of worker processes. The default is None, which uses every core.
+    figure_workers : int, optional
+        The number of processes drawing figures. The default is fqm.FIGURE_WORKERS, a small pool 
+        so the figures do not compete with the computations for the cores.
+    **subject_kwargs
+        Extra keyword arguments passed to process_subject, such as make_figures=True. 
+
+    Returns
+    -------
+    report : ndarray
+        A structured array with one row per recording, sorted by name, with the fields 
+        recording, subject_id, seconds, symbol_count, trial_count and error, which includes
+        any figure that could not be saved. 
+
+    '''
+    # gather the recordings in the directory
+    files = sorted(file for file in os.listdir(path) if file.endswith('.npz'))
+    report = np.zeros(len(files), dtype=SUBJECT_REPORT_DTYPE)
+    report['recording'] = [os.path.splitext(file)[0] for file in files]
+    report['error'] = ''
+    means_store = MeansStore(store_dir)
+    figure_futures = []
+    
+    # run the subjects with a pool of processes and store each one as it finishes
+    with fqm.FigureQueue(figure_workers) as figure_queue, concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_subject, os.path.join(path, file), subject_kwargs): file_index for file_index, file in enumerate(files)}
+        for future in concurrent.futures.as_completed(futures):
+            file_index = futures[future]
+            try:
+                result = future.result()
+            except Exception as error:
+                # a worker that died (BrokenProcessPool) fails the subjects it leaves unfinished, not the whole run
+                report['error'][file_index] = f'{type(error).__name__}: {error}'
+                continue
+            report['subject_id'][file_index] = result['subject_id']
+            report['seconds'][file_index] = result['seconds']
+            report['error'][file_index] = result['error']
+            if result['error']:
+                continue
+            figure_futures += [(file_index, figure_future) for figure_future in figure_queue.submit_all(result['figures'])]
+            try:
+                means_store.append(result['subject_id'], result['symbols'], result['trial_time'], result['mean_trial_signal'],
+                                   result['std_trial_signal'], result['trial_counts'])
+                report['symbol_count'][file_index] = len(result['symbols'])
+                report['trial_count'][file_index] = np.sum(result['trial_counts'])
+            except ValueError as error:
+                report['error'][file_index] = f'{type(error).__name__}: {error}'
+        
+        # wait for the figures only once every subject is stored
+        for file_index, figure_future in figure_futures:
+            try:
+                figure_future.result()
+            except Exception as error:
+                report['error'][file_index] += f'{"; " if report["error"][file_index] else ""}figure {type(error).__name__}: {error}'
+    return report
     
 
 
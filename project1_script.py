@@ -7,93 +7,134 @@ The script runs through the processing and plotting of an ECG data recording of
 has been annotated by a professional and the end goal is to plot the mean heart beat for all annotation 
 types. The code below starts by loading data before plotting it unporcessed. Then the annotation events 
 are plotted ontop. Next clips of 1 second are extracted around each annotation which are then averaged
-and the means are plotted with the standard deviations. Finally all processed data and images are saved.
+and the means are plotted with the standard deviations. Finally all processed data and images are saved. The figures 
+are saved in the background by a FigureQueue from figure_queue_module while the processing carries on.
 """
 #%% Part 1
 # importing all modules used
 import numpy as np 
-import matplotlib.pyplot as plt
 import project1_module as funct
+import signal_pyramid_module as pyr
+import result_cache_module as rcm
+import figure_queue_module as fqm
 import random
+import os
 
-# loading the data using the load data function from the project module
-file = 'ecg_e0103_half1.npz'
-signal_voltage, fs, label_samples, label_symbols, subject_id, electrode, units = funct.load_data(file)
+# the figures are saved by worker processes, which import this script again, so everything runs under a main guard
+if __name__ == '__main__':
+    # keep the results of the compute functions on disk so re-running the script after a plotting change is fast
+    result_cache = rcm.ResultCache()
+    result_cache.enable()
 
-# create the scaled time array in seconds with step of 1/fs
-time = np.arange(0, len(signal_voltage) / fs, 1/fs)
+    # save the figures in the background while the processing carries on
+    figure_queue = fqm.FigureQueue()
+
+    # convert the .npz file into a memory mappable recording directory (only done the first time)
+    # and load the data using the load data function from the project module
+    file = 'ecg_e0103_half1.npz'
+    recording_dir = funct.convert_npz_to_recording(file)
+    signal_voltage, fs, label_samples, label_symbols, subject_id, electrode, units, annotation_index = funct.load_data(recording_dir, return_index= True)
+
+    # load the min/max pyramid of the signal cached in the recording directory (built the first time)
+    pyramid = pyr.get_minmax_pyramid(signal_voltage, os.path.join(recording_dir, 'ecg_voltage_pyramid.npz'))
 
 # %% Part 2
-title = f"ECG Raw Signal from subject {subject_id}, electrode {electrode}"
+if __name__ == '__main__':
+    title = f"ECG Raw Signal from subject {subject_id}, electrode {electrode}"
 
-# plot raw signal using function from module
-funct.plot_raw_data(signal_voltage, time, title= title, units= units)
+    # plot raw signal using function from module
+    plotter = fqm.start_figure(figure_queue, num=1, dpi=200, clear=True)
+    funct.plot_raw_data(signal_voltage, fs, title= title, units= units, visible_range= (0, len(signal_voltage) / fs), pyramid= pyramid, plotter= plotter)
+    fqm.save_figure(plotter, f'Raw ECG Signal Subject {subject_id}.png', figure_queue)
 
 # %% Part 3 
-# overlay the annotations on the existing plot and zoom in to a specific location
-funct.plot_events(label_samples, label_symbols, time, signal_voltage)
-plt.xlim((1909.5, 1912.1))
-print()
+if __name__ == '__main__':
+    # zoom in to a specific location and overlay the annotations on the plot
+    plotter = fqm.start_figure(figure_queue, num=1, dpi=200, clear=True)
+    funct.plot_raw_data(signal_voltage, fs, title= title, units= units, visible_range= (1909.5, 1912.1), pyramid= pyramid, plotter= plotter)
+    funct.plot_events(label_samples, label_symbols, fs, signal_voltage, annotation_index, plotter= plotter)
+    plotter.xlim((1909.5, 1912.1))
+    fqm.save_figure(plotter, f'Annotated ECG Section Subject {subject_id}.png', figure_queue)
+    print()
 
 # %% Part 4
-# Isolate out the normal annotations, remove edge cases and create a 2D array using function from module
-is_normal = label_symbols == 'N'
-normal_annotated_indices = label_samples[is_normal] - int(fs/2)
-is_normal_in_range = np.logical_and(normal_annotated_indices > 0, (normal_annotated_indices + fs) < len(signal_voltage))
-n_count = np.count_nonzero(is_normal_in_range)
-normal_trials = funct.extract_trials(signal_voltage, normal_annotated_indices[is_normal_in_range], fs)
-
-# Isolate out the abnormal annotations, remove edge cases and create a 2D array using function from module
-is_abnormal = label_symbols == 'V'
-v_count = np.count_nonzero(is_abnormal)
-abnormal_annotated_indices = label_samples[is_abnormal] - int(fs/2)
-is_abnormal_in_range = np.logical_and(abnormal_annotated_indices > 0, (abnormal_annotated_indices + fs) < len(signal_voltage))
-abnormal_trials = funct.extract_trials(signal_voltage, abnormal_annotated_indices[is_abnormal_in_range], fs)
-
-# verify that all the trial arrays are the right shape and have been filled with values 
-if np.shape(normal_trials) == (n_count, fs):
-    print(f'Normal instance array is correct size ({n_count},{fs})')
-if np.shape(normal_trials) == (n_count, fs):
-    print(f'Abnormal instance array is correct size ({v_count},{fs})')
-# the array was initially created and filled with zeros which is why ensuring there are non zero values
-if np.count_nonzero(normal_trials) > 0:
-    print('The normal array has values')
-if np.count_nonzero(abnormal_trials) > 0:
-    print('The abnormal array has values')
-
-# create time array for trials
-time_clips = np.arange(0, 1, 1/fs)
-
-# create new figure and plot random samples from the trial arrays
-plt.figure(3, dpi=200, clear=True)
-plt.plot(time_clips, normal_trials[random.randint(0, len(normal_trials)),:], label= 'Sample Normal Heart Beat')
-plt.plot(time_clips, abnormal_trials[random.randint(0, len(abnormal_trials)),:], label= 'Sample Abnormal Heart Beat')
-
-# annotate plot
-plt.title(f'A Random Sample of Normal and Abnormal Heart Beat from Subject {subject_id}')
-plt.xlabel('time (s)')
-plt.ylabel(f'{units}')
-plt.grid()
-plt.legend()
-plt.tight_layout()
+if __name__ == '__main__':
+    # Isolate out the normal annotations and create a 2D array using function from module, dropping edge cases
+    normal_annotated_indices = annotation_index.samples('N') - int(fs/2)
+    normal_annotated_indices = normal_annotated_indices[funct.is_trial_in_signal(normal_annotated_indices, fs, len(signal_voltage))]
+    normal_trials = funct.extract_trials(signal_voltage, normal_annotated_indices, fs)
+    n_count = len(normal_trials)
+
+    # Isolate out the abnormal annotations and create a 2D array using function from module, dropping edge cases
+    abnormal_annotated_indices = annotation_index.samples('V') - int(fs/2)
+    abnormal_annotated_indices = abnormal_annotated_indices[funct.is_trial_in_signal(abnormal_annotated_indices, fs, len(signal_voltage))]
+    abnormal_trials = funct.extract_trials(signal_voltage, abnormal_annotated_indices, fs)
+    v_count = len(abnormal_trials)
+
+    # verify that all the trial arrays are the right shape and have been filled with values 
+    if np.shape(normal_trials) == (n_count, fs):
+        print(f'Normal instance array is correct size ({n_count},{fs})')
+    if np.shape(abnormal_trials) == (v_count, fs):
+        print(f'Abnormal instance array is correct size ({v_count},{fs})')
+    # ensure the clips were actually cut out of the signal and hold non zero values
+    if np.count_nonzero(normal_trials) > 0:
+        print('The normal array has values')
+    if np.count_nonzero(abnormal_trials) > 0:
+        print('The abnormal array has values')
+
+    # create time array for trials
+    time_clips = np.arange(0, 1, 1/fs)
+
+    # create new figure and plot random samples from the trial arrays
+    plotter = fqm.start_figure(figure_queue, num=3, dpi=200, clear=True)
+    plotter.plot(time_clips, normal_trials[random.randint(0, len(normal_trials) - 1),:], label= 'Sample Normal Heart Beat')
+    plotter.plot(time_clips, abnormal_trials[random.randint(0, len(abnormal_trials) - 1),:], label= 'Sample Abnormal Heart Beat')
+
+    # annotate plot
+    plotter.title(f'A Random Sample of Normal and Abnormal Heart Beat from Subject {subject_id}')
+    plotter.xlabel('time (s)')
+    plotter.ylabel(f'{units}')
+    plotter.grid()
+    plotter.legend()
+    plotter.tight_layout()
+    fqm.save_figure(plotter, f'Sample Normal and Abnormal Heart Beats Subject {subject_id}.png', figure_queue)
 
 # %% Part 5 
-# define trial duration and call general wrapper function to execute all previous functions except load data 
-# and calculate and plot the mean signals. 
-trial_duration_seconds = 1
-title = f"ECG Signals from Subject {subject_id}, Electrode {electrode}"
-symbols, clip_time, average_array = funct.plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, units= units, title= title)
+if __name__ == '__main__':
+    # define trial duration and call general wrapper function to execute all previous functions except load data 
+    # and calculate and plot the mean signals. 
+    trial_duration_seconds = 1
+    title = f"ECG Signals from Subject {subject_id}, Electrode {electrode}"
+    symbols, clip_time, average_array = funct.plot_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs, units= units, title= title,
+                                                                        subject_id= subject_id, electrode= electrode, zoom_range= (1909.5, 1912.1), pyramid= pyramid,
+                                                                        annotation_index= annotation_index, figure_queue= figure_queue)
 
 # %% Part 6
-# save all the new data and reload to ensure the data stored properly. 
-out_filename = f'ecg_means_{subject_id}.npz'
-funct.save_means(symbols, clip_time, average_array, out_filename)
-reloaded_data = np.load(out_filename)
-
-# check that all values are the same
-if np.array_equal(reloaded_data['symbols'], symbols):
-    print('Symbols: success')
-if np.array_equal(reloaded_data['trial_time'],clip_time):
-    print('Trial time: success')
-if np.array_equal(reloaded_data['mean_trial_signal'], average_array):
-    print('Mean signals: success')
\ No newline at end of file
+if __name__ == '__main__':
+    # append the means and standard deviations of this subject to the multi-subject store (the same call that
+    # plot_mean_and_std_trials made, so it comes from the result cache) and read them back to ensure they stored properly
+    symbols, clip_time, average_array, std_array, trial_counts = funct.compute_mean_and_std_trials(signal_voltage, label_samples, label_symbols, trial_duration_seconds, fs,
+                                                                                                   annotation_index= annotation_index)
+    means_store = funct.MeansStore()
+    if subject_id not in means_store.subject_ids():
+        means_store.append(subject_id, symbols, clip_time, average_array, std_array, trial_counts)
+    reloaded_symbols, reloaded_time, reloaded_means, reloaded_stds, reloaded_counts = means_store.subject(subject_id)
+
+    # check that all values are the same
+    if np.array_equal(reloaded_symbols, symbols):
+        print('Symbols: success')
+    if np.array_equal(reloaded_time, clip_time):
+        print('Trial time: success')
+    if np.array_equal(reloaded_means, average_array, equal_nan= True):
+        print('Mean signals: success')
+
+    # mean normal beat over every subject in the store
+    cohort_mean, cohort_std, cohort_trial_count, cohort_subject_count = means_store.cohort_mean('N')
+    print(f'Cohort mean normal beat from {cohort_trial_count} beats of {cohort_subject_count} subjects')
+
+# %% Part 7
+if __name__ == '__main__':
+    # wait for the figures to be saved and report any that failed
+    failed_figures = figure_queue.close()
+    for out_filename, error in failed_figures.items():
+        print(f'{out_filename} could not be saved: {error}')
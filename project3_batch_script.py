@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+project3_batch_script
+
+This script runs the project3_script pipeline over every recording in the recorded_data directory using every core. The key of the
+same band-pass filter as project3_script is passed with the directory to the run_batch function, which removes the spikes,
+filters each recording, finds the beats and computes the IBI, HRV and LF/HF ratio without plotting anything. The results come back
+as one table with a row per recording. Recordings that could not be processed are reported with their error and the table is saved.
+"""
+#%% import packages
+import numpy as np
+import Project3_module as p3m
+
+#%% part 1
+if __name__ == '__main__':
+    # define the sampling rate and the directory holding the recordings
+    fs = 500
+    path = 'recorded_data'
+    
+    # key of the same band-pass filter as project3_script, each worker takes it from the filter cache
+    filter_key = p3m.FilterKey(501, (0.67, 40), fs, window = 'hann', pass_zero = False)
+    
+    # run the pipeline over every recording with a pool of processes
+    results = p3m.run_batch(path, fs, filter_key)
+    
+    # report the results and any recordings that failed
+    for result in results:
+        if result['error']:
+            print(f"{result['recording']}: failed ({result['error']})")
+        else:
+            print(f"{result['recording']}: {len(result['beats'])} beats, HRV = {result['hrv']:.4f} s, LF/HF = {result['lf_hf_ratio']:.3f}")
+    
+    # save the results table
+    np.save('batch_results.npy', results, allow_pickle = True)
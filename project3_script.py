@@ -13,278 +13,294 @@ signals are plotted to show the difference between the raw and filtered data. Th
 where the heart beats are the find_beats function is called and the beats are plotted over the filtered signals. Using the beat indices the hrv function is 
 called to determine the heart rate variability and inter beat intervals for all of the filtered ecg signals. The HRVs are plotted on a bar graph and the IBIs
 are interpolated with a sampling ratae of 0.1. The interpolated IBIs are passed to the plot_frequency_bands function and the frequency domains with
-low and high-frequency bands are plotted, while the LF/HF ratios are returned. The ratios are then plotted onto a bar graph. All figures are saved. 
+low and high-frequency bands are plotted, while the LF/HF ratios are returned. The ratios are then plotted onto a bar graph. All figures are saved in the background by a FigureQueue 
+from figure_queue_module, so the script only waits for them at the end. 
 """
 #%% import packages
 import numpy as np
-from matplotlib import pyplot as plt
-from scipy import fft
-from scipy import signal
 import os
-import project3_module as p3m
+import Project3_module as p3m
+import result_cache_module as rcm
+import figure_queue_module as fqm
 
-#%% part 1
-
-# define the sampling rate
-fs = 500
-
-# specify file location where data is stored and gather list of file names
-path = 'recorded_data'
-files = os.listdir(path)
-
-# make an empty dictionary for data
-data = {}
-
-# load data in from every data file in the specified folder and place it in the data dictionary.
-for file in files:
-    if '.txt' in file:
-        dictionary = {file.strip('.txt'): np.loadtxt(f'{path}/{file}')}
-        data = data | dictionary
-        
-# remove the spikes seen in the data collected 
-no_spike_data = p3m.remove_spikes(data, fs, 1000)
-
-# Create reference variables for each individual recording and convert the y values to volts
-relaxing_sitting = no_spike_data['relaxing_sitting'] * (5/1023)
-relaxing_activity = no_spike_data['relaxing_activity'] * (5/1023)
-mentally_stressful = (no_spike_data['mentally_stressful'][:(300 * fs)]) * (5/1023)
-physically_stressful = no_spike_data['physically_stressful'] * (5/1023)
-
-# create a figure for raw data 
-plt.figure(1, clear = True)
-plt.suptitle('5 Second Clips of Raw Data')
-
-# plot relaxing data and annotate within function plus zoom in on 5 second segment
-plt.subplot(3,2,1)
-p3m.plot_data(relaxing_sitting,fs, 'Relaxing Sitting Signal', 'volts (V)')
-plt.xlim(165,170)
-
-# plot relaxing activity data and annotate within function plus zoom in on 5 second segment
-plt.subplot(3,2,2)
-p3m.plot_data(relaxing_activity, fs, 'Relaxing Activity Signal', 'volts (V)')
-plt.xlim(255,260)
-
-# plot mentally stressful data and annotate within function plus zoom in on 5 second segment
-plt.subplot(3,2,3)
-p3m.plot_data(mentally_stressful, fs, 'Mentally Stressful Signal','volts (V)')
-plt.xlim(125,130)
-
-# plot physically stressful data and annotate within function plus zoom in on 5 second segment
-plt.subplot(3,2,4)
-p3m.plot_data(physically_stressful, fs, 'Physically Stressful Signal','volts (V)')
-plt.xlim(145,150)
-
-
-# plot/ create concatenated signal and annotate within function
-plt.subplot(3,1,3)
-concatenated_signal = np.concatenate([relaxing_sitting, relaxing_activity, mentally_stressful, physically_stressful])
-p3m.plot_data(concatenated_signal, fs, 'Concatenated Signal', 'volts (V)')
-
-# annotate concatenated signal plot
-plt.title('Concatenated Signal')
-plt.tight_layout()
-plt.savefig('raw_data.png')
-
-#%% part 2
-# define filter parameters (band-stop filter)
-
-# low cutoff
-fc_low = 0.67
-#high cutoff
-fc_high = 40
-
-# parameter for number of coeffs in the filter
-numtaps = 501
-
-# create band stop filter
-impulse_response = signal.firwin(numtaps, [fc_low,fc_high], fs = fs, pass_zero = False, window = 'hann')
-
-# create new figure
-plt.figure(2, clear = True)
-plt.suptitle('Band-Pass Filter Response')
-# plot the impulse response in a subplot and annotate using function
-plt.subplot(1,2,1)
-p3m.plot_data(impulse_response, fs, 'Impulse Response')
-
-# plot/ compute the FFT of the inpulse response 
-plt.subplot(1,2,2)
-fft_response = fft.rfft(impulse_response)
-f_filter = fft.rfftfreq(len(impulse_response), 1/fs)
-plt.plot(f_filter, np.abs(fft_response))
-
-# annotate plot
-plt.ylabel('|X(f)| A.U.')
-plt.title('Frequency Domain of Filter')
-plt.xlabel('frequency (Hz)')
-plt.grid()
-plt.tight_layout()
-
-# save figure
-plt.savefig('filter.png')
-
-# create new figure 
-plt.figure(3, clear = True)
-plt.suptitle('Original vs Filtered Signal Comparisons')
-# filter the baseline recording and plot it using functions
-plt.subplot(2,1,1)
-p3m.plot_data(relaxing_sitting, fs, label= 'original signal')
-filt_relaxing_sitting = p3m.filter_data(relaxing_sitting, impulse_response)
-p3m.plot_data(filt_relaxing_sitting, fs, title = 'Relaxing Sitting', label = 'filtered signal', units = 'volts (V)')
-
-# zoom into 5 second segment and format plot
-plt.xlim(165,170)
-plt.grid()
-plt.legend(loc = 4)
-
-# filter the mentally stressful recording and plot it using functions
-plt.subplot(2,1,2)
-p3m.plot_data(mentally_stressful, fs,  label = 'original signal' )
-filt_mentally_stressful = p3m.filter_data(mentally_stressful, impulse_response)
-p3m.plot_data(filt_mentally_stressful, fs, title = 'Mentally Stressful',label = 'filtered signal', units = 'volts (V)')
-
-# Zoom in and format plot then save the figure
-plt.xlim(125,130)
-plt.grid()
-plt.tight_layout()
-plt.legend(loc = 4)
-plt.savefig('filtered_signal.png')
-
-# create a new figure to show the beat identification
-plt.figure(4, clear = True)
-plt.suptitle('Filtered Signals With Beat Markers')
-
-# plot the filtered baseline recording
-plt.subplot(2,2,1)
-p3m.plot_data(filt_relaxing_sitting, fs, 'Filtered Relaxing Sitting Signal', 'volts (V)')
-
-# filter and plot the relaxing activity recording
-plt.subplot(2,2,2)
-filt_relaxing_activity = p3m.filter_data(relaxing_activity, impulse_response)
-p3m.plot_data(filt_relaxing_activity, fs, 'Filtered Relaxing Activity Signal', 'volts (V)')
-
-# plot the filtered mentally stressful activity recording
-plt.subplot(2,2,3)
-p3m.plot_data(filt_mentally_stressful, fs, 'Filtered Mentally Stressful Signal', 'volts (V)')
-
-# filter and plot the physically stressful activity recording
-plt.subplot(2,2,4)
-filt_physically_stressful = p3m.filter_data(physically_stressful,impulse_response)
-p3m.plot_data(filt_physically_stressful, fs, 'Filtered Physically Stressful Signal', 'volts (V)')
-
-# fit plots to figure neatly 
-plt.tight_layout()
-
-# save figure
-plt.savefig('filtered_signals_beats.png')
-
-#%% part 3
-# re-reference figure
-plt.figure(4)
-
-# Re-reference axis object and use function to find the beats in baseline and plot them on the referenced subplot
-plt.subplot(2,2,1)
-relaxing_sitting_beats = p3m.find_beats(filt_relaxing_sitting, fs, 0.5, flipped = True, plot = True)
+# the figures are drawn and saved by worker processes, which import this script again, so everything runs under a main guard
+if __name__ == '__main__':
+    # keep the results of the compute functions on disk so re-running the script after a plotting change is fast
+    result_cache = rcm.ResultCache(cached_functions = {'Project3_module': rcm.CACHED_FUNCTIONS['Project3_module']})
+    result_cache.enable()
 
-# Re-reference axis object and use function to find the beats in relaxing activity and plot them on the referenced subplot
-plt.subplot(2,2,2)
-relaxing_activity_beats = p3m.find_beats(filt_relaxing_activity, fs, 0.5, flipped = True, plot = True)
+    # save the figures in the background while the analysis carries on
+    figure_queue = fqm.FigureQueue()
 
-# Re-reference axis object and use function to find the beats in mentally stressful and plot them on the referenced subplot
-plt.subplot(2,2,3)
-mentally_stressful_beats = p3m.find_beats(filt_mentally_stressful, fs, 0.5,  flipped = True, plot = True)
-
-# re-reference axis object and use function to find the beats in physically stressful and plot them on the referenced subplot
-plt.subplot(2,2,4)
-physically_stressful_beats = p3m.find_beats(filt_physically_stressful, fs,0.5,  flipped = True, plot = True)
-
-#%% part 4
-# compute IBI and HRV using function for baseline
-rs_ibi, rs_hrv = p3m.hrv(relaxing_sitting_beats, fs)
+#%% part 1
+if __name__ == '__main__':
 
-# compute IBI and HRV using function for relaxing activity
-ra_ibi, ra_hrv = p3m.hrv(relaxing_activity_beats, fs)
+    # define the sampling rate
+    fs = 500
 
-# compute IBI and HRV using function for mentally stressful
-ms_ibi, ms_hrv = p3m.hrv(mentally_stressful_beats, fs)
+    # specify file location where data is stored and gather list of file names
+    path = 'recorded_data'
+    files = os.listdir(path)
 
-# compute IBI and HRV using function for physically stressful
-ps_ibi, ps_hrv = p3m.hrv(physically_stressful_beats, fs)
+    # make an empty dictionary for data
+    data = {}
 
-# create a new figure for HRV bar chart 
-plt.figure(5, clear = True)
-plt.title('Heart Rate Veriabilities')
+    # load data in from every data file in the specified folder and place it in the data dictionary.
+    for file in files:
+        if '.txt' in file:
+            dictionary = {file.strip('.txt'): np.loadtxt(f'{path}/{file}')}
+            data = data | dictionary
 
-# plot HRV bar chart 
-plt.bar(['relaxing sitting', 'relaxing activity', 'mentally stressful', 'physically stressful'],[rs_hrv, ra_hrv, ms_hrv, ps_hrv])
+    # remove the spikes seen in the data collected 
+    no_spike_data = p3m.remove_spikes(data, fs, 1000)
 
-# annotate and format plot 
-plt.xlabel('Activity Type')
-plt.ylabel('Time (s)')
-plt.grid()
-plt.tight_layout()
+    # Create reference variables for each individual recording and convert the y values to volts
+    relaxing_sitting = no_spike_data['relaxing_sitting'] * (5/1023)
+    relaxing_activity = no_spike_data['relaxing_activity'] * (5/1023)
+    mentally_stressful = (no_spike_data['mentally_stressful'][:(300 * fs)]) * (5/1023)
+    physically_stressful = no_spike_data['physically_stressful'] * (5/1023)
 
-# save figure
-plt.savefig('hrvs.png')
+    # create a figure for raw data 
+    plotter = fqm.start_figure(figure_queue, num = 1, clear = True)
+    plotter.suptitle('5 Second Clips of Raw Data')
 
-# create time array and interpolate for IBI values at all time points for baseline 
-rs_time = np.arange(0,len(relaxing_sitting) / fs, 0.1)
-rs_interp = np.interp(rs_time, relaxing_sitting_beats[1:] / fs, rs_ibi)
+    # plot relaxing data and annotate within function plus zoom in on 5 second segment
+    plotter.subplot(3,2,1)
+    p3m.plot_data(relaxing_sitting,fs, 'Relaxing Sitting Signal', 'volts (V)', visible_range = (165,170), plotter = plotter)
 
-# create time array and interpolate for IBI values at all time points for relaxing activity
-ra_time = np.arange(0,len(relaxing_activity) / fs, 0.1)
-ra_interp = np.interp(ra_time, relaxing_activity_beats[1:] / fs, ra_ibi)
+    # plot relaxing activity data and annotate within function plus zoom in on 5 second segment
+    plotter.subplot(3,2,2)
+    p3m.plot_data(relaxing_activity, fs, 'Relaxing Activity Signal', 'volts (V)', visible_range = (255,260), plotter = plotter)
 
-# create time array and interpolate for IBI values at all time points for mentally stressful
-ms_time = np.arange(0,len(mentally_stressful) / fs, 0.1)
-ms_interp = np.interp(ms_time, mentally_stressful_beats[1:] / fs, ms_ibi)
+    # plot mentally stressful data and annotate within function plus zoom in on 5 second segment
+    plotter.subplot(3,2,3)
+    p3m.plot_data(mentally_stressful, fs, 'Mentally Stressful Signal','volts (V)', visible_range = (125,130), plotter = plotter)
 
-# create time array and interpolate for IBI values at all time points for physically stressful
-ps_time = np.arange(0,len(physically_stressful) / fs, 0.1)
-ps_interp = np.interp(ps_time, physically_stressful_beats[1:] / fs, ps_ibi)
+    # plot physically stressful data and annotate within function plus zoom in on 5 second segment
+    plotter.subplot(3,2,4)
+    p3m.plot_data(physically_stressful, fs, 'Physically Stressful Signal','volts (V)', visible_range = (145,150), plotter = plotter)
 
-# Create new figure for Frequency spectrums 
-plt.figure(6, clear = True)
-plt.suptitle('Frequency Domains of Interpolated Inter-Beat Intervals')
 
-# compute frequency domain values of baseline and return frequency ratio using function
-plt.subplot(2,2,1)
-rs_ratio = p3m.plot_frequency_bands(rs_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Relaxing Sitting', units = 'power A.U.')
-# zoom into appropriate y range 
-plt.ylim(0,2000)
+    # plot/ create concatenated signal and annotate within function
+    plotter.subplot(3,1,3)
+    concatenated_signal = np.concatenate([relaxing_sitting, relaxing_activity, mentally_stressful, physically_stressful])
+    p3m.plot_data(concatenated_signal, fs, 'Concatenated Signal', 'volts (V)', visible_range = (0, len(concatenated_signal) / fs), plotter = plotter)
 
-# compute frequency domain values of resting activity and return frequency ratio using function
-plt.subplot(2,2,2)
-ra_ratio = p3m.plot_frequency_bands(ra_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Relaxing Activity', units = 'power A.U.')
-# zoom into appropriate y range
-plt.ylim(0,8000)
+    # annotate concatenated signal plot
+    plotter.title('Concatenated Signal')
+    plotter.tight_layout()
+    fqm.save_figure(plotter, 'raw_data.png', figure_queue)
 
-# compute frequency domain values of mentally stressful and return frequency ratio using function
-plt.subplot(2,2,3)
-ms_ratio = p3m.plot_frequency_bands(ms_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Mentally Stressful', units = 'power A.U.')
-# zoom into appropriate y range
-plt.ylim(0,1000)
+#%% part 2
+if __name__ == '__main__':
+    # define filter parameters (band-stop filter)
+
+    # low cutoff
+    fc_low = 0.67
+    #high cutoff
+    fc_high = 40
+
+    # parameter for number of coeffs in the filter
+    numtaps = 501
+
+    # create band stop filter, taken from the filter cache if it was designed before
+    filter_key = p3m.FilterKey(numtaps, (fc_low,fc_high), fs, window = 'hann', pass_zero = False)
+    impulse_response, f_filter, fft_response = p3m.FILTER_REGISTRY.get(filter_key)
+
+    # create new figure
+    plotter = fqm.start_figure(figure_queue, num = 2, clear = True)
+    plotter.suptitle('Band-Pass Filter Response')
+    # plot the impulse response in a subplot and annotate using function
+    plotter.subplot(1,2,1)
+    p3m.plot_data(impulse_response, fs, 'Impulse Response', plotter = plotter)
+
+    # plot the FFT of the inpulse response 
+    plotter.subplot(1,2,2)
+    plotter.plot(f_filter, np.abs(fft_response))
+
+    # annotate plot
+    plotter.ylabel('|X(f)| A.U.')
+    plotter.title('Frequency Domain of Filter')
+    plotter.xlabel('frequency (Hz)')
+    plotter.grid()
+    plotter.tight_layout()
+
+    # save figure
+    fqm.save_figure(plotter, 'filter.png', figure_queue)
+
+    # create new figure 
+    plotter = fqm.start_figure(figure_queue, num = 3, clear = True)
+    plotter.suptitle('Original vs Filtered Signal Comparisons')
+    # filter the baseline recording and plot a zoomed in 5 second segment using functions
+    plotter.subplot(2,1,1)
+    p3m.plot_data(relaxing_sitting, fs, label= 'original signal', visible_range = (165,170), plotter = plotter)
+    filt_relaxing_sitting = p3m.filter_data(relaxing_sitting, impulse_response)
+    p3m.plot_data(filt_relaxing_sitting, fs, title = 'Relaxing Sitting', label = 'filtered signal', units = 'volts (V)', visible_range = (165,170), plotter = plotter)
+
+    # format plot
+    plotter.grid()
+    plotter.legend(loc = 4)
+
+    # filter the mentally stressful recording and plot a zoomed in 5 second segment using functions
+    plotter.subplot(2,1,2)
+    p3m.plot_data(mentally_stressful, fs,  label = 'original signal', visible_range = (125,130), plotter = plotter)
+    filt_mentally_stressful = p3m.filter_data(mentally_stressful, impulse_response)
+    p3m.plot_data(filt_mentally_stressful, fs, title = 'Mentally Stressful',label = 'filtered signal', units = 'volts (V)', visible_range = (125,130), plotter = plotter)
+
+    # format plot then save the figure
+    plotter.grid()
+    plotter.tight_layout()
+    plotter.legend(loc = 4)
+    fqm.save_figure(plotter, 'filtered_signal.png', figure_queue)
+
+    # create a new figure to show the beat identification
+    beats_plotter = fqm.start_figure(figure_queue, num = 4, clear = True)
+    beats_plotter.suptitle('Filtered Signals With Beat Markers')
+
+    # plot the filtered baseline recording
+    beats_plotter.subplot(2,2,1)
+    p3m.plot_data(filt_relaxing_sitting, fs, 'Filtered Relaxing Sitting Signal', 'volts (V)', plotter = beats_plotter)
+
+    # filter and plot the relaxing activity recording
+    beats_plotter.subplot(2,2,2)
+    filt_relaxing_activity = p3m.filter_data(relaxing_activity, impulse_response)
+    p3m.plot_data(filt_relaxing_activity, fs, 'Filtered Relaxing Activity Signal', 'volts (V)', plotter = beats_plotter)
+
+    # plot the filtered mentally stressful activity recording
+    beats_plotter.subplot(2,2,3)
+    p3m.plot_data(filt_mentally_stressful, fs, 'Filtered Mentally Stressful Signal', 'volts (V)', plotter = beats_plotter)
+
+    # filter and plot the physically stressful activity recording
+    beats_plotter.subplot(2,2,4)
+    filt_physically_stressful = p3m.filter_data(physically_stressful,impulse_response)
+    p3m.plot_data(filt_physically_stressful, fs, 'Filtered Physically Stressful Signal', 'volts (V)', plotter = beats_plotter)
+
+    # fit plots to figure neatly 
+    beats_plotter.tight_layout()
 
-# compute frequency domain values of physically stressful and return frequency ratio using function
-plt.subplot(2,2,4)
-ps_ratio = p3m.plot_frequency_bands(ps_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Physically Stressful', units = 'power A.U.')
-# zoom into appropriate y range and adjust plot spacings 
-plt.ylim(0,1000)
-plt.tight_layout()
+#%% part 3
+if __name__ == '__main__':
+    # keep recording figure 4, it is saved once the beats are on it
 
-# save figure
-plt.savefig('ibi_frequency_bands.png')
+    # Re-reference axis object and use function to find the beats in baseline and plot them on the referenced subplot
+    beats_plotter.subplot(2,2,1)
+    relaxing_sitting_beats = p3m.find_beats(filt_relaxing_sitting, fs, 0.5, flipped = True, plot = True, plotter = beats_plotter)
 
-# create figue for plot and annotate a bar chart for frequency ratios
-plt.figure(7, clear = True)
-plt.title('LF/HF Ratios')
-plt.bar(['relaxing sitting','relaxing activity','mentally stressful','physically stressful'], [rs_ratio, ra_ratio, ms_ratio, ps_ratio])
-plt.xlabel('Activity Type')
-plt.ylabel('A.U.')
-plt.grid()
-plt.tight_layout()
+    # Re-reference axis object and use function to find the beats in relaxing activity and plot them on the referenced subplot
+    beats_plotter.subplot(2,2,2)
+    relaxing_activity_beats = p3m.find_beats(filt_relaxing_activity, fs, 0.5, flipped = True, plot = True, plotter = beats_plotter)
 
-# save figure 
-plt.savefig('lf_hr_ratios.png')
+    # Re-reference axis object and use function to find the beats in mentally stressful and plot them on the referenced subplot
+    beats_plotter.subplot(2,2,3)
+    mentally_stressful_beats = p3m.find_beats(filt_mentally_stressful, fs, 0.5,  flipped = True, plot = True, plotter = beats_plotter)
 
+    # re-reference axis object and use function to find the beats in physically stressful and plot them on the referenced subplot
+    beats_plotter.subplot(2,2,4)
+    physically_stressful_beats = p3m.find_beats(filt_physically_stressful, fs,0.5,  flipped = True, plot = True, plotter = beats_plotter)
 
+    # save figure
+    fqm.save_figure(beats_plotter, 'filtered_signals_beats.png', figure_queue)
 
+#%% part 4
+if __name__ == '__main__':
+    # compute IBI and HRV using function for baseline
+    rs_ibi, rs_hrv = p3m.hrv(relaxing_sitting_beats, fs)
+
+    # compute IBI and HRV using function for relaxing activity
+    ra_ibi, ra_hrv = p3m.hrv(relaxing_activity_beats, fs)
+
+    # compute IBI and HRV using function for mentally stressful
+    ms_ibi, ms_hrv = p3m.hrv(mentally_stressful_beats, fs)
+
+    # compute IBI and HRV using function for physically stressful
+    ps_ibi, ps_hrv = p3m.hrv(physically_stressful_beats, fs)
+
+    # create a new figure for HRV bar chart 
+    plotter = fqm.start_figure(figure_queue, num = 5, clear = True)
+    plotter.title('Heart Rate Veriabilities')
+
+    # plot HRV bar chart 
+    plotter.bar(['relaxing sitting', 'relaxing activity', 'mentally stressful', 'physically stressful'],[rs_hrv, ra_hrv, ms_hrv, ps_hrv])
+
+    # annotate and format plot 
+    plotter.xlabel('Activity Type')
+    plotter.ylabel('Time (s)')
+    plotter.grid()
+    plotter.tight_layout()
+
+    # save figure
+    fqm.save_figure(plotter, 'hrvs.png', figure_queue)
+
+    # create time array and interpolate for IBI values at all time points for baseline 
+    rs_time = np.arange(0,len(relaxing_sitting) / fs, 0.1)
+    rs_interp = np.interp(rs_time, relaxing_sitting_beats[1:] / fs, rs_ibi)
+
+    # create time array and interpolate for IBI values at all time points for relaxing activity
+    ra_time = np.arange(0,len(relaxing_activity) / fs, 0.1)
+    ra_interp = np.interp(ra_time, relaxing_activity_beats[1:] / fs, ra_ibi)
+
+    # create time array and interpolate for IBI values at all time points for mentally stressful
+    ms_time = np.arange(0,len(mentally_stressful) / fs, 0.1)
+    ms_interp = np.interp(ms_time, mentally_stressful_beats[1:] / fs, ms_ibi)
+
+    # create time array and interpolate for IBI values at all time points for physically stressful
+    ps_time = np.arange(0,len(physically_stressful) / fs, 0.1)
+    ps_interp = np.interp(ps_time, physically_stressful_beats[1:] / fs, ps_ibi)
+
+    # Create new figure for Frequency spectrums 
+    plotter = fqm.start_figure(figure_queue, num = 6, clear = True)
+    plotter.suptitle('Frequency Domains of Interpolated Inter-Beat Intervals')
+
+    # compute frequency domain values of baseline and return frequency ratio using function
+    plotter.subplot(2,2,1)
+    rs_ratio = p3m.plot_frequency_bands(rs_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Relaxing Sitting', units = 'power A.U.', plotter = plotter)
+    # zoom into appropriate y range 
+    plotter.ylim(0,2000)
+
+    # compute frequency domain values of resting activity and return frequency ratio using function
+    plotter.subplot(2,2,2)
+    ra_ratio = p3m.plot_frequency_bands(ra_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Relaxing Activity', units = 'power A.U.', plotter = plotter)
+    # zoom into appropriate y range
+    plotter.ylim(0,8000)
+
+    # compute frequency domain values of mentally stressful and return frequency ratio using function
+    plotter.subplot(2,2,3)
+    ms_ratio = p3m.plot_frequency_bands(ms_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Mentally Stressful', units = 'power A.U.', plotter = plotter)
+    # zoom into appropriate y range
+    plotter.ylim(0,1000)
+
+    # compute frequency domain values of physically stressful and return frequency ratio using function
+    plotter.subplot(2,2,4)
+    ps_ratio = p3m.plot_frequency_bands(ps_interp, 0.1, [0.04,0.15], [0.15,0.4], title = 'Physically Stressful', units = 'power A.U.', plotter = plotter)
+    # zoom into appropriate y range and adjust plot spacings 
+    plotter.ylim(0,1000)
+    plotter.tight_layout()
+
+    # save figure
+    fqm.save_figure(plotter, 'ibi_frequency_bands.png', figure_queue)
+
+    # create figue for plot and annotate a bar chart for frequency ratios
+    plotter = fqm.start_figure(figure_queue, num = 7, clear = True)
+    plotter.title('LF/HF Ratios')
+    plotter.bar(['relaxing sitting','relaxing activity','mentally stressful','physically stressful'], [rs_ratio, ra_ratio, ms_ratio, ps_ratio])
+    plotter.xlabel('Activity Type')
+    plotter.ylabel('A.U.')
+    plotter.grid()
+    plotter.tight_layout()
+
+    # save figure 
+    fqm.save_figure(plotter, 'lf_hr_ratios.png', figure_queue)
+
+    # compute the heart rate variabilities and LF/HF ratios of all four recordings at once without plotting and check they
+    # match the values found one recording at a time above
+    batch_results = p3m.batch_hrv_and_band_powers([relaxing_sitting_beats, relaxing_activity_beats, mentally_stressful_beats, physically_stressful_beats], fs,
+                                                  [len(relaxing_sitting), len(relaxing_activity), len(mentally_stressful), len(physically_stressful)])
+    if np.array_equal(batch_results['hrv'], [rs_hrv, ra_hrv, ms_hrv, ps_hrv]) and np.array_equal(batch_results['lf_hf_ratio'], [rs_ratio, ra_ratio, ms_ratio, ps_ratio]):
+        print('Batched HRV and LF/HF ratios: success')
+
+#%% part 5
+if __name__ == '__main__':
+    # wait for the figures to be saved and report any that failed
+    failed_figures = figure_queue.close()
+    for out_filename, error in failed_figures.items():
+        print(f'{out_filename} could not be saved: {error}')
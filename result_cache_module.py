@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+result_cache_module.py
+
+This module keeps the results of the expensive compute functions of project1_module and Project3_module on disk, so re-running a
+script after a change that does not touch their inputs, like a new plot limit, loads the results instead of computing them again.
+A result is stored under a hash of the source file of the function's module, the contents of every input array and the other
+parameters, so any change to the data, the parameters or the module (including the functions it calls, like extract_trials inside
+compute_mean_and_std_trials) gives a new entry. Changes outside the module, such as a new scipy version, are not seen and need
+invalidate. A call made with positional or keyword arguments gives the same entry. The cache directory is kept under a size limit by deleting
+the least recently used results, and the results of one function or the whole cache can be deleted on demand. Nothing is cached
+until a ResultCache is enabled.
+"""
+import numpy as np
+import hashlib
+import importlib
+import functools
+import inspect
+import os
+import pickle
+import types
+
+# directory the results are kept in and its default size limit in bytes
+RESULT_CACHE_DIR = 'result_cache'
+RESULT_CACHE_MAX_BYTES = 2**30
+
+# compute functions that are cached when a ResultCache is enabled, plotting functions are left out so their figures are still drawn
+# and functions reading files are left out since the hash only covers the file name
+CACHED_FUNCTIONS = {'Project3_module': ['remove_spikes', 'filter_data', 'batch_hrv_and_band_powers', 'rolling_hrv',
+                                        'rolling_lf_hf_ratio'],
+                    'project1_module': ['compute_mean_and_std_trials']}
+
+# number of array elements hashed at a time so memory mapped signals are never loaded whole
+HASH_CHUNK_SIZE = 2**22
+
+def update_hash(key_hash, value):
+    '''
+    Adds a parameter of a call to a hash. Arrays are hashed by their type, shape and
+    contents, containers by each of their items and other objects by their attributes.
+
+    Parameters
+    ----------
+    key_hash : hashlib hash object
+        The hash being built.
+    value : any
+        The parameter to add.
+
+    Returns
+    -------
+    None.
+
+    '''
+    # the type name keeps a list and an array of the same numbers apart
+    key_hash.update(type(value).__name__.encode())
+    if isinstance(value, np.ndarray) or hasattr(value, '__array__') and hasattr(value, 'shape'):
+        array = value if isinstance(value, np.ndarray) else np.asarray(value)
+        key_hash.update(f'{array.dtype.str}{array.shape}'.encode())
+        flat_array = array.reshape(-1)
+        for chunk_start in range(0, len(flat_array), HASH_CHUNK_SIZE):
+            key_hash.update(np.ascontiguousarray(flat_array[chunk_start:(chunk_start + HASH_CHUNK_SIZE)]).data)
+    elif isinstance(value, dict):
+        for item_key in sorted(value, key = repr):
+            update_hash(key_hash, item_key)
+            update_hash(key_hash, value[item_key])
+    elif isinstance(value, (list, tuple)):
+        key_hash.update(str(len(value)).encode())
+        for item in value:
+            update_hash(key_hash, item)
+    elif isinstance(value, types.CodeType):
+        # code objects print with their memory address, so hash their bytecode and constants instead
+        key_hash.update(value.co_code)
+        update_hash(key_hash, value.co_consts)
+    elif isinstance(value, (str, bytes, int, float, complex, bool, type(None), np.generic, np.dtype, type)):
+        key_hash.update(repr(value).encode())
+    elif hasattr(value, '__dict__'):
+        update_hash(key_hash, vars(value))
+    else:
+        key_hash.update(repr(value).encode())
+
+#%% part 1
+class ResultCache:
+    """
+    Stores the results of function calls in a directory, one pickle file per call named
+    after the function and the hash of the call. Reading a result marks it as recently
+    used, and after each new result is written the least recently used ones are deleted
+    until the directory is under max_bytes. Calls that change their inputs (in_place=True)
+    are never cached. It can be used as a context manager, which enables it on entry and
+    disables it on exit.
+
+    Parameters
+    ----------
+    cache_dir : string, optional
+        The directory the results are kept in. The default is RESULT_CACHE_DIR.
+    max_bytes : integer, optional
+        The size limit of the directory in bytes. The default is RESULT_CACHE_MAX_BYTES.
+    cached_functions : dictionary, optional
+        The names of the functions cached by enable for each module. The default is CACHED_FUNCTIONS.
+
+    """
+    def __init__(self, cache_dir = RESULT_CACHE_DIR, max_bytes = RESULT_CACHE_MAX_BYTES, cached_functions = CACHED_FUNCTIONS):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cached_functions = cached_functions
+        self.original_functions = []
+        self.source_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+
+    def enable(self):
+        '''
+        Replaces the cached functions of the modules with wrappers that use the cache. The
+        functions call each other through their module, so a function that is not cached,
+        like plot_mean_and_std_trials, still gets the cached results of the ones it calls.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if len(self.original_functions) > 0:
+            return
+        for module_name, function_names in self.cached_functions.items():
+            module = importlib.import_module(module_name)
+            for function_name in function_names:
+                function = getattr(module, function_name)
+                self.original_functions.append((module, function_name, function))
+                setattr(module, function_name, self.cached(function))
+
+    def disable(self):
+        '''
+        Puts the original functions back.
+
+        Returns
+        -------
+        None.
+
+        '''
+        for module, function_name, function in self.original_functions:
+            setattr(module, function_name, function)
+        self.original_functions = []
+
+    def cached(self, function):
+        '''
+        Makes a version of a function that uses the cache.
+
+        Parameters
+        ----------
+        function : function
+            The function to cache.
+
+        Returns
+        -------
+        wrapper : function
+            Gives the cached result of the call when there is one and calls the function
+            and caches its result otherwise.
+
+        '''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+        return wrapper
+
+    def source_hash(self, function):
+        '''
+        Gives the hash of the source file of the module a function is defined in, read the
+        first time it is needed so it matches the code that was loaded.
+
+        Parameters
+        ----------
+        function : function
+            The function whose module is hashed.
+
+        Returns
+        -------
+        source_hash : string
+            The hash of the module's source file, or an empty string when it has none.
+
+        '''
+        if function.__module__ not in self.source_hashes:
+            try:
+                with open(inspect.getsourcefile(function), 'rb') as source_file:
+                    self.source_hashes[function.__module__] = hashlib.sha1(source_file.read()).hexdigest()
+            except (OSError, TypeError):
+                self.source_hashes[function.__module__] = ''
+        return self.source_hashes[function.__module__]
+
+    def call_file(self, function, arguments):
+        '''
+        Gives the file the result of a call is kept in.
+
+        Parameters
+        ----------
+        function : function
+            The function called.
+        arguments : dictionary
+            Every parameter of the call by name, defaults included, from bind_arguments.
+
+        Returns
+        -------
+        cache_file : string
+            The path of the file named after the function and the hash of the call.
+
+        '''
+        # hash the module's source and the function's code too so editing either never gives an old result
+        key_hash = hashlib.sha1()
+        update_hash(key_hash, f'{function.__module__}.{function.__qualname__}')
+        update_hash(key_hash, self.source_hash(function))
+        update_hash(key_hash, getattr(function, '__code__', None))
+        update_hash(key_hash, arguments)
+        return os.path.join(self.cache_dir, f'{function.__name__}-{key_hash.hexdigest()}.pkl')
+
+    def bind_arguments(self, function, args, kwargs):
+        '''
+        Names every parameter of a call, so the same call made with positional or keyword
+        arguments is recognized as one.
+
+        Parameters
+        ----------
+        function : function
+            The function called.
+        args : tuple
+            The positional arguments of the call.
+        kwargs : dictionary
+            The keyword arguments of the call.
+
+        Returns
+        -------
+        arguments : dictionary
+            The value of every parameter by name, with the defaults filled in.
+
+        '''
+        bound_arguments = inspect.signature(function).bind(*args, **kwargs)
+        bound_arguments.apply_defaults()
+        return dict(bound_arguments.arguments)
+
+    def call(self, function, *args, **kwargs):
+        '''
+        Gives the result of calling function with the arguments, from the cache when it is there.
+        Calls that change their inputs (in_place=True, positional or keyword) always run the function.
+
+        Parameters
+        ----------
+        function : function
+            The function to call.
+        *args, **kwargs
+            The arguments of the call.
+
+        Returns
+        -------
+        result : any
+            What the function returns.
+
+        '''
+        arguments = self.bind_arguments(function, args, kwargs)
+        if arguments.get('in_place', False):
+            return function(*args, **kwargs)
+        cache_file = self.call_file(function, arguments)
+
+        # load the result and mark it as recently used
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'rb') as file:
+                    result = pickle.load(file)
+                os.utime(cache_file)
+                self.hits += 1
+                return result
+            except (OSError, EOFError, pickle.UnpicklingError):
+                # the file was deleted or damaged after it was found, compute the result again
+                pass
+
+        # compute the result and write it to a temporary file first so other processes never read half a file
+        self.misses += 1
+        result = function(*args, **kwargs)
+        os.makedirs(self.cache_dir, exist_ok = True)
+        temporary_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(temporary_file, 'wb') as file:
+            pickle.dump(result, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_file, cache_file)
+        self.evict()
+        return result
+
+    def evict(self):
+        '''
+        Deletes the least recently used results until the cache directory is under max_bytes.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl'):
+                entry_stat = entry.stat()
+                entries.append((entry_stat.st_mtime_ns, entry_stat.st_size, entry.path))
+        total_bytes = sum(entry[1] for entry in entries)
+        for last_used, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def invalidate(self, function = None):
+        '''
+        Deletes the cached results of one function, or every cached result.
+
+        Parameters
+        ----------
+        function : function or string, optional
+            The function, or its name, whose results are deleted. The default is None, which deletes all results.
+
+        Returns
+        -------
+        removed_count : integer
+            The number of results deleted.
+
+        '''
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        function_name = function if isinstance(function, str) or function is None else function.__name__
+        removed_count = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.pkl') and (function_name is None or entry.name.startswith(f'{function_name}-')):
+                try:
+                    os.remove(entry.path)
+                    removed_count += 1
+                except FileNotFoundError:
+                    pass
+        return removed_count
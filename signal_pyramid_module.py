@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+signal_pyramid_module.py
+
+This module contains the functions used by the plotting functions of project1_module and Project3_module to draw long signals
+quickly. A min/max pyramid stores the smallest and largest sample of every block of the signal at several block sizes, each level
+using blocks a fixed factor larger than the one below it. Any time range of the signal can then be drawn from at most a few
+thousand points, taken from the level whose blocks best fit the range, while still showing every spike since each block keeps its
+extremes. Pyramids can be saved next to a recording and reused as long as the signal has not changed.
+"""
+import numpy as np
+import os
+import hashlib
+
+# number of samples in a block of the finest pyramid level and the growth in block size between levels
+PYRAMID_BASE_BLOCK = 16
+PYRAMID_FACTOR = 4
+
+# most points drawn for any visible range
+MAX_PLOT_POINTS = 4000
+
+# number of samples hashed at a time when checking a saved pyramid still belongs to the signal, so memory mapped
+# signals are never loaded whole
+FINGERPRINT_CHUNK_SIZE = 2**22
+
+#%% part 1
+def build_minmax_pyramid(signal, base_block = PYRAMID_BASE_BLOCK, factor = PYRAMID_FACTOR, chunk_size = 2**22):
+    '''
+    Builds the min/max pyramid of a signal. The signal is read in chunks so memory mapped
+    signals never have to be loaded fully.
+
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) where n is the number of samples in the signal
+        The signal to build the pyramid of.
+    base_block : integer, optional
+        The number of samples in a block of the finest level. The default is PYRAMID_BASE_BLOCK.
+    factor : integer, optional
+        How many blocks of a level make up one block of the next level. The default is PYRAMID_FACTOR.
+    chunk_size : integer, optional
+        The number of samples read at a time, rounded down to whole blocks. The default is 2**22.
+
+    Returns
+    -------
+    pyramid : dictionary
+        Has the signal_length, a 1D array of block_sizes with one entry per level, and lists
+        mins and maxs holding a 1D array per level with the extremes of every block.
+
+    '''
+    signal_length = len(signal)
+    chunk_size = max(chunk_size // base_block, 1) * base_block
+
+    # finest level, reduce each chunk of the signal block by block
+    level_mins = []
+    level_maxs = []
+    for chunk_start in range(0, signal_length, chunk_size):
+        chunk = np.asarray(signal[chunk_start:(chunk_start + chunk_size)])
+        block_starts = np.arange(0, len(chunk), base_block)
+        level_mins.append(np.minimum.reduceat(chunk, block_starts))
+        level_maxs.append(np.maximum.reduceat(chunk, block_starts))
+    mins = [np.concatenate(level_mins) if level_mins else np.zeros(0)]
+    maxs = [np.concatenate(level_maxs) if level_maxs else np.zeros(0)]
+    block_sizes = [base_block]
+
+    # coarser levels, reduce groups of blocks of the level below until one block is left
+    while len(mins[-1]) > 1:
+        block_starts = np.arange(0, len(mins[-1]), factor)
+        mins.append(np.minimum.reduceat(mins[-1], block_starts))
+        maxs.append(np.maximum.reduceat(maxs[-1], block_starts))
+        block_sizes.append(block_sizes[-1] * factor)
+
+    return {'signal_length': signal_length, 'block_sizes': np.array(block_sizes), 'mins': mins, 'maxs': maxs}
+
+def signal_fingerprint(signal):
+    '''
+    Hashes the whole signal to tell whether a saved pyramid still belongs to it. The
+    signal is read in chunks so memory mapped signals never have to be loaded fully.
+
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) where n is the number of samples in the signal
+        The signal to fingerprint.
+
+    Returns
+    -------
+    fingerprint : string
+        The SHA-1 hex digest of the dtype, length and every sample of the signal.
+
+    '''
+    signal_hash = hashlib.sha1(f'{np.asarray(signal[:0]).dtype.str}{len(signal)}'.encode())
+    for chunk_start in range(0, len(signal), FINGERPRINT_CHUNK_SIZE):
+        signal_hash.update(np.ascontiguousarray(signal[chunk_start:(chunk_start + FINGERPRINT_CHUNK_SIZE)]).data)
+    return signal_hash.hexdigest()
+
+def get_minmax_pyramid(signal, cache_file = None, base_block = PYRAMID_BASE_BLOCK, factor = PYRAMID_FACTOR):
+    '''
+    Gives the min/max pyramid of a signal, loading it from cache_file when that file was
+    saved for the same signal and building and saving it otherwise.
+
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) where n is the number of samples in the signal
+        The signal to get the pyramid of.
+    cache_file : string, optional
+        Path of the .npz file the pyramid is cached in, for example inside the recording
+        directory. The default is None, which builds the pyramid without caching it.
+    base_block : integer, optional
+        The number of samples in a block of the finest level. The default is PYRAMID_BASE_BLOCK.
+    factor : integer, optional
+        How many blocks of a level make up one block of the next level. The default is PYRAMID_FACTOR.
+
+    Returns
+    -------
+    pyramid : dictionary
+        The pyramid as returned by build_minmax_pyramid.
+
+    '''
+    fingerprint = signal_fingerprint(signal)
+
+    # reuse the saved pyramid if it was built from the same signal with the same block sizes
+    if cache_file is not None and os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            is_same_signal = (int(cached['signal_length']) == len(signal) and int(cached['block_sizes'][0]) == base_block
+                              and (len(cached['block_sizes']) < 2 or int(cached['block_sizes'][1]) == base_block * factor)
+                              and str(cached['fingerprint']) == fingerprint)
+            if is_same_signal:
+                level_count = len(cached['block_sizes'])
+                return {'signal_length': int(cached['signal_length']), 'block_sizes': cached['block_sizes'],
+                        'mins': [cached[f'min_{level}'] for level in range(level_count)],
+                        'maxs': [cached[f'max_{level}'] for level in range(level_count)]}
+
+    # build the pyramid and save it for next time
+    pyramid = build_minmax_pyramid(signal, base_block, factor)
+    if cache_file is not None:
+        levels = {}
+        for level in range(len(pyramid['block_sizes'])):
+            levels[f'min_{level}'] = pyramid['mins'][level]
+            levels[f'max_{level}'] = pyramid['maxs'][level]
+        np.savez(cache_file, signal_length = pyramid['signal_length'], block_sizes = pyramid['block_sizes'],
+                 fingerprint = fingerprint, **levels)
+    return pyramid
+
+#%% part 2
+def minmax_plot_points(signal, fs, visible_range, pyramid = None, max_points = MAX_PLOT_POINTS):
+    '''
+    Gives the points to draw for a time range of a signal. A short range is drawn from its
+    samples. A longer one is drawn from the minimum and maximum of each block of the finest
+    pyramid level that fits in max_points, so spikes stay visible.
+
+    Parameters
+    ----------
+    signal : 1D array of floats size (n,) where n is the number of samples in the signal
+        The signal to be plotted.
+    fs : float
+        The sampling frequency of the signal.
+    visible_range : 1D list or tuple of floats size 2
+        The start and stop time in seconds of the range that will be visible.
+    pyramid : dictionary, optional
+        The pyramid of the signal from get_minmax_pyramid. The default is None, which
+        reduces the visible samples directly.
+    max_points : integer, optional
+        The most points returned. The default is MAX_PLOT_POINTS.
+
+    Returns
+    -------
+    plot_time : 1D array of floats
+        The time in seconds of each point.
+    plot_signal : 1D array of floats
+        The value of each point.
+
+    '''
+    # find the samples in the visible range
+    start = min(max(int(np.floor(visible_range[0] * fs)), 0), len(signal))
+    stop = min(max(int(np.ceil(visible_range[1] * fs)) + 1, start), len(signal))
+
+    # few enough samples to draw them all
+    if stop - start <= max_points:
+        return np.arange(start, stop) / fs, np.asarray(signal[start:stop])
+
+    if pyramid is None:
+        # reduce the visible samples into just enough blocks
+        block_size = int(np.ceil((stop - start) / (max_points // 2)))
+        visible_signal = np.asarray(signal[start:stop])
+        block_starts = np.arange(0, len(visible_signal), block_size)
+        block_mins = np.minimum.reduceat(visible_signal, block_starts)
+        block_maxs = np.maximum.reduceat(visible_signal, block_starts)
+        block_times = (start + block_starts + block_size / 2) / fs
+    else:
+        # use the finest level with at most half of max_points blocks in the range, each block gives two points
+        block_counts = (stop - 1) // pyramid['block_sizes'] - start // pyramid['block_sizes'] + 1
+        level = np.flatnonzero(block_counts <= max_points // 2)[0]
+        block_size = pyramid['block_sizes'][level]
+        first_block = start // block_size
+        last_block = (stop - 1) // block_size + 1
+        block_mins = pyramid['mins'][level][first_block:last_block]
+        block_maxs = pyramid['maxs'][level][first_block:last_block]
+        block_times = (np.arange(first_block, last_block) * block_size + block_size / 2) / fs
+
+    # draw each block as a vertical line from its minimum to its maximum
+    plot_time = np.repeat(block_times, 2)
+    plot_signal = np.column_stack((block_mins, block_maxs)).reshape(-1)
+    return plot_time, plot_signal
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+synthetic_ecg_module.py
+
+This module makes synthetic ECG recordings with annotations so the project functions can be tried and timed on signals of any
+length without a real recording. Each beat is drawn from a template made of gaussian P, Q, R, S and T waves, with normal (N)
+beats and wider, larger premature ventricular (V) beats mixed at a chosen rate. The beats follow a heart rate with some random
+variability, and noise, a slow baseline wander and large spike artifacts can be added on top. The recordings use the same
+variables as the project 1 .npz files so they can be saved and loaded with load_data, and can be given in ADC counts like the
+project 3 recordings.
+"""
+import numpy as np
+
+# the waves of each beat type as (offset from the R peak in seconds, width in seconds, amplitude in volts)
+BEAT_WAVES = {'N': [(-0.2, 0.025, 0.15), (-0.03, 0.01, -0.1), (0, 0.012, 1.0), (0.03, 0.01, -0.25), (0.25, 0.04, 0.3)],
+              'V': [(-0.04, 0.02, -0.2), (0, 0.035, 1.5), (0.07, 0.04, -0.6), (0.3, 0.06, -0.35)]}
+
+# how much earlier than the heart rate a V beat arrives, as a fraction of the beat period
+PREMATURE_FRACTION = 0.3
+
+# shortest beat period as a fraction of the mean period
+MIN_PERIOD_FRACTION = 0.2
+
+#%% part 1
+def beat_template(symbol, fs):
+    '''
+    Makes the template of one beat type.
+
+    Parameters
+    ----------
+    symbol : string
+        The beat type, a key of BEAT_WAVES.
+    fs : integer
+        The sampling frequency of the template.
+
+    Returns
+    -------
+    template : 1D array of floats
+        The voltage of the beat, 0.5 seconds either side of the R peak.
+    peak_offset : integer
+        The index of the R peak in the template.
+
+    '''
+    if symbol not in BEAT_WAVES:
+        raise ValueError(f'unknown beat type {symbol}, expected one of {sorted(BEAT_WAVES)}')
+    # add a gaussian for each wave around the R peak
+    peak_offset = int(0.5 * fs)
+    template_time = (np.arange(2 * peak_offset + 1) - peak_offset) / fs
+    template = np.zeros(len(template_time))
+    for wave_offset, wave_width, wave_amplitude in BEAT_WAVES[symbol]:
+        template += wave_amplitude * np.exp(-0.5 * ((template_time - wave_offset) / wave_width)**2)
+    return template, peak_offset
+
+def generate_beats(fs, duration_seconds, heart_rate_bpm = 70, rate_variability = 0.05, beat_mix = None, rng = None):
+    '''
+    Picks the R peak sample and type of every beat of a recording.
+
+    Parameters
+    ----------
+    fs : integer
+        The sampling frequency of the recording.
+    duration_seconds : float
+        The length of the recording in seconds.
+    heart_rate_bpm : float, optional
+        The mean heart rate in beats per minute. The default is 70.
+    rate_variability : float, optional
+        The standard deviation of the beat period as a fraction of the mean period. The default is 0.05.
+    beat_mix : dictionary, optional
+        The fraction of beats of each type, for example {'N': 0.9, 'V': 0.1}. The default is None, which uses only N beats.
+    rng : numpy Generator, optional
+        The random number generator. The default is None, which makes a new one.
+
+    Returns
+    -------
+    beat_samples : 1D array of integers
+        The sample of the R peak of each beat.
+    beat_symbols : 1D array of strings
+        The type of each beat.
+
+    '''
+    if rng is None:
+        rng = np.random.default_rng()
+    if beat_mix is None:
+        beat_mix = {'N': 1.0}
+    symbols = np.array(list(beat_mix.keys()))
+    probabilities = np.array(list(beat_mix.values()), dtype = float)
+    if np.any(probabilities < 0) or probabilities.sum() <= 0:
+        raise ValueError('beat_mix must have non-negative fractions that do not all equal zero')
+
+    # draw more beat periods than can fit in the recording, then keep the ones that do
+    mean_period = 60 / heart_rate_bpm
+    beat_count = int(duration_seconds / (MIN_PERIOD_FRACTION * mean_period)) + 2
+    beat_symbols = symbols[rng.choice(len(symbols), beat_count, p = probabilities / probabilities.sum())]
+    periods = mean_period * (1 + rate_variability * rng.standard_normal(beat_count))
+
+    # V beats come early and the beat after them makes up the time
+    is_premature = beat_symbols == 'V'
+    periods[is_premature] -= PREMATURE_FRACTION * mean_period
+    periods[1:][is_premature[:-1]] += PREMATURE_FRACTION * mean_period
+    periods = np.clip(periods, MIN_PERIOD_FRACTION * mean_period, None)
+    beat_times = 0.5 + np.cumsum(periods) - periods[0]
+
+    # keep the beats whose whole template fits in the recording
+    is_inside = beat_times <= duration_seconds - 0.5
+    return np.round(beat_times[is_inside] * fs).astype(int), beat_symbols[is_inside]
+
+def generate_ecg(fs = 360, duration_seconds = 60, heart_rate_bpm = 70, rate_variability = 0.05, beat_mix = None,
+                 spike_rate = 0, spike_amplitude = 10, noise_std = 0.02, wander_amplitude = 0.1, channel_count = 1, seed = None):
+    '''
+    Makes a synthetic ECG recording with the annotation of every beat.
+
+    Parameters
+    ----------
+    fs : integer, optional
+        The sampling frequency of the recording. The default is 360.
+    duration_seconds : float, optional
+        The length of the recording in seconds. The default is 60.
+    heart_rate_bpm : float, optional
+        The mean heart rate in beats per minute. The default is 70.
+    rate_variability : float, optional
+        The standard deviation of the beat period as a fraction of the mean period. The default is 0.05.
+    beat_mix : dictionary, optional
+        The fraction of beats of each type, for example {'N': 0.9, 'V': 0.1}. The default is None, which uses only N beats.
+    spike_rate : float, optional
+        The mean number of spike artifacts per second. The default is 0.
+    spike_amplitude : float, optional
+        The height of the spike artifacts in volts. The default is 10.
+    noise_std : float, optional
+        The standard deviation of the white noise in volts. The default is 0.02.
+    wander_amplitude : float, optional
+        The amplitude of the slow baseline wander in volts. The default is 0.1.
+    channel_count : integer, optional
+        The number of channels, each channel sees the same beats with its own gain, noise and spikes. The default is 1.
+    seed : integer, optional
+        Seed of the random number generator so a recording can be made again. The default is None.
+
+    Returns
+    -------
+    data : dictionary
+        Has the same variables as the project 1 .npz files: ecg_voltage (1D with one channel, otherwise 2D with one row per
+        channel), fs, label_samples, label_symbols, subject_id, electrode and units.
+
+    '''
+    rng = np.random.default_rng(seed)
+    sample_count = int(duration_seconds * fs)
+    beat_samples, beat_symbols = generate_beats(fs, duration_seconds, heart_rate_bpm, rate_variability, beat_mix, rng)
+
+    # add each beat type's template at its beats, one template sample at a time across all of the beats
+    clean_signal = np.zeros(sample_count)
+    for symbol in np.unique(beat_symbols):
+        template, peak_offset = beat_template(symbol, fs)
+        template_starts = beat_samples[beat_symbols == symbol] - peak_offset
+        template_starts = template_starts[(template_starts >= 0) & (template_starts + len(template) <= sample_count)]
+        for template_index in range(len(template)):
+            clean_signal[template_starts + template_index] += template[template_index]
+
+    # each channel gets its own gain, baseline wander, noise and spikes
+    signal_time = np.arange(sample_count) / fs
+    ecg_voltage = np.zeros((channel_count, sample_count))
+    for channel_index in range(channel_count):
+        gain = 1 if channel_index == 0 else rng.uniform(0.5, 1.5)
+        wander = wander_amplitude * np.sin(2 * np.pi * 0.3 * signal_time + rng.uniform(0, 2 * np.pi))
+        ecg_voltage[channel_index] = gain * clean_signal + wander + noise_std * rng.standard_normal(sample_count)
+        spike_samples = rng.choice(sample_count, min(rng.poisson(spike_rate * duration_seconds), sample_count), replace = False)
+        ecg_voltage[channel_index, spike_samples] += spike_amplitude
+
+    return {'ecg_voltage': ecg_voltage[0] if channel_count == 1 else ecg_voltage, 'fs': fs, 'label_samples': beat_samples,
+            'label_symbols': beat_symbols, 'subject_id': 'synthetic', 'electrode': 'synthetic', 'units': 'V'}
+
+#%% part 2
+def to_adc_counts(signal_voltage, volts_per_count = 5/1023, offset_volts = 2.5, max_count = None):
+    '''
+    Converts a signal in volts to ADC counts like the project 3 recordings, where the
+    signal is offset to the middle of the ADC range. Counts are not clipped unless
+    max_count is given, so spike artifacts stay above the spike threshold.
+
+    Parameters
+    ----------
+    signal_voltage : array of floats
+        The signal in volts.
+    volts_per_count : float, optional
+        The volts of one ADC count. The default is 5/1023.
+    offset_volts : float, optional
+        The volts added to the signal before converting. The default is 2.5.
+    max_count : integer, optional
+        The largest count, counts are clipped to 0 and max_count when it is given. The default is None.
+
+    Returns
+    -------
+    signal_counts : array of floats
+        The signal in whole ADC counts.
+
+    '''
+    signal_counts = np.round((np.asarray(signal_voltage) + offset_volts) / volts_per_count)
+    if max_count is not None:
+        signal_counts = np.clip(signal_counts, 0, max_count)
+    return signal_counts
+
+def save_recording(data, out_filename):
+    '''
+    Saves a recording made by generate_ecg as a .npz file that load_data can read.
+
+    Parameters
+    ----------
+    data : dictionary
+        The recording from generate_ecg.
+    out_filename : string
+        The file path the recording is saved to.
+
+    Returns
+    -------
+    None.
+
+    '''
+    np.savez(out_filename, **data)